@@ -1,17 +1,26 @@
 import logging
 import discord
 import asyncio
-import json
+from datetime import datetime
 from discord.ext import commands, tasks
 from feat.consensus import get_consensus
+from utils.subscriptions import SubscriptionIndex, SubscriptionStore
+from utils.coalesce import EmbedCoalescer
 
 class DiscordClient(commands.Bot):
     def __init__(self, config):
         self.token: int | str = config["app"]["discord"]["bot-token"]
         self.channels: dict = config["app"]["discord"]["channels"]
-        self.subscriptions: list = config["app"]["discord"]["subscriptions"]
+        # subscriptions live in the subscription store, config.json only seeds it once
+        self.subscriptions = SubscriptionIndex.from_store(
+            SubscriptionStore(config["app"].get("subscriptions_db", "subscriptions.db")),
+            "discord",
+            config["app"]["discord"].get("subscriptions", [])
+        )
         self.mode: str = config["app"]["discord"]["mode"]
         self.rpcs: list = config["rpcs"] # for /consensus command only
+        self.consensus = None # ConsensusWatcher, set when the consensus feature is enabled
+        self.dead_letters = None # DeadLetterQueue, set by main
 
         intents = discord.Intents.default()
         intents.guilds = True
@@ -24,6 +33,7 @@ class DiscordClient(commands.Bot):
         self.logger.setLevel(logging.INFO)
 
         self.loop = None
+        self.coalescer = EmbedCoalescer(self.send_embeds, self.compose_embed, config["app"]["discord"].get("coalesce", {}), self.dead_letter)
 
     def compose_embed(self, title="", description="", author="", fields=[], footer="", color=0x29fffb):
         embed = discord.Embed(
@@ -83,6 +93,7 @@ class DiscordClient(commands.Bot):
                         - `>sub list`: List all your subscriptions \n
                         - `>unsub <valoper-address>`: Unsubscribe from a subscription \n
                         - `>consensus`: Show current block's consensus state (useful in upgrade events)\n
+                        - `>deadletter list|flush`: List or retry alerts that failed to deliver (administrators only)\n
                         - `>help`: Show this help menu
                     """,
                     footer=f"This message will be automatically deleted in 60s"
@@ -96,7 +107,7 @@ class DiscordClient(commands.Bot):
                     sub_type = commands[1]
                     value = commands[2]
                     if sub_type == "val":
-                        self.subscriptions.append({
+                        self.subscriptions.add({
                             "user": message.author.id,
                             "validator": value
                         })
@@ -106,15 +117,10 @@ class DiscordClient(commands.Bot):
                         footer=f"This message will be automatically deleted in 10s"
                     )
                     await self.reply(message.channel.id, msg, auto_delete=10)
-                    with open("config.json", "r") as config_file:
-                        config = json.load(config_file)
-                    config["app"]["discord"]["subscriptions"] = self.subscriptions
-                    with open("config.json", "w") as config_file:
-                        json.dump(config, config_file, indent=4)
                 elif (len(commands) == 2):
                     if commands[1] == "list":
                         user_subs = [sub["validator"] if "validator" in sub else sub["address"]
-                                     for sub in self.subscriptions if sub["user"] == message.author.id]
+                                     for sub in self.subscriptions.for_user(message.author.id)]
                         sub_list = "\n".join(
                             f"- {sub}" for sub in user_subs) if user_subs else "No subscriptions found."
                         msg = self.compose_embed(
@@ -132,32 +138,22 @@ class DiscordClient(commands.Bot):
                         await self.reply(message.channel.id, msg, auto_delete=10)
             case "unsub":
                 value_to_remove = message.content[1:].split(' ')[1]
-                self.subscriptions = [
-                    sub for sub in self.subscriptions
-                    if not (
-                        sub.get("user") == message.author.id and (
-                            sub.get("validator") == value_to_remove or
-                            sub.get("address") == value_to_remove 
-                        )
-                    )
-                ]
+                self.subscriptions.remove(message.author.id, value_to_remove)
                 msg = self.compose_embed(
                     description=f"Unsubscribed `{value_to_remove}` for <@{message.author.id}>",
                     footer=f"This message will be automatically deleted in 10s"
                 )
                 await self.reply(message.channel.id, msg, auto_delete=10)
-                with open("config.json", "r") as config_file:
-                    config = json.load(config_file)
-                config["app"]["discord"]["subscriptions"] = self.subscriptions
-                with open("config.json", "w") as config_file:
-                    json.dump(config, config_file, indent=4)
             case "consensus":
                 commands = message.content[1:].split(' ')
                 self.logger.debug(f"Commands: {commands}")
                 if (len(commands) <= 2):
-                    custom_rpc = commands[1] if len(commands) == 2 else self.rpcs
-                    consensus_state = get_consensus(custom_rpc)
-                    if consensus_state == {}:
+                    if len(commands) == 1 and self.consensus is not None:
+                        consensus_state = self.consensus.get_snapshot()
+                    else:
+                        custom_rpc = commands[1] if len(commands) == 2 else self.rpcs
+                        consensus_state = get_consensus(custom_rpc)
+                    if consensus_state == {} or "error" in consensus_state:
                         msg = self.compose_embed(
                             title=f"**Error fetching consensus state!**"
                         )
@@ -215,6 +211,8 @@ class DiscordClient(commands.Bot):
                         description=f"Invalid command: `{commands}`",
                     )
                     await self.reply(message.channel.id, msg)
+            case "deadletter":
+                await self.handle_deadletter(message)
             case _:
                 self.logger.error(f"Invalid command: {command}")
                 msg = self.compose_embed(
@@ -223,6 +221,68 @@ class DiscordClient(commands.Bot):
                 )
                 await self.reply(message.channel.id, msg)
 
+    async def handle_deadletter(self, message):
+        commands = message.content[1:].split(' ')
+        permissions = getattr(message.author, "guild_permissions", None)
+        if permissions is None or not permissions.administrator:
+            msg = self.compose_embed(title=f"**Only administrators can manage dead letters!**")
+        elif self.dead_letters is None:
+            msg = self.compose_embed(title=f"**Dead-letter queue is not enabled!**")
+        elif len(commands) == 2 and commands[1] == "list":
+            entries = self.dead_letters.list()
+            msg = self.compose_embed(
+                title=f"**{len(entries)} dead letters**",
+                fields=[
+                    {
+                        "name": f"{entry['id']} ({entry['platform']})",
+                        "value": f"Failed {datetime.fromtimestamp(entry['failed_at']).strftime('%Y-%m-%d %H:%M:%S')}, {entry['attempts']} replays: {entry['error'][:200]}",
+                        "inline": False
+                    } for entry in entries[:25]
+                ],
+                footer=f"This message will be automatically deleted in 60s"
+            )
+        elif len(commands) == 2 and commands[1] == "flush":
+            # replaying sends through this loop, so it must not run on it
+            result = await asyncio.get_running_loop().run_in_executor(None, self.dead_letters.flush)
+            msg = self.compose_embed(
+                title=f"**Flushed dead letters**",
+                description=f"{result['delivered']} delivered, {result['failed']} failed, {result['remaining']} remaining",
+                footer=f"This message will be automatically deleted in 60s"
+            )
+        else:
+            msg = self.compose_embed(
+                title=f"**Invalid command!**",
+                description=f"Invalid command: `{commands}`",
+            )
+        await self.reply(message.channel.id, msg, auto_delete=60)
+
+    def dead_letter(self, channel_id, mention, embeds, auto_delete, error):
+        if self.dead_letters is None:
+            return
+        self.dead_letters.add(
+            "discord",
+            channel_id,
+            {"content": mention, "embeds": [embed.to_dict() for embed in embeds], "delete_after": auto_delete},
+            error
+        )
+
+    def replay(self, channel_id, payload):
+        """
+        Sends a dead-lettered message again; called from the replay thread
+        """
+        if not self.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        future = asyncio.run_coroutine_threadsafe(
+            self.send_embeds(
+                channel_id,
+                payload["content"],
+                [discord.Embed.from_dict(embed) for embed in payload["embeds"]],
+                payload["delete_after"]
+            ),
+            self.loop
+        )
+        future.result(timeout=60)
+
     async def reply(self, channel_id, content, mention = "", auto_delete = 60):
         """
         Sends a message to a specified channel
@@ -244,6 +304,29 @@ class DiscordClient(commands.Bot):
         else:
             self.logger.error('Channel with ID %s not found', channel_id)
 
+    async def alert(self, channel_id, content, mention = "", auto_delete = 60):
+        """
+        Sends an alert embed; alerts to the same channel within the coalescing window share messages
+        """
+        if not self.coalescer.window:
+            try:
+                await self.send_embeds(channel_id, mention, [content], auto_delete)
+            except Exception as e:
+                self.logger.error(f"Error sending alert to channel {channel_id}: {e}")
+                self.dead_letter(channel_id, mention, [content], auto_delete, e)
+            return
+        self.coalescer.put(channel_id, content, mention, auto_delete)
+
+    async def send_embeds(self, channel_id, mention, embeds, auto_delete):
+        channel = self.get_channel(channel_id)
+        if not channel:
+            raise ValueError(f"Channel with ID {channel_id} not found")
+        await channel.send(
+            content=mention,
+            embeds=embeds,
+            delete_after=auto_delete
+        )
+
     async def send_message(self, channel, mention, content, auto_delete):
         await channel.send(
             content=mention, 
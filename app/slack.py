@@ -1,38 +1,41 @@
 from flask import Flask, request, jsonify
 import logging
-import json 
-import requests
+from utils.priority import LANES
+from utils.subscriptions import SubscriptionIndex, SubscriptionStore
+from utils.webhook import WebhookSender
 
 class SlackServer(Flask):
     def __init__(self, config):
         super().__init__(__name__)
         self.port: int = config["app"]["slack"]["port"]
         self.channels: list = config["app"]["slack"]["channels"]
-        self.subscriptions: list = config["app"]["slack"]["subscriptions"]
+        # subscriptions live in the subscription store, config.json only seeds it once
+        self.subscriptions = SubscriptionIndex.from_store(
+            SubscriptionStore(config["app"].get("subscriptions_db", "subscriptions.db")),
+            "slack",
+            config["app"]["slack"].get("subscriptions", [])
+        )
         self.mode: str = config["app"]["slack"]["mode"]
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
+        self.dead_letters = None # DeadLetterQueue, set by main
+        self.sender = WebhookSender(config["app"]["slack"].get("delivery", {}), on_error=self.dead_letter)
 
     def handle_sub(self, args, user_id):
         if (len(args) == 2):
             sub_type = args[0]
             value = args[1]
             if sub_type == "val":
-                self.subscriptions.append({
+                self.subscriptions.add({
                     "user": user_id,
                     "validator": value
                 })
-                with open("config.json", "r") as config_file:
-                    config = json.load(config_file)
-                config["app"]["slack"]["subscriptions"] = self.subscriptions
-                with open("config.json", "w") as config_file:
-                    json.dump(config, config_file, indent=4)
                 return f"Subscribed `{value}` for <@{user_id}>"
             else:
                 return f"Invalid subscription type: {sub_type}"
         elif (len(args) == 1):
             if args[0] == "list":
-                user_subs = [sub["validator"] if "validator" in sub else sub["address"] for sub in self.subscriptions if sub["user"] == user_id]
+                user_subs = [sub["validator"] if "validator" in sub else sub["address"] for sub in self.subscriptions.for_user(user_id)]
                 sub_list = "\n".join(f"- {sub}" for sub in user_subs) if user_subs else "No subscriptions found."
                 return f"Your subscriptions:\n{sub_list}"
             else:
@@ -40,21 +43,8 @@ class SlackServer(Flask):
 
     def handle_unsub(self, args, user_id):
         value_to_remove = args
-        self.subscriptions = [
-            sub for sub in self.subscriptions
-            if not (
-                sub.get("user") == user_id and (
-                    sub.get("validator") == value_to_remove or
-                    sub.get("address") == value_to_remove
-                )
-            )
-        ]
+        self.subscriptions.remove(user_id, value_to_remove)
 
-        with open("config.json", "r") as config_file:
-            config = json.load(config_file)
-        config["app"]["slack"]["subscriptions"] = self.subscriptions
-        with open("config.json", "w") as config_file:
-            json.dump(config, config_file, indent=4)
 
         return f"Unsubscribed: `{value_to_remove}` for <@{user_id}>"
 
@@ -103,37 +93,27 @@ class SlackServer(Flask):
                 "text": response
             })
 
-    def reply(self, message, channel):
-        try:
-            if isinstance(message, str):
-                payload = {
-                    "text": message
-                }
-            elif isinstance(message, list):
-                payload = {
-                    "attachments": message
-                }
-
-            # Send the POST request to the webhook URL (which is 'channel' here)
-            response = requests.post(
-                channel,  # Using 'channel' as the webhook URL
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(payload)
-            )
+    def reply(self, message, channel, priority=len(LANES) - 1):
+        """
+        Queues a message (text or attachments) for the webhook URL `channel`; the sender
+        batches and delivers it off the caller's thread, most urgent (lowest `priority`) first
+        """
+        self.sender.put(channel, message, priority)
 
-            # Check if the response from the webhook is successful
-            if response.status_code == 200:
-                self.logger.info("Message sent successfully")
-            else:
-                self.logger.error(f"Failed to send message. Status code: {response.status_code}")
-                self.logger.error(f"Response: {response.text}")
+    def dead_letter(self, webhook_url, payload, error):
+        if self.dead_letters is not None:
+            self.dead_letters.add("slack", webhook_url, payload, error)
 
-        except Exception as e:
-            self.logger.error(f"Error sending message to webhook: {e}")
+    def replay(self, webhook_url, payload):
+        """
+        Sends a dead-lettered payload again; called from the replay thread
+        """
+        self.sender.send_once(webhook_url, payload)
 
     def start(self):
         try:
             self.register_routes()
+            self.sender.start()
             self.logger.info("Starting Slack server...")
             from waitress import serve
             serve(self, host='0.0.0.0', port=self.port)
@@ -1,21 +1,30 @@
 import logging
-import json
 import asyncio
 import telebot
 import telebot.async_telebot
+from utils.subscriptions import SubscriptionIndex, SubscriptionStore
+from utils.sendqueue import SendQueue
+from utils.priority import LANES
 
 class TelegramClient(telebot.async_telebot.AsyncTeleBot):
     def __init__(self, config):
         self.token: str = config["app"]["telegram"]["token"]
-        self.subscriptions: list = config["app"]["telegram"]["subscriptions"]
+        # subscriptions live in the subscription store, config.json only seeds it once
+        self.subscriptions = SubscriptionIndex.from_store(
+            SubscriptionStore(config["app"].get("subscriptions_db", "subscriptions.db")),
+            "telegram",
+            config["app"]["telegram"].get("subscriptions", [])
+        )
         self.channels: list = config["app"]["telegram"]["channels"]
         self.mode: str = config["app"]["telegram"]["mode"]
         
         self.logger = logging.getLogger("TelegramClient")
         self.logger.setLevel(logging.INFO)
         self.loop = None
+        self.dead_letters = None # DeadLetterQueue, set by main
 
         super().__init__(token=self.token, parse_mode="Markdown")
+        self.send_queue = SendQueue(self.send_message, config["app"]["telegram"].get("rate_limit", {}), "TelegramSendQueue", self.dead_letter)
         self.register_commands()
 
     def register_commands(self):
@@ -38,6 +47,8 @@ class TelegramClient(telebot.async_telebot.AsyncTeleBot):
 - `/sub val <valoper-address>`: Valoper address subscription will notify you of validator uptime, peggo performance and low balance on your validator operator and peggo orchestrator addresses
 - `/sub ibc`: Subscribe to IBC monitoring notifications
 - `/sub gov`: Subscribe to governance notifications
+- `/sub consensus`: Subscribe to consensus stall notifications
+- `/sub peggo`: Subscribe to Peggo bridge notifications (Ethereum lagging behind Injective)
 - `/sub list`: List all your subscriptions
 - `/unsub <valoper-address>`: Unsubscribe from a subscription
 - `/help`: Show this help menu
@@ -48,12 +59,12 @@ class TelegramClient(telebot.async_telebot.AsyncTeleBot):
                 sub_type = commands[0]
                 value = commands[1]
                 if sub_type == "val":
-                    self.subscriptions.append({
+                    self.subscriptions.add({
                         "user": message.chat.id,
                         "validator": value
                     })
                 elif sub_type == "balance":
-                    self.subscriptions.append({
+                    self.subscriptions.add({
                         "user": message.chat.id,
                         "address": value
                     })
@@ -67,47 +78,50 @@ class TelegramClient(telebot.async_telebot.AsyncTeleBot):
                     message.chat.id,
                     f"Subscribed `{value}`"
                 )
-                with open("config.json", "r") as f:
-                    config = json.load(f)
-                config["app"]["telegram"]["subscriptions"] = self.subscriptions
-                with open("config.json", "w") as f:
-                    json.dump(config, f, indent=4)
             elif (len(commands) == 1):
                 if commands[0] == "list":
-                    user_subs = [sub["validator"] if "validator" in sub else sub["address"] if "address" in sub else sub["sub"] for sub in self.subscriptions if sub["user"] == message.chat.id]
+                    user_subs = [sub["validator"] if "validator" in sub else sub["address"] if "address" in sub else sub["sub"] for sub in self.subscriptions.for_user(message.chat.id)]
                     sub_list = "\n".join(f"- {sub}" for sub in user_subs) if user_subs else "No subscriptions found."
                     await self.send_message(
                         message.chat.id,
                         "Your subscriptions:\n" + sub_list
                     )
                 elif commands[0] == "ibc":
-                    self.subscriptions.append({
+                    self.subscriptions.add({
                         "user": message.chat.id,
                         "sub": "ibc"
                     })
-                    with open("config.json", "r") as f:
-                        config = json.load(f)
-                    config["app"]["telegram"]["subscriptions"] = self.subscriptions
-                    with open("config.json", "w") as f:
-                        json.dump(config, f, indent=4)
                     await self.send_message(
                         message.chat.id,
                         "Subscribed to receive IBC monitoring notifications."
                     )
                 elif commands[0] == "gov":
-                    self.subscriptions.append({
+                    self.subscriptions.add({
                         "user": message.chat.id,
                         "sub": "gov"
                     })
-                    with open("config.json", "r") as f:
-                        config = json.load(f)
-                    config["app"]["telegram"]["subscriptions"] = self.subscriptions
-                    with open("config.json", "w") as f:
-                        json.dump(config, f, indent=4)
                     await self.send_message(
                         message.chat.id,
                         "Subscribed to receive governance notifications."
                     )
+                elif commands[0] == "consensus":
+                    self.subscriptions.add({
+                        "user": message.chat.id,
+                        "sub": "consensus"
+                    })
+                    await self.send_message(
+                        message.chat.id,
+                        "Subscribed to receive consensus stall notifications."
+                    )
+                elif commands[0] == "peggo":
+                    self.subscriptions.add({
+                        "user": message.chat.id,
+                        "sub": "peggo"
+                    })
+                    await self.send_message(
+                        message.chat.id,
+                        "Subscribed to receive Peggo bridge notifications."
+                    )
                 else:
                     await self.send_message(
                         message.chat.id,
@@ -115,41 +129,38 @@ class TelegramClient(telebot.async_telebot.AsyncTeleBot):
                     )
         elif command_name == "/unsub":
             value_to_remove = commands[0]
-            self.subscriptions = [
-                sub for sub in self.subscriptions
-                if not (
-                    sub.get("user") == message.chat.id and (
-                        sub.get("validator") == value_to_remove or
-                        sub.get("address") == value_to_remove or
-                        sub.get("sub") == value_to_remove
-                    )
-                )
-            ]
+            self.subscriptions.remove(message.chat.id, value_to_remove)
             await self.send_message(
                 message.chat.id,
                 f"Unsubscribed: `{value_to_remove}`"
             )
-            with open("config.json", "r") as config_file:
-                config = json.load(config_file)
-            config["app"]["telegram"]["subscriptions"] = self.subscriptions
-            with open("config.json", "w") as config_file:
-                json.dump(config, config_file, indent=4)
     
-    async def reply(self, message, channel):
-        try:
-            asyncio.create_task(
-                self.send_message(
-                    channel,
-                    message
-            ))
-            self.logger.info(f"Message sent to channel: {channel}")
-        except Exception as e:
-            self.logger.error(f"Error sending message: {e}")
+    async def reply(self, message, channel, priority=len(LANES) - 1):
+        """
+        Queues a message; the send queue delivers it within Telegram's global and per-chat limits,
+        most urgent (lowest `priority`) first
+        """
+        self.send_queue.put(channel, message, priority)
+
+    def dead_letter(self, chat, text, error):
+        if self.dead_letters is not None:
+            self.dead_letters.add("telegram", chat, {"text": text}, error)
+
+    def replay(self, chat, payload):
+        """
+        Sends a dead-lettered message again within the send queue's rate limits; called from the replay thread
+        """
+        if not self.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        future = asyncio.run_coroutine_threadsafe(self.send_queue.send_once(chat, payload["text"]), self.loop)
+        future.result(timeout=60)
 
     def start(self):
         try:
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self.send_queue.start(loop)
+            self.loop = loop
             self.loop.create_task(super().infinity_polling())
             self.loop.run_forever()
         except Exception as e:
@@ -0,0 +1,73 @@
+"""
+Rendering cost of one alert fanned out to many subscribers: the old per-recipient f-string
+formatting against utils.templates, which renders once per alert and format.
+
+    python benchmarks/render_fanout.py [subscribers ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.templates import AlertTemplate, Templates
+
+PARAMS = {"signed_blocks_window": 100000, "min_signed_per_window": 0.5}
+
+TEMPLATES = {
+    "miss_block": AlertTemplate(
+        title=lambda args, params: f"[{args['warning_level']}] {args['moniker']} has missed more than {args['missed_percentage'] * 100:.2f}% of the allowed missed blocks!",
+        fields=[
+            ("Blocks to JAILED", lambda args, params: int(params["signed_blocks_window"] * (1 - params["min_signed_per_window"]) - args['window_missed'])),
+            ("Window Signing Percentage", lambda args, params: f"{params['signed_blocks_window'] - args['window_missed']} / {params['signed_blocks_window']}"),
+            ("Signing window", lambda args, params: params["signed_blocks_window"]),
+            ("Min signed per window", lambda args, params: f"{params['min_signed_per_window'] * 100}%")
+        ]
+    )
+}
+
+def message():
+    return {
+        "type": "miss_block",
+        "args": {"warning_level": "CRITICAL", "moniker": "validator", "missed_percentage": 0.42, "window_missed": 21000},
+        "auto_delete": None
+    }
+
+def legacy(message, subscribers):
+    """
+    Formats the alert inside the recipient loop, as the notify_* methods used to
+    """
+    args = message["args"]
+    sent = []
+    for _ in range(subscribers):
+        sent.append(f"""
+*[{args['warning_level']}] {args['moniker']} has missed more than {args['missed_percentage'] * 100:.2f}% of the allowed missed blocks!*
+Blocks to JAILED: `{int(PARAMS["signed_blocks_window"] * (1 - PARAMS["min_signed_per_window"]) - args['window_missed'])}`
+Window Signing Percentage: `{PARAMS['signed_blocks_window'] - args['window_missed']} / {PARAMS['signed_blocks_window']}`
+Signing window: `{PARAMS['signed_blocks_window']}`
+Min signed per window: `{PARAMS['min_signed_per_window'] * 100}%`
+        """)
+    return sent
+
+def templated(message, subscribers):
+    templates = Templates(TEMPLATES, PARAMS)
+    msg = templates.render(message, "text")
+    sent = []
+    for _ in range(subscribers):
+        sent.append(msg)
+    return sent
+
+def measure(render, subscribers, repeat=20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(message(), subscribers)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == "__main__":
+    fanouts = [int(arg) for arg in sys.argv[1:]] or [1, 10, 100, 1000, 10000]
+    print(f"{'subscribers':>12} {'per-recipient':>15} {'templated':>12} {'speedup':>8}")
+    for subscribers in fanouts:
+        before, after = measure(legacy, subscribers), measure(templated, subscribers)
+        print(f"{subscribers:>12} {before * 1000:>13.3f}ms {after * 1000:>10.3f}ms {before / after:>7.1f}x")
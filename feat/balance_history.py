@@ -0,0 +1,87 @@
+import logging
+import time
+from collections import deque
+
+from utils.store import load_json, save_json
+
+class BalanceHistory:
+    """
+    Rolling balance samples per address with an EWMA burn-rate estimate, alert suppression
+    and per-address polling backoff, optionally persisted to a local file
+    """
+    def __init__(self, path=None, size=48, alpha=0.3):
+        self.path = path
+        self.size = size
+        self.alpha = alpha
+        self.addresses: dict = {}
+        self.logger = logging.getLogger("Balances")
+        if path is not None:
+            for address, entry in load_json(path, {}).items():
+                entry["samples"] = deque(entry["samples"], maxlen=size)
+                self.addresses[address] = entry
+
+    def _entry(self, address) -> dict:
+        entry = self.addresses.get(address)
+        if entry is None:
+            entry = {
+                "samples": deque(maxlen=self.size),
+                "burn_rate": None, # balance units per second
+                "last_alert": None, # {"type", "at"}
+                "next_check_at": 0
+            }
+            self.addresses[address] = entry
+        return entry
+
+    def add(self, address, ts, balance):
+        entry = self._entry(address)
+        samples = entry["samples"]
+        if samples:
+            last_ts, last_balance = samples[-1]
+            # top-ups are not spending, they only restart the runway from the new balance
+            if ts > last_ts and balance <= last_balance:
+                rate = (last_balance - balance) / (ts - last_ts)
+                entry["burn_rate"] = rate if entry["burn_rate"] is None else self.alpha * rate + (1 - self.alpha) * entry["burn_rate"]
+        samples.append([ts, balance])
+
+    def burn_rate(self, address):
+        entry = self.addresses.get(address)
+        return entry["burn_rate"] if entry else None
+
+    def time_to_empty(self, address):
+        """
+        Projected seconds until the address runs out of funds, None if it is not burning
+        """
+        entry = self.addresses.get(address)
+        if not entry or not entry["samples"] or not entry["burn_rate"]:
+            return None
+        return entry["samples"][-1][1] / entry["burn_rate"]
+
+    def should_alert(self, address, alert_type, repeat_seconds, now=None):
+        now = now or time.time()
+        entry = self._entry(address)
+        last_alert = entry["last_alert"]
+        if last_alert and last_alert["type"] == alert_type and now - last_alert["at"] < repeat_seconds:
+            return False
+        entry["last_alert"] = {"type": alert_type, "at": now}
+        return True
+
+    def clear_alert(self, address):
+        self._entry(address)["last_alert"] = None
+
+    def is_due(self, address, now=None):
+        entry = self.addresses.get(address)
+        return entry is None or entry["next_check_at"] <= (now or time.time())
+
+    def schedule(self, address, next_check_at):
+        self._entry(address)["next_check_at"] = next_check_at
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            save_json(self.path, {
+                address: {**entry, "samples": list(entry["samples"])}
+                for address, entry in self.addresses.items()
+            })
+        except OSError as e:
+            self.logger.error(f"Error saving {self.path}: {e}")
@@ -1,206 +1,304 @@
 import json
 import time
+from urllib.parse import quote
 import utils.query as query
+from utils.outbox import dispatch
+import utils.jsonrpc as jsonrpc
 import logging
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.delegates import DelegateKeyCache
+from feat.balance_history import BalanceHistory
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
+
+TEMPLATES = {
+    "low_balance": AlertTemplate(
+        title="{moniker} has low balance!",
+        description="{wallet} Address: `{address}`",
+        fields=[
+            ("Balance", "{balance}")
+        ],
+        color=0xffd100
+    ),
+    "low_runway": AlertTemplate(
+        title="{moniker} will run out of funds in {runway}!",
+        description="{wallet} Address: `{address}`",
+        fields=[
+            ("Balance", "{balance}"),
+            ("Burn Rate", "{burn_rate}")
+        ],
+        color=0xfff942
+    ),
+    "invalid_address": AlertTemplate(
+        title="Invalid address!",
+        description="{wallet} Address: `{address}`",
+        color=0xffd100
+    )
+}
 
 class Balances:
-    def __init__(self, app, apis, jsonrpcs, params):
+    def __init__(self, app, apis, jsonrpcs, params, history=None):
         self.app: dict = app
         self.apis: list = apis
         self.jsonrpcs: list = jsonrpcs
         self.params: dict = params
+        self.templates = Templates(TEMPLATES, params)
+        self.history: BalanceHistory = history or BalanceHistory()
+        self.runway_alert_seconds: int = params.get("runway_alert_seconds", 259200)
+        self.alert_repeat_seconds: int = params.get("alert_repeat_seconds", 86400)
+        self.max_backoff_seconds: int = params.get("max_backoff_seconds", 21600)
+        self.delegate_keys = DelegateKeyCache(apis, params.get("delegate_keys_ttl", 86400))
+        # Peggo orchestrator wallets, watch lists below follow the same shape
+        self.peggo_wallets: dict = {
+            "cosmos": {"name": "Peggo", "type": "cosmos", "apis": apis, "prefix": "inj", "denom": "inj", "decimals": 18, "symbol": "INJ", "precision": 2, "threshold": params["threshold"]["inj"]},
+            "evm": {"name": "Peggo", "type": "evm", "jsonrpcs": jsonrpcs, "decimals": 18, "symbol": "ETH", "precision": 4, "threshold": params["threshold"]["eth"]}
+        }
+        self.watchlists: list = [self.get_wallet_spec(watch) for watch in params.get("watch", [])]
 
         self.logger = logging.getLogger("Balances")
         self.logger.setLevel(logging.INFO)
 
+    def get_wallet_spec(self, watch) -> dict:
+        """
+        Fills a `watch` entry of the wallet params with the defaults of its type
+        """
+        defaults = self.peggo_wallets[watch.get("type", "cosmos")]
+        spec = {**defaults, **watch}
+        if "denom" in watch and "symbol" not in watch:
+            # an ibc/ denom ends in a 64-character hash, the watch entry's name reads better
+            spec["symbol"] = spec["name"] if watch["denom"].startswith("ibc/") else watch["denom"].split("/")[-1].upper()
+        spec["addresses"] = [
+            address if isinstance(address, dict) else {"address": address}
+            for address in watch.get("addresses", [])
+        ]
+        return spec
+
+    def get_balance(self, address, wallet=None):
+        """
+        Fetching the balance of a Cosmos-SDK address in the wallet's denom
+        """
+        wallet = wallet or self.peggo_wallets["cosmos"]
+        try:
+            data = query.query(wallet["apis"], path=f"/cosmos/bank/v1beta1/balances/{address}/by_denom?denom={quote(wallet['denom'], safe='')}")
+            return int(data["balance"]["amount"]) / 10**wallet["decimals"]
+        except Exception as e:
+            self.logger.error(f"Error fetching {wallet['denom']} balance of {address}: {e}")
+            return None
+
     def get_inj_balance(self, address):
         """
         Fetching the inj balance
         """
+        return self.get_balance(address)
+
+    def get_eth_balances(self, addresses, wallet=None) -> dict:
+        """
+        Fetching the eth balances of all addresses in a single JSON-RPC batch
+        """
+        wallet = wallet or self.peggo_wallets["evm"]
         try:
-            data = query.query(self.apis, path=f"/cosmos/bank/v1beta1/balances/{address}")
-            for i in data["balances"]:
-                if i["denom"] == "inj":
-                    return int(i["amount"]) / 10**18
-            return 0
+            results = jsonrpc.batch(wallet["jsonrpcs"], [("eth_getBalance", [address, "latest"]) for address in addresses])
+            return {
+                address: jsonrpc.to_int(result) / 10**wallet["decimals"] if result is not None else None
+                for address, result in zip(addresses, results)
+            }
+        except Exception as e:
+            self.logger.error(f"Error fetching eth balances: {e}")
+            return {}
+
+    def get_delegate_keys(self, validator) -> dict:
+        try:
+            return self.delegate_keys.get(validator["operator_address"])
         except Exception as e:
-            self.logger.error(f"Error fetching inj balance: {e}")
+            self.logger.error(f"Error fetching delegate keys for {validator['moniker']}: {e}")
             return None
 
-    def check(self, validator, moniker, address):
-        if address.startswith("inj1"):
-            balance = self.get_inj_balance(address)
-            if balance != None and balance <= self.params["threshold"]["inj"]:
-                self.logger.info(f"Validator: {validator} has low INJ balance: {balance}")
+    def next_check_delay(self, alert_type, runway) -> float:
+        """
+        Backs off polling an address while its projected runway is far from the alert horizon.
+        Without a burn-rate estimate (a first sample, or a wallet not spending) it keeps the
+        normal interval, so a drain that starts later is still seen
+        """
+        if alert_type is not None or runway is None:
+            return 0
+        return min(self.max_backoff_seconds, (runway - self.runway_alert_seconds) / 2)
+
+    def check(self, validator, moniker, address, balance=None, wallet=None):
+        if wallet is None:
+            wallet = self.peggo_wallets["evm" if address.startswith("0x") else "cosmos"]
+        if wallet["type"] == "evm" and address.startswith("0x"):
+            self.check_balance(validator, moniker, address, balance, wallet["symbol"], wallet["threshold"], wallet["precision"], wallet["name"])
+        elif wallet["type"] == "cosmos" and address.startswith(wallet["prefix"] + "1"):
+            if balance is None:
+                balance = self.get_balance(address, wallet)
+            self.check_balance(validator, moniker, address, balance, wallet["symbol"], wallet["threshold"], wallet["precision"], wallet["name"])
+        else:
+            self.logger.error(f"Invalid address: {address}")
+            if self.history.should_alert(address, "invalid_address", self.alert_repeat_seconds):
                 self.notify(
                     {
-                        "type": "low_balance",
+                        "type": "invalid_address",
                         "args": {
                             "validator": validator,
                             "address": address,
-                            "moniker": moniker,
-                            "balance": f"{balance:,.2f} INJ",
-                        },
-                        "auto_delete": None
-                    }
-                )
-        elif not address.startswith("0x"):
-            self.logger.error(f"Invalid address: {address}")
-            self.notify(
-                {
-                    "type": "invalid_address",
-                    "args": {
-                        "validator": validator,
-                        "address": address
-                        },
-                        "auto_delete": None
-                    }
-                )
+                            "wallet": wallet["name"]
+                            },
+                            "auto_delete": None
+                        }
+                    )
+            return
+
+    def check_balance(self, validator, moniker, address, balance, symbol, threshold, precision, wallet="Peggo"):
+        if balance is None:
             return
+        now = time.time()
+        self.history.add(address, now, balance)
+        runway = self.history.time_to_empty(address)
+        if balance <= threshold:
+            alert_type = "low_balance"
+        elif runway is not None and runway <= self.runway_alert_seconds:
+            alert_type = "low_runway"
+        else:
+            alert_type = None
+            self.history.clear_alert(address)
+        self.history.schedule(address, now + self.next_check_delay(alert_type, runway))
+
+        if alert_type is None or not self.history.should_alert(address, alert_type, self.alert_repeat_seconds, now):
+            return
+        self.logger.info(f"Validator: {validator} has {alert_type} on {symbol}: {balance}")
+        args = {
+            "validator": validator,
+            "address": address,
+            "moniker": moniker,
+            "balance": f"{balance:,.{precision}f} {symbol}",
+            "wallet": wallet
+        }
+        if alert_type == "low_runway":
+            args["runway"] = f"{runway / 86400:,.1f} days"
+            args["burn_rate"] = f"{self.history.burn_rate(address) * 86400:,.{precision}f} {symbol}/day"
+        self.notify(
+            {
+                "type": alert_type,
+                "args": args,
+                "auto_delete": None
+            }
+        )
         
+    def check_watchlists(self, executor):
+        """
+        Checks the watched addresses chunk by chunk, so memory and in-flight requests stay bounded
+        """
+        for wallet in self.watchlists:
+            entries = [entry for entry in wallet["addresses"] if self.history.is_due(entry["address"])]
+            chunk_size = wallet.get("batch_size", 100)
+            for start in range(0, len(entries), chunk_size):
+                chunk = entries[start:start + chunk_size]
+                addresses = [entry["address"] for entry in chunk]
+                if wallet["type"] == "evm":
+                    balances = self.get_eth_balances(addresses, wallet)
+                    chunk_balances = [balances.get(address) for address in addresses]
+                else:
+                    chunk_balances = executor.map(lambda address: self.get_balance(address, wallet), addresses)
+                for entry, balance in zip(chunk, chunk_balances):
+                    self.check(None, entry.get("label", wallet["name"]), entry["address"], balance, wallet)
+
     def notify(self, message):
-        if self.app["discord"] is not None:
-            discord_client = self.app["discord"]
-            if discord_client.loop:
-                subscriptions = discord_client.subscriptions
-                msg = None
-                user = ""
-                for sub in subscriptions:
-                    if sub["validator"] == message['args']['validator']:
-                        user += f" <@{sub['user']}>"
-
-                if message['type'] == "low_balance":
-                    msg = discord_client.compose_embed(
-                        title = f"{message['args']['moniker']} has low balance!",
-                        description = "Peggo Address: " + message['args']['address'],
-                        fields = [
-                            {
-                                "name": "Balance",
-                                "value": message['args']['balance'],
-                                "inline": True
-                            }
-                        ],
-                        footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                        color = 0xffd100
-                    )
-                elif message['type'] == "invalid_address":
-                    msg = discord_client.compose_embed(
-                        title = f"Invalid address!",
-                        description = "Peggo Address: " + message['args']['address'],
-                        footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                        color = 0xffd100
-                    )
+        dispatch(self.app, self, message)
 
-                if discord_client.mode == "chain":
-                    future = asyncio.run_coroutine_threadsafe(
-                        discord_client.reply(
-                            discord_client.channels["wallet"]["id"],
-                            msg,
-                            user,
-                            message['auto_delete']
-                        ),
-                        discord_client.loop
-                    )
-                    # Optionally, wait for the coroutine to finish and handle exceptions
-                    future.result()
-                elif discord_client.mode == "single":
-                    for sub in subscriptions:
-                        if sub["validator"] == message["args"]["validator"]:
-                            future = asyncio.run_coroutine_threadsafe(
-                                discord_client.reply(
-                                    discord_client.channels["wallet"]["id"],
-                                    msg,
-                                    auto_delete=message['auto_delete']
-                                ),
-                                discord_client.loop
-                            )
-                            # Optionally, wait for the coroutine to finish and handle exceptions
-                            future.result()
-            else:
-                self.logger.error("Discord client loop not ready.")
-        else:
-            self.logger.error("Discord client is not initialized.")
-
-        # Slack 
-        #if self.app["slack"] is not None and len(self.app["slack"].subscriptions):
-        if self.app["slack"] is not None:
-            slack_client = self.app["slack"]
-            subscriptions = slack_client.subscriptions
-            user = ""
-            msg = None
-            for sub in subscriptions:
-                    if sub.get("validator") == message['args']['validator']:
-                        user += f" <@{sub['user']}>"
-            
-            # for sub in subscriptions:
-            #     if sub["validator"] == message['args']['validator']:
-            if message['type'] == "low_balance":
-                msg = f"""
-{user} {message['args']['moniker']} has low balance!
-Balance: `{message['args']['balance']}`
-Address: `{message['args']['address']}`
-                """
-            elif message['type'] == "invalid_address":
-                msg = f"Invalid address: `{message['args']['address']}`!"
-
-            slack_client.reply(
-                msg,
-                slack_client.channels["wallet"]["webhook_url"],
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        subscriptions = discord_client.subscriptions
+        user = ""
+        for sub in subscriptions.matching(message['args']['validator'], message['args']['address']):
+            user += f" <@{sub['user']}>"
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
+
+        if discord_client.mode == "chain":
+            future = asyncio.run_coroutine_threadsafe(
+                discord_client.alert(
+                    discord_client.channels["wallet"]["id"],
+                    msg,
+                    user,
+                    message['auto_delete']
+                ),
+                discord_client.loop
             )
-        else:
-            self.logger.error("Slack client is not initialized")
-
-        # Telegram
-        if self.app["telegram"] is not None and len(self.app["telegram"].subscriptions):
-            telegram_client = self.app["telegram"]
-            if telegram_client.loop:
-                subscriptions = telegram_client.subscriptions
-                msg = None
-                for sub in subscriptions:
-                    if "validator" in sub and sub["validator"] == message['args']['validator']:
-                        if message['type'] == "low_balance":
-                            msg = f"""
-{message['args']['moniker']} has low balance!
-Balance: `{message['args']['balance']}`
-Address: `{message['args']['address']}`
-                            """
-                        elif message['type'] == "invalid_address":
-                            msg = f"Invalid address: `{message['args']['address']}`!"
-
-                        future = asyncio.run_coroutine_threadsafe(
-                            telegram_client.reply(
-                                msg,
-                                sub["user"]
-                            ),
-                            telegram_client.loop
-                        )
-                        future.result()
-            else:
-                self.logger.error("Telegram client loop not ready.")
-        else:
-            self.logger.error("Telegram client is not initialized")
+            # Optionally, wait for the coroutine to finish and handle exceptions
+            future.result()
+        elif discord_client.mode == "single":
+            for sub in subscriptions.matching(message['args']['validator'], message['args']['address']):
+                future = asyncio.run_coroutine_threadsafe(
+                    discord_client.alert(
+                        discord_client.channels["wallet"]["id"],
+                        msg,
+                        auto_delete=message['auto_delete']
+                    ),
+                    discord_client.loop
+                )
+                # Optionally, wait for the coroutine to finish and handle exceptions
+                future.result()
+
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        subscriptions = slack_client.subscriptions
+        user = ""
+        for sub in subscriptions.matching(message['args']['validator'], message['args']['address']):
+            user += f"<@{sub['user']}> "
+
+        slack_client.reply(
+            user + self.templates.render(message, "text"),
+            slack_client.channels["wallet"]["webhook_url"],
+            priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        msg = self.templates.render(message, "text")
+        for sub in telegram_client.subscriptions.matching(message['args']['validator'], message['args']['address']):
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
+                    msg,
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+            future.result()
 
     async def start_balances_polling(self):
         while True:
             time.sleep(30)
             self.logger.info("Fetching addresses balance status ...")
+            # validators.json holds the bonded set maintained by the validators feature
             with open("validators.json", "r") as f:
                 validators = json.load(f)
-                for val in validators:
-                    self.logger.debug(f"Checking balance: {val['moniker']}")
-                    try:
-                        val_info = query.query(self.apis, path=f"/cosmos/staking/v1beta1/validators/{val['operator_address']}")
-                        if val_info["validator"]["status"] != "BOND_STATUS_BONDED":
-                            self.logger.debug(f"Skipping balance check for inactive validator: {val['moniker']}")
-                            continue
-                    except Exception as e:
-                        self.logger.error(f"Error fetching validator status for {val['moniker']}: {e}")
-                        continue
-                    address = query.query(self.apis, path=f"/peggy/v1/query_delegate_keys_by_validator?validator_address={val['operator_address']}")
-                    self.check(val['operator_address'], val['moniker'], address["orchestrator_address"])
-                    time.sleep(5)
-                    
+
+            with ThreadPoolExecutor(max_workers=self.params.get("concurrency", 8)) as executor:
+                keys = list(executor.map(self.get_delegate_keys, validators))
+                operators = [(val, key) for val, key in zip(validators, keys) if key is not None]
+                eth_addresses = [
+                    key["eth_address"] for _, key in operators
+                    if key["eth_address"].startswith("0x") and self.history.is_due(key["eth_address"])
+                ]
+                eth_balances = executor.submit(self.get_eth_balances, eth_addresses) if self.jsonrpcs and eth_addresses else None
+                operators = [(val, key) for val, key in operators if self.history.is_due(key["orchestrator_address"])]
+                inj_balances = list(executor.map(self.get_inj_balance, [key["orchestrator_address"] for _, key in operators]))
+                eth_balances = eth_balances.result() if eth_balances is not None else {}
+                self.check_watchlists(executor)
+
+            for (val, key), inj_balance in zip(operators, inj_balances):
+                self.logger.debug(f"Checking balance: {val['moniker']}")
+                self.check(val['operator_address'], val['moniker'], key["orchestrator_address"], inj_balance)
+            for val, key in zip(validators, keys):
+                if key is not None and key["eth_address"] in eth_balances:
+                    self.check(val['operator_address'], val['moniker'], key["eth_address"], eth_balances[key["eth_address"]])
+            self.history.save()
+
             time.sleep(self.params["interval"] - 30)
             
             # for platform in ["discord", "slack", "telegram"]:
@@ -1,53 +1,263 @@
 import utils.query as query
+from utils.outbox import dispatch
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
+import asyncio
 import logging
 import re
 import json
+import threading
+import time
 
-def get_consensus(rpcs):
+BIT_ARRAY = re.compile(r":([^}]+)}")
+
+def parse_bit_array(bit_array) -> list:
     """
-    Fetching the current consensus state
+    Parses the `x`/`_` votes of a Tendermint bit array string into booleans
     """
-    consensus_info = {}
+    match = BIT_ARRAY.search(bit_array or "")
+    return [bit == "x" for bit in match.group(1)] if match else []
+
+def load_monikers() -> dict:
     with open("validators.json", "r") as f:
         validators = json.load(f)
-        f.close()
+    return {val.get("hex"): val.get("moniker") for val in validators}
+
+def fetch_valset(rpcs, height, per_page=100) -> list:
+    """
+    Fetching every page of the validator set at a height, ordered by bit array position
+    """
+    validators = []
+    page = 1
+    while True:
+        data = query.query(rpcs, path=f"/validators?height={height}&page={page}&per_page={per_page}")
+        result = data.get("result", {})
+        validators += result.get("validators", [])
+        if not result.get("validators") or len(validators) >= int(result.get("total", 0)):
+            return validators
+        page += 1
+
+
+class ValsetCache:
+    """
+    Bit array position -> validator map of the latest validator set, keyed by its hash
+    so the full set is only refetched when it changes
+    """
+    def __init__(self, per_page=100):
+        self.per_page = per_page
+        self.hash = None
+        self.height = None
+        self.rpcs = None
+        self.valset: list = []
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Consensus")
+
+    def get(self, rpcs, height) -> list:
+        with self.lock:
+            if height == self.height and rpcs == self.rpcs:
+                return self.valset
+            # the header of height - 1 commits to the validator set signing `height`
+            data = query.query(rpcs, path=f"/commit?height={height - 1}")
+            valset_hash = data["result"]["signed_header"]["header"]["next_validators_hash"]
+            if valset_hash != self.hash:
+                monikers = load_monikers()
+                self.valset = [
+                    {
+                        "address": val.get("address"),
+                        "moniker": monikers.get(val.get("address"), val.get("address")),
+                        "voting_power": int(val.get("voting_power", 0))
+                    }
+                    for val in fetch_valset(rpcs, height, self.per_page)
+                ]
+                self.hash = valset_hash
+                self.logger.info(f"Validator set {valset_hash} loaded at height {height} ({len(self.valset)} validators)")
+            self.height = height
+            self.rpcs = rpcs
+            return self.valset
+
+valsets = ValsetCache()
+
+def parse_round_state(consensus_state, valset) -> dict:
+    """
+    Parses a `/consensus_state` round state against the validator set it was voted with,
+    tallying prevotes and precommits by voting power
+    """
+    consensus_info = {}
+    height_round_step = consensus_state.get("height/round/step", "")
+    if height_round_step:
+        height, round_num, step = height_round_step.split("/")
+        consensus_info["height"] = int(height)
+        consensus_info["round"] = int(round_num)
+        consensus_info["step"] = int(step)
+    height_vote_set = consensus_state.get("height_vote_set", [])
+    current_round_state = height_vote_set[-1] if height_vote_set else {}
+    prevotes = parse_bit_array(current_round_state.get("prevotes_bit_array", ""))
+    precommits = parse_bit_array(current_round_state.get("precommits_bit_array", ""))
+    consensus_info["proposer"] = consensus_state.get("proposer", {}).get("index", -1)
+
+    if prevotes and len(prevotes) != len(valset):
+        logging.warning(f"Bit array of {len(prevotes)} votes does not match the validator set of {len(valset)}")
+
+    total_power = prevotes_power = precommits_power = 0
+    consensus_info["validator"] = []
+    for id, val in enumerate(valset):
+        power = val["voting_power"]
+        total_power += power
+        prevoted = id < len(prevotes) and prevotes[id]
+        precommitted = id < len(precommits) and precommits[id]
+        prevotes_power += power if prevoted else 0
+        precommits_power += power if precommitted else 0
+        consensus_info["validator"].append({
+            "moniker": val["moniker"],
+            "prevotes": "✅" if prevoted else "❌",
+            "precommits": "✅" if precommitted else "❌",
+            "address": val["address"],
+            "voting_power": power
+        })
+    consensus_info["prevotes_percent"] = round(100 * prevotes_power / total_power, 2) if total_power else 0
+    consensus_info["precommits_percent"] = round(100 * precommits_power / total_power, 2) if total_power else 0
+    return consensus_info
 
+def get_consensus(rpcs, valsets=valsets):
+    """
+    Fetching the current consensus state
+    """
     try:
         data = query.query(rpcs, path=f"/consensus_state")
         consensus_state = data.get("result", {}).get("round_state", {})
-        logging.info(f"Consensus state: {consensus_state}") 
-        data = query.query(rpcs, path=f"/validators?per_page=300")
-        valset = data.get("result", {}).get("validators", [])
-        height_round_step = consensus_state.get("height/round/step", "")
-        if height_round_step:
-            height, round_num, step = height_round_step.split("/")
-            consensus_info["height"] = int(height)
-            consensus_info["round"] = int(round_num)
-            consensus_info["step"] = int(step)
-        height_vote_set = consensus_state.get("height_vote_set", [])
-        current_round_state = height_vote_set[-1] if height_vote_set else {}
-        prevotes_bit_array = current_round_state.get("prevotes_bit_array", "")
-        precommits_bit_array = current_round_state.get("precommits_bit_array", "")
-        consensus_info["prevotes_percent"] = prevotes_bit_array.split("=")[-1].strip()
-        consensus_info["precommits_percent"] = precommits_bit_array.split("=")[-1].strip()
-        consensus_info["proposer"] = consensus_state.get("proposer", {}).get("index", -1) 
-        prevotes = re.search(r":([^}]+)}", prevotes_bit_array).group(1)
-        precommits = re.search(r":([^}]+)}", precommits_bit_array).group(1)
-        consensus_info["validator"] = [] 
-        for id in range(len(prevotes)):
-            address = valset[id].get("address")
-            for val in validators:
-                if address == val.get("hex"):
-                    consensus_info["validator"].append({
-                        "moniker": val.get("moniker"),
-                        "prevotes": "✅" if prevotes[id] == "x" else "❌",
-                        "precommits": "✅" if precommits[id] == "x" else "❌",
-                        "address": address
-                    })
-                    break
-        return consensus_info
+        logging.info(f"Consensus state: {consensus_state}")
+        height = int(consensus_state["height/round/step"].split("/")[0])
+        return parse_round_state(consensus_state, valsets.get(rpcs, height))
     except Exception as e:
         logging.error(f"Error fetching consensus: {e}")
         return {
             "error": f"Error fetching consensus: {e}",
         }
+
+
+TEMPLATES = {
+    "consensus_stall": AlertTemplate(
+        title="Chain halted at height {height}!",
+        description="No new block for {stalled_for} (round {round})",
+        fields=[
+            ("Prevotes", "{prevotes_percent}%"),
+            ("Precommits", "{precommits_percent}%")
+        ],
+        color=0xff0000
+    )
+}
+
+class ConsensusWatcher:
+    """
+    Polls the consensus state in the background so commands read the latest round from memory,
+    and alerts when the chain stops producing blocks
+    """
+    def __init__(self, app, rpcs, params):
+        self.app: dict = app
+        self.rpcs: list = rpcs
+        self.params: dict = params
+        self.templates = Templates(TEMPLATES, params)
+        self.interval: float = params.get("interval", 2)
+        self.stall_seconds: int = params.get("stall_seconds", 60)
+        self.alert_repeat_seconds: int = params.get("alert_repeat_seconds", 600)
+        self.snapshot: dict = {}
+        self.valsets = ValsetCache(params.get("validators_per_page", 100))
+        self.last_height = None
+        self.last_height_at = time.time()
+        self.last_alert_at = None
+
+        self.logger = logging.getLogger("Consensus")
+        self.logger.setLevel(logging.INFO)
+
+    def get_snapshot(self) -> dict:
+        return self.snapshot
+
+    def poll(self):
+        data = query.query(self.rpcs, path=f"/consensus_state")
+        consensus_state = data.get("result", {}).get("round_state", {})
+        height = int(consensus_state["height/round/step"].split("/")[0])
+        snapshot = parse_round_state(consensus_state, self.valsets.get(self.rpcs, height))
+        snapshot["updated_at"] = time.time()
+        self.snapshot = snapshot
+        return snapshot
+
+    def check_stall(self, height, now=None):
+        now = now or time.time()
+        if height != self.last_height:
+            self.last_height = height
+            self.last_height_at = now
+            self.last_alert_at = None
+            return
+        stalled_for = now - self.last_height_at
+        if stalled_for < self.stall_seconds:
+            return
+        if self.last_alert_at is not None and now - self.last_alert_at < self.alert_repeat_seconds:
+            return
+        self.last_alert_at = now
+        self.logger.info(f"Height {height} stalled for {stalled_for:.0f}s")
+        self.notify({
+            "type": "consensus_stall",
+            "args": {
+                "height": height,
+                "round": self.snapshot.get("round"),
+                "stalled_for": f"{stalled_for:.0f}s",
+                "prevotes_percent": self.snapshot.get("prevotes_percent"),
+                "precommits_percent": self.snapshot.get("precommits_percent")
+            }
+        })
+
+    def notify(self, message):
+        dispatch(self.app, self, message)
+
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
+        future = asyncio.run_coroutine_threadsafe(
+            discord_client.alert(
+                discord_client.channels["consensus"]["id"],
+                msg,
+                auto_delete = None
+            ),
+            discord_client.loop
+        )
+        future.result()
+
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        slack_client.reply(
+                self.templates.render(message, "text"),
+                slack_client.channels["consensus"]["webhook_url"],
+                priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        msg = self.templates.render(message, "text")
+        for sub in telegram_client.subscriptions.for_topic("consensus"):
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
+                    msg,
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+            future.result()
+
+    async def start_consensus_polling(self):
+        while True:
+            try:
+                snapshot = self.poll()
+                self.check_stall(snapshot.get("height"))
+            except Exception as e:
+                self.logger.error(f"Error fetching consensus: {e}")
+            await asyncio.sleep(self.interval)
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self.start_consensus_polling())
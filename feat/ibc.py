@@ -3,11 +3,66 @@ import asyncio
 import json
 import time
 from datetime import datetime
+from urllib.parse import quote
 
 import requests
 from requests.exceptions import RequestException
 
 import utils.query as query
+from utils.outbox import dispatch
+from utils.store import load_json, save_json
+from utils.heads import HeadTracker
+from feat.ibc_alerts import AlertStateStore
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
+
+def pending_for(args, params):
+    """
+    How long the packets have been seen pending, from the commitment diff state
+    """
+    if args.get("pending_seconds") is None:
+        return None
+    return f"{args['pending_seconds'] / 3600:,.1f}h"
+
+TEMPLATES = {
+    "client": AlertTemplate(
+        title=lambda args, params: f"Client {args['client']} is about to expire!" if args['time_left'] > 0 else f"Client {args['client']} was expired!",
+        fields=[
+            ("From", "{chain-1}"),
+            ("To", "{chain-2}"),
+            ("Last Updated", "{last_updated}"),
+            ("Time Left", "{time_left}")
+        ],
+        color=0xff941a
+    ),
+    "packets": AlertTemplate(
+        title="Uncommitted packets from {chain-1} to {chain-2}",
+        description="{url}",
+        fields=[
+            ("From", "{chain-1}"),
+            ("To", "{chain-2}"),
+            ("Port", "{port}"),
+            ("Channel", "{channel}"),
+            ("Missed", "{quantity}"),
+            ("Pending For", pending_for)
+        ],
+        color=0xfff942
+    ),
+    "packet": AlertTemplate(
+        title="Pending packet `{sequence}` from {chain-1} to {chain-2}",
+        description="{url}",
+        fields=[
+            ("From", "{chain-1}"),
+            ("To", "{chain-2}"),
+            ("Port", "{port}"),
+            ("Channel", "{channel}"),
+            ("Sequence", "{sequence}"),
+            ("Pending Blocks", lambda args, params: args.get("pending_blocks")),
+            ("Pending For", pending_for)
+        ],
+        color=0xfff942
+    )
+}
 
 class IBC:
     def __init__(self, app, params):
@@ -15,14 +70,26 @@ class IBC:
         self.logger.setLevel(logging.DEBUG)
         self.app = app
         self.params = params
+        self.templates = Templates(TEMPLATES, params)
         self.client_update_threshold = params["client_update_threshold"]
         self.client_warning_repeat_seconds = params.get("client_warning_repeat_seconds")
         self.client_expired_repeat_seconds = params.get("client_expired_repeat_seconds")
         self.stuck_packets_threshold = params["stuck_packets_threshold"]
         self.alert_confirmation_seconds = params.get("alert_confirmation_seconds", 180)
         self.ibcs = []
-        self.alert_candidates = {}
-        self.client_alert_state = {}
+        self.alert_state = AlertStateStore(
+            params.get("alert_state_file", "ibc_alert_state.json"),
+            params.get("alert_state_snapshot_seconds", 60)
+        )
+        self.packet_state = {}
+        self.send_heights_file = params.get("send_heights_file", "ibc_send_heights.json")
+        self.send_heights = load_json(self.send_heights_file, {})
+        self.send_heights_dirty = False
+        self.heads = HeadTracker()
+        self.stream = None
+        if params.get("stream_packets"):
+            from feat.ibc_stream import IBCStream
+            self.stream = IBCStream(self.heads)
 
     def getIgnorePackets(self) -> list:
         try:
@@ -64,52 +131,47 @@ class IBC:
             return payload
 
         now = time.time()
-        candidate = self.alert_candidates.get(key)
+        candidate = self.alert_state.get_candidate(key)
         if candidate:
             candidate["last_seen"] = now
             candidate["payload"] = payload
             if now - candidate["first_seen"] >= self.alert_confirmation_seconds:
-                self.alert_candidates.pop(key, None)
+                self.alert_state.pop_candidate(key)
                 return payload
+            self.alert_state.set_candidate(key, candidate)
         else:
-            self.alert_candidates[key] = {
+            self.alert_state.set_candidate(key, {
                 "first_seen": now,
                 "last_seen": now,
                 "payload": payload
-            }
+            })
         return None
 
     def _clear_inactive_alerts(self, source_id, dest_id, channel, port, active_keys):
-        for key in list(self.alert_candidates.keys()):
-            if (
-                len(key) >= 5
-                and key[1] == str(source_id)
-                and key[2] == str(dest_id)
-                and key[3] == str(channel)
-                and key[4] == str(port)
-                and key not in active_keys
-            ):
-                self.alert_candidates.pop(key, None)
+        self.alert_state.clear_inactive(
+            (str(source_id), str(dest_id), str(channel), str(port)),
+            active_keys
+        )
 
     def _client_alert_key(self, client, chain_1, chain_2):
         return (str(client), str(chain_1), str(chain_2))
 
     def _reset_client_alert(self, key):
-        self.client_alert_state.pop(key, None)
+        self.alert_state.pop_client(key)
 
     def _should_send_client_alert(self, key, state, repeat_seconds):
         now = time.time()
-        entry = self.client_alert_state.get(key)
+        entry = self.alert_state.get_client(key)
         if entry is None or entry["state"] != state:
-            self.client_alert_state[key] = {"state": state, "last_sent": now}
+            self.alert_state.set_client(key, {"state": state, "last_sent": now})
             return True
         if repeat_seconds is None:
-            entry["last_sent"] = now
+            self.alert_state.set_client(key, {"state": state, "last_sent": now})
             return True
         if repeat_seconds <= 0:
             return False
         if now - entry["last_sent"] >= repeat_seconds:
-            entry["last_sent"] = now
+            self.alert_state.set_client(key, {"state": state, "last_sent": now})
             return True
         return False
 
@@ -152,27 +214,98 @@ class IBC:
     def _validate_packets(self, primary_packets, reference_packets, chain, channel, port):
         if reference_packets is None:
             return
-        primary_sequences = sorted(p["sequence"] for p in primary_packets)
-        reference_sequences = sorted(p["sequence"] for p in reference_packets)
+        primary_sequences = {int(p["sequence"]) for p in primary_packets}
+        reference_sequences = {int(p["sequence"]) for p in reference_packets}
         if primary_sequences != reference_sequences:
             self.logger.warning(
                 "Packet commitments mismatch between primary APIs and reference endpoint "
-                f"for {chain} {channel}/{port}. primary={primary_sequences}, "
-                f"reference={reference_sequences}"
+                f"for {chain} {channel}/{port}. "
+                f"primary_only={sorted(primary_sequences - reference_sequences)}, "
+                f"reference_only={sorted(reference_sequences - primary_sequences)}"
             )
 
-    def getIBCList(self) -> list:
-        ibcs = []
+    def _diff_commitments(self, chain_id, channel, port, commitments):
+        """
+        Diff the current packet commitments of a channel end against the previous sweep.
+        The state is in memory, so after a restart `first_seen` (and the alerts' "Pending For")
+        counts from the first sweep of the new process
+        """
+        key = (str(chain_id), str(channel), str(port))
+        now = time.time()
+        current = {int(p["sequence"]) for p in commitments}
+        state = self.packet_state.get(key)
+        if state is None:
+            state = {"sequences": set(), "first_seen": {}}
+            self.packet_state[key] = state
+
+        added = current - state["sequences"]
+        cleared = state["sequences"] - current
+        for sequence in cleared:
+            state["first_seen"].pop(sequence, None)
+        for sequence in added:
+            state["first_seen"][sequence] = now
+        state["sequences"] = current
+        return added, cleared, state
+
+    def _send_height_key(self, chain_id, channel, sequence):
+        return f"{chain_id}/{channel}/{sequence}"
+
+    def _get_send_height(self, chain, chain_id, channel, port, sequence):
+        """
+        Height of the send_packet tx of a packet, cached since it never changes.
+        Sequences are per channel, so the search is scoped to the source channel end
+        """
+        key = self._send_height_key(chain_id, channel, sequence)
+        if key in self.send_heights:
+            return self.send_heights[key]
+        search = f"\"send_packet.packet_sequence={sequence} AND send_packet.packet_src_channel='{channel}' AND send_packet.packet_src_port='{port}'\""
+        tx_detail = query.query([f"https://rpc.cosmos.directory/{chain}"], path=f"/tx_search?query={quote(search, safe='')}")
+        if not tx_detail["result"] or not tx_detail["result"]["txs"]:
+            return None
+        self.send_heights[key] = int(tx_detail["result"]["txs"][0]["height"])
+        self.send_heights_dirty = True
+        return self.send_heights[key]
+
+    def _evict_send_heights(self, chain_id, channel, sequences):
+        for sequence in sequences:
+            if self.send_heights.pop(self._send_height_key(chain_id, channel, sequence), None) is not None:
+                self.send_heights_dirty = True
+
+    def _prune_send_heights(self, chain_id, channel, sequences):
+        """
+        Evict the cached send heights of packets that cleared while the bot was down
+        """
+        prefix = self._send_height_key(chain_id, channel, "")
+        stale = [key for key in self.send_heights if key.startswith(prefix) and int(key[len(prefix):]) not in sequences]
+        for key in stale:
+            del self.send_heights[key]
+        if stale:
+            self.send_heights_dirty = True
+
+    def _save_send_heights(self):
+        if not self.send_heights_dirty:
+            return
+        try:
+            save_json(self.send_heights_file, self.send_heights)
+            self.send_heights_dirty = False
+        except OSError as e:
+            self.logger.error(f"Error saving {self.send_heights_file}: {e}")
 
-        injective_detail = query.query(self.params["registry_api"], path="/injective/chain.json")
-        apis = injective_detail["apis"]["rest"]
-        chain_1_apis = [
+    def _registry_addresses(self, chain_detail, kind):
+        return [
             api["address"]
             if api["address"].startswith("https://") or api["address"].startswith("http://")
             else "https://" + api["address"]
-            for api in apis
+            for api in chain_detail["apis"].get(kind, [])
         ]
 
+    def getIBCList(self) -> list:
+        ibcs = []
+
+        injective_detail = query.query(self.params["registry_api"], path="/injective/chain.json")
+        chain_1_apis = self._registry_addresses(injective_detail, "rest")
+        chain_1_rpcs = self._registry_addresses(injective_detail, "rpc")
+
         chain_1_apis = self._filter_active_apis(chain_1_apis, "injective")
         if not chain_1_apis:
             return []
@@ -203,13 +336,7 @@ class IBC:
 
             try:
                 chain_2_detail = query.query(self.params["registry_api"], path=f"/{chain_2_name}/chain.json")
-                apis = chain_2_detail["apis"]["rest"]
-                chain_2_apis = [
-                    api["address"]
-                    if api["address"].startswith("https://") or api["address"].startswith("http://")
-                    else "https://" + api["address"]
-                    for api in apis
-                ]
+                chain_2_apis = self._registry_addresses(chain_2_detail, "rest")
 
                 chain_2_apis = self._filter_active_apis(chain_2_apis, chain_2_name)
                 if not chain_2_apis:
@@ -227,12 +354,14 @@ class IBC:
                     "channel-1": chain_1_channel,
                     "port-1": chain_1_port,
                     "api-1": chain_1_apis,
+                    "rpc-1": chain_1_rpcs,
                     "chain-2": chain_2_name,
                     "id-2": chain_2_id,
                     "client-2": chain_2_client["identified_client_state"]["client_id"],
                     "channel-2": chain_2_channel,
                     "port-2": chain_2_port,
-                    "api-2": chain_2_apis
+                    "api-2": chain_2_apis,
+                    "rpc-2": self._registry_addresses(chain_2_detail, "rpc")
                 })
             except Exception as e:
                 self.logger.error(f"Error fetching {chain_2_name} detail: {e}")
@@ -252,8 +381,7 @@ class IBC:
         last_updated_height = client_state["client_state"]["latest_height"]["revision_height"]
         trusting_period = int(client_state["client_state"]["trusting_period"][:-1])
         try:
-            block_detail = query.query(dest_apis, path=f"/cosmos/base/tendermint/v1beta1/blocks/{last_updated_height}")
-            block_time = block_detail["block"]["header"]["time"]
+            block_time = self.heads.block_time(chain_2, dest_apis, last_updated_height)
             block_time = block_time.split(".")[0] + "Z"
             time_since_last_updated = (datetime.now() - datetime.strptime(block_time, "%Y-%m-%dT%H:%M:%SZ")).total_seconds()
             time_left = trusting_period - time_since_last_updated
@@ -287,351 +415,151 @@ class IBC:
             self.logger.error(f"Error checking client {client} on {dest_apis}: {e}")
 
 
+    def checkPackets(self, ibc, src, dst):
+        """
+        Check the packet commitments of one end of an IBC channel
+        """
+        chain, chain_id, channel, port, apis = (
+            ibc[f"chain-{src}"], ibc[f"id-{src}"], ibc[f"channel-{src}"], ibc[f"port-{src}"], ibc[f"api-{src}"]
+        )
+        data = query.query(apis, path=f"/ibc/core/channel/v1/channels/{channel}/ports/{port}/packet_commitments")
+        commitments = data["commitments"]
+        reference_packets = self._fetch_reference_packets(chain, channel, port)
+        self._validate_packets(commitments, reference_packets, chain, channel, port)
+        first_sweep = (str(chain_id), str(channel), str(port)) not in self.packet_state
+        added, cleared, state = self._diff_commitments(chain_id, channel, port, commitments)
+        self._evict_send_heights(chain_id, channel, cleared)
+        if first_sweep:
+            self._prune_send_heights(chain_id, channel, state["sequences"])
+        if added or cleared:
+            self.logger.debug(f"{chain} {channel}/{port}: {len(added)} new, {len(cleared)} cleared packet commitments.")
+        ibc[f"packet-{src}"] = len(state["sequences"])
+        tracker = self.stream.tracker(chain) if self.stream else None
+        if tracker is not None:
+            tracker.reconcile(channel, state["sequences"])
+        ignore_all, ignore_packets = self._get_ignore_entry(chain_id, channel)
+        pending = set() if ignore_all else {seq for seq in state["sequences"] if str(seq) not in ignore_packets}
+        active_keys = set()
+        now = time.time()
+
+        if len(state["sequences"]) >= self.stuck_packets_threshold:
+            if len(state["sequences"]) == 1:
+                if pending:
+                    sequence = next(iter(pending))
+                    tx_block = tracker.send_height(channel, sequence) if tracker is not None else None
+                    if tx_block is None:
+                        tx_block = self._get_send_height(chain, chain_id, channel, port, sequence)
+                    pending_blocks = self.heads.height(chain, apis) - tx_block if tx_block else None
+                    if pending_blocks is None or (pending_blocks is not None and pending_blocks <= 50000):
+                        payload = {
+                            "type": "packet",
+                            "args": {
+                                "chain-1": chain,
+                                "chain-2": ibc[f"chain-{dst}"],
+                                "port": port,
+                                "channel": channel,
+                                "sequence": str(sequence),
+                                "pending_blocks": pending_blocks,
+                                "pending_seconds": int(now - state["first_seen"][sequence]),
+                                "url": f"https://rest.cosmos.directory/{chain}/ibc/core/channel/v1/channels/{channel}/ports/{port}/packet_commitments/{sequence}"
+                            },
+                            "auto_delete": None
+                        }
+                        key = self._make_alert_key("packet", chain_id, ibc[f"id-{dst}"], channel, port, sequence)
+                        active_keys.add(key)
+                        message = self._track_alert_candidate(key, payload)
+                        if message:
+                            self.notify(message)
+            elif pending:
+                payload = {
+                    "type": "packets",
+                    "args": {
+                        "quantity": len(pending),
+                        "chain-1": chain,
+                        "chain-2": ibc[f"chain-{dst}"],
+                        "port": port,
+                        "channel": channel,
+                        "pending_seconds": int(now - min(state["first_seen"][seq] for seq in pending)),
+                        "url": f"https://rest.cosmos.directory/{chain}/ibc/core/channel/v1/channels/{channel}/ports/{port}/packet_commitments"
+                    },
+                    "auto_delete": None
+                }
+                key = self._make_alert_key("packets", chain_id, ibc[f"id-{dst}"], channel, port)
+                active_keys.add(key)
+                message = self._track_alert_candidate(key, payload)
+                if message:
+                    self.notify(message)
+
+        self._clear_inactive_alerts(chain_id, ibc[f"id-{dst}"], channel, port, active_keys)
+
     async def queryIBCPackets(self):
         while True:
             self.ibcs = self.getIBCList()
             self.ibc_ignores = self.getIgnorePackets()
+            self.heads.begin_sweep()
+            if self.stream is not None:
+                for ibc in self.ibcs:
+                    self.stream.watch(ibc)
             for ibc in self.ibcs:
-                try:
-                    if ibc["client-1"] != "":
-                        self.checkClient(ibc["client-1"], ibc["api-1"], ibc["api-2"], ibc["chain-1"], ibc["chain-2"])
-                    data = query.query(ibc["api-1"], path=f"/ibc/core/channel/v1/channels/{ibc['channel-1']}/ports/{ibc['port-1']}/packet_commitments")
-                    commitments_1 = data["commitments"]
-                    reference_packets = self._fetch_reference_packets(ibc["chain-1"], ibc["channel-1"], ibc["port-1"])
-                    self._validate_packets(commitments_1, reference_packets, ibc["chain-1"], ibc["channel-1"], ibc["port-1"])
-                    ibc["packet-1"] = len(commitments_1)
-                    ignore_all, ignore_packets = self._get_ignore_entry(ibc["id-1"], ibc["channel-1"])
-                    active_keys = set()
-
-                    if len(commitments_1) >= self.stuck_packets_threshold:
-                        if len(commitments_1) == 1:
-                            sequence = commitments_1[0]["sequence"]
-                            if not ignore_all and str(sequence) not in ignore_packets:
-                                tx_detail = query.query([f"https://rpc.cosmos.directory/{ibc['chain-1']}"], path=f"/tx_search?query=%22send_packet.packet_sequence%3D{sequence}%22")
-                                tx_block = int(tx_detail["result"]["txs"][0]["height"]) if tx_detail["result"] else None
-                                current_block = int(query.query(ibc["api-1"], path="/cosmos/base/tendermint/v1beta1/blocks/latest")["block"]["header"]["height"])
-                                pending_blocks = current_block - tx_block if tx_block else None
-                                if pending_blocks is None or (pending_blocks is not None and pending_blocks <= 50000):
-                                    payload = {
-                                        "type": "packet",
-                                        "args": {
-                                            "chain-1": ibc["chain-1"],
-                                            "chain-2": ibc["chain-2"],
-                                            "port": ibc["port-1"],
-                                            "channel": ibc["channel-1"],
-                                            "sequence": sequence,
-                                            "pending_blocks": pending_blocks,
-                                            "url": f"https://rest.cosmos.directory/{ibc['chain-1']}/ibc/core/channel/v1/channels/{ibc['channel-1']}/ports/{ibc['port-1']}/packet_commitments/{sequence}"
-                                        },
-                                        "auto_delete": None
-                                    }
-                                    key = self._make_alert_key("packet", ibc["id-1"], ibc["id-2"], ibc["channel-1"], ibc["port-1"], sequence)
-                                    active_keys.add(key)
-                                    message = self._track_alert_candidate(key, payload)
-                                    if message:
-                                        self.notify(message)
-                        else:
-                            if not ignore_all:
-                                filtered_packets_1 = [p for p in commitments_1 if str(p["sequence"]) not in ignore_packets]
-                            else:
-                                filtered_packets_1 = []
-                            if len(filtered_packets_1) > 0:
-                                payload = {
-                                    "type": "packets",
-                                    "args": {
-                                        "quantity": len(filtered_packets_1),
-                                        "chain-1": ibc["chain-1"],
-                                        "chain-2": ibc["chain-2"],
-                                        "port": ibc["port-1"],
-                                        "channel": ibc["channel-1"],
-                                        "url": f"https://rest.cosmos.directory/{ibc['chain-1']}/ibc/core/channel/v1/channels/{ibc['channel-1']}/ports/{ibc['port-1']}/packet_commitments"
-                                    },
-                                    "auto_delete": None
-                                }
-                                key = self._make_alert_key("packets", ibc["id-1"], ibc["id-2"], ibc["channel-1"], ibc["port-1"])
-                                active_keys.add(key)
-                                message = self._track_alert_candidate(key, payload)
-                                if message:
-                                    self.notify(message)
-
-                    self._clear_inactive_alerts(ibc["id-1"], ibc["id-2"], ibc["channel-1"], ibc["port-1"], active_keys)
-
-                    self.logger.debug(f"{ibc['chain-1']}-{ibc['chain-2']} queried.")
-                except Exception as e:
-                    self.logger.error(f"Error querying {ibc['chain-1']}-{ibc['chain-2']}: {e}")
-
-                try:
-                    if ibc["client-2"] != "":
-                        self.checkClient(ibc["client-2"], ibc["api-2"], ibc["api-1"], ibc["chain-2"], ibc["chain-1"])
-                    data = query.query(ibc["api-2"], path=f"/ibc/core/channel/v1/channels/{ibc['channel-2']}/ports/{ibc['port-2']}/packet_commitments")
-                    commitments_2 = data["commitments"]
-                    reference_packets = self._fetch_reference_packets(ibc["chain-2"], ibc["channel-2"], ibc["port-2"])
-                    self._validate_packets(commitments_2, reference_packets, ibc["chain-2"], ibc["channel-2"], ibc["port-2"])
-                    ibc["packet-2"] = len(commitments_2)
-                    ignore_all, ignore_packets = self._get_ignore_entry(ibc["id-2"], ibc["channel-2"])
-                    active_keys = set()
-
-                    if len(commitments_2) >= self.stuck_packets_threshold:
-                        if len(commitments_2) == 1:
-                            sequence = commitments_2[0]["sequence"]
-                            if not ignore_all and str(sequence) not in ignore_packets:
-                                tx_detail = query.query([f"https://rpc.cosmos.directory/{ibc['chain-2']}"], path=f"/tx_search?query=%22send_packet.packet_sequence%3D{sequence}%22")
-                                tx_block = int(tx_detail["result"]["txs"][0]["height"]) if tx_detail["result"] else None
-                                current_block = int(query.query(ibc["api-2"], path="/cosmos/base/tendermint/v1beta1/blocks/latest")["block"]["header"]["height"])
-                                pending_blocks = current_block - tx_block if tx_block else None
-                                if pending_blocks is None or (pending_blocks is not None and pending_blocks <= 50000):
-                                    payload = {
-                                        "type": "packet",
-                                        "args": {
-                                            "chain-1": ibc["chain-2"],
-                                            "chain-2": ibc["chain-1"],
-                                            "port": ibc["port-2"],
-                                            "channel": ibc["channel-2"],
-                                            "sequence": sequence,
-                                            "pending_blocks": pending_blocks,
-                                            "url": f"https://rest.cosmos.directory/{ibc['chain-2']}/ibc/core/channel/v1/channels/{ibc['channel-2']}/ports/{ibc['port-2']}/packet_commitments/{sequence}"
-                                        },
-                                        "auto_delete": None
-                                    }
-                                    key = self._make_alert_key("packet", ibc["id-2"], ibc["id-1"], ibc["channel-2"], ibc["port-2"], sequence)
-                                    active_keys.add(key)
-                                    message = self._track_alert_candidate(key, payload)
-                                    if message:
-                                        self.notify(message)
-                        else:
-                            if not ignore_all:
-                                filtered_packets_2 = [p for p in commitments_2 if str(p["sequence"]) not in ignore_packets]
-                            else:
-                                filtered_packets_2 = []
-                            if len(filtered_packets_2) > 0:
-                                payload = {
-                                    "type": "packets",
-                                    "args": {
-                                        "quantity": len(filtered_packets_2),
-                                        "chain-1": ibc["chain-2"],
-                                        "chain-2": ibc["chain-1"],
-                                        "port": ibc["port-2"],
-                                        "channel": ibc["channel-2"],
-                                        "url": f"https://rest.cosmos.directory/{ibc['chain-2']}/ibc/core/channel/v1/channels/{ibc['channel-2']}/ports/{ibc['port-2']}/packet_commitments"
-                                    },
-                                    "auto_delete": None
-                                }
-                                key = self._make_alert_key("packets", ibc["id-2"], ibc["id-1"], ibc["channel-2"], ibc["port-2"])
-                                active_keys.add(key)
-                                message = self._track_alert_candidate(key, payload)
-                                if message:
-                                    self.notify(message)
-
-                    self._clear_inactive_alerts(ibc["id-2"], ibc["id-1"], ibc["channel-2"], ibc["port-2"], active_keys)
-
-                    self.logger.debug(f"{ibc['chain-2']}-{ibc['chain-1']} queried.")
-                except Exception as e:
-                    self.logger.error(f"Error querying {ibc['chain-2']}-{ibc['chain-1']}: {e}")
+                for src, dst in (("1", "2"), ("2", "1")):
+                    try:
+                        if ibc[f"client-{src}"] != "":
+                            self.checkClient(ibc[f"client-{src}"], ibc[f"api-{src}"], ibc[f"api-{dst}"], ibc[f"chain-{src}"], ibc[f"chain-{dst}"])
+                        self.checkPackets(ibc, src, dst)
+                        self.logger.debug(f"{ibc[f'chain-{src}']}-{ibc[f'chain-{dst}']} queried.")
+                    except Exception as e:
+                        self.logger.error(f"Error querying {ibc[f'chain-{src}']}-{ibc[f'chain-{dst}']}: {e}")
+                    self.alert_state.snapshot()
 
             with open("ibc.json", "w") as ibc_file:
                 json.dump(self.ibcs, ibc_file, indent=4)
+            self._save_send_heights()
+            self.alert_state.snapshot(force=True)
             self.logger.info("All IBC queried.")
             time.sleep(self.params["interval"])
 
     def notify(self, message):
-        try:
-            # Discord client
-            if self.app["discord"] is not None:
-                discord_client = self.app["discord"]
-                if discord_client.loop:
-                    if message["type"] == "client":
-                        msg = discord_client.compose_embed(
-                            title=f"**Client {message['args']['client']} is about to expire!**" if message['args']['time_left'] > 0 else f"**Client {message['args']['client']} was expired!**",
-                            description="",
-                            fields=[
-                                {
-                                    "name": "From",
-                                    "value": message['args']['chain-1'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "To",
-                                    "value": message['args']['chain-2'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Last Updated",
-                                    "value": message['args']['last_updated'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Time Left",
-                                    "value": message['args']['time_left'],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0xff941a
-                        )
-                    elif message["type"] == "packets":
-                        msg = discord_client.compose_embed(
-                            title=f"**Uncommitted packets from {message['args']['chain-1']} to {message['args']['chain-2']}**",
-                            description=message['args']['url'],
-                            fields=[
-                                {
-                                    "name": "From",
-                                    "value": message['args']['chain-1'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "To",
-                                    "value": message['args']['chain-2'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Port",
-                                    "value": message['args']['port'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Channel",
-                                    "value": message['args']['channel'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Missed",
-                                    "value": message['args']['quantity'],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0xfff942
-                        )
-                    elif message["type"] == "packet":
-                        msg = discord_client.compose_embed(
-                            title=f"**Pending packet `{message['args']['sequence']}` from {message['args']['chain-1']} to {message['args']['chain-2']}**",
-                            description=message['args']['url'],
-                            fields=[
-                                {
-                                    "name": "Port",
-                                    "value": message['args']['port'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Channel",
-                                    "value": message['args']['channel'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Sequence",
-                                    "value": message['args']['sequence'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Pending Blocks",
-                                    "value": message['args']['pending_blocks'],
-                                    "inline": True
-                                } if "pending_blocks" in message['args'] else {}
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0xfff942
-                        )
-                    future = asyncio.run_coroutine_threadsafe(
-                        discord_client.reply(
-                            discord_client.channels["ibc"]["id"],
-                            msg,
-                            auto_delete=message["auto_delete"]
-                        ),
-                        discord_client.loop
-                    )
-                    # Optionally, wait for the coroutine to finish and handle exceptions
-                    future.result()
-                else:
-                    self.logger.error("Discord client loop not ready.")
-            else:
-                self.logger.error("Discord client is not initialized.")
-
-            # Slack client
-            if self.app["slack"] is not None:
-                slack_client = self.app["slack"]
-                if message["type"] == "client":
-                    msg = f"""
-{f"**Client {message['args']['client']} is about to expire!**" if message['args']['time_left'] > 0 else f"**Client {message['args']['client']} was expired!**"}
-From: `{message['args']['chain-1']}`
-To: `{message['args']['chain-2']}`
-Last Updated: `{message['args']['last_updated']}`
-Time Left: `{message['args']['time_left']}`
-                                """
-                elif message["type"] == "packets":
-                    msg = f"""
-*Uncommitted packets from {message['args']['chain-1']} to {message['args']['chain-2']}*
-{message['args']['url']}
-From: `{message['args']['chain-1']}`
-To: `{message['args']['chain-2']}`
-Port: `{message['args']['port']}`
-Channel: `{message['args']['channel']}`
-Missed: `{message['args']['quantity']}`
-                                """
-                elif message["type"] == "packet":
-                    msg = f"""
-*Pending packet `{message['args']['sequence']}` from {message['args']['chain-1']} to {message['args']['chain-2']}*
-{message['args']['url']}
-From: `{message['args']['chain-1']}`
-To: `{message['args']['chain-2']}`
-Port: `{message['args']['port']}`
-Channel: `{message['args']['channel']}`
-Sequence: `{message['args']['sequence']}`
-{f"Pending Blocks: `{message['args']['pending_blocks']}`" if "pending_blocks" in message['args'] else ""}
-"""
-                slack_client.reply(
+        dispatch(self.app, self, message)
+
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
+        future = asyncio.run_coroutine_threadsafe(
+            discord_client.alert(
+                discord_client.channels["ibc"]["id"],
+                msg,
+                auto_delete=message["auto_delete"]
+            ),
+            discord_client.loop
+        )
+        # Optionally, wait for the coroutine to finish and handle exceptions
+        future.result()
+
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        slack_client.reply(
+            self.templates.render(message, "text"),
+            slack_client.channels["ibc"]["webhook_url"],
+            priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        msg = self.templates.render(message, "text")
+        for sub in telegram_client.subscriptions.for_topic("ibc"):
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
                     msg,
-                    slack_client.channels["ibc"]["webhook_url"],
-                )
-            else:
-                self.logger.error("Slack client is not initialized.")
-
-            # Telegram client
-            if self.app["telegram"] is not None and len(self.app["telegram"].subscriptions):
-                telegram_client = self.app["telegram"]
-                if telegram_client.loop:
-                    subscriptions = telegram_client.subscriptions
-                    for sub in subscriptions:
-                        if "sub" in sub and sub["sub"] == "ibc":
-                            if message["type"] == "client":
-                                msg = f"""
-{f"Client {message['args']['client']} is about to expire!" if message['args']['time_left'] > 0 else f"Client {message['args']['client']} was expired!"}
-From: `{message['args']['chain-1']}`
-To: `{message['args']['chain-2']}`
-Last Updated: `{message['args']['last_updated']}`
-Time Left: `{message['args']['time_left']}`
-                                """
-                            elif message["type"] == "packets":
-                                msg = f"Uncommitted packets from {message['args']['chain-1']} to {message['args']['chain-2']}\n" + \
-                                      f"`{message['args']['url']}`\n" + \
-                                      f"From: `{message['args']['chain-1']}`\n" + \
-                                      f"To: `{message['args']['chain-2']}`\n" + \
-                                      f"Port: `{message['args']['port']}`\n" + \
-                                      f"Channel: `{message['args']['channel']}`\n" + \
-                                      f"Missed: `{message['args']['quantity']}`\n"
-                            elif message["type"] == "packet":
-                                msg = f"Pending packet `{message['args']['sequence']}` from {message['args']['chain-1']} to {message['args']['chain-2']}\n" + \
-                                f"`{message['args']['url']}`\n" + \
-                                f"From: `{message['args']['chain-1']}`\n" + \
-                                f"To: `{message['args']['chain-2']}`\n" + \
-                                f"Port: `{message['args']['port']}`\n" + \
-                                f"Channel: `{message['args']['channel']}`\n" + \
-                                f"Sequence: `{message['args']['sequence']}`\n" + \
-                                (f"Pending Blocks: `{message['args']['pending_blocks']}`" if "pending_blocks" in message['args'] else "")
-                                
-                            future = asyncio.run_coroutine_threadsafe(
-                                telegram_client.reply(
-                                    msg,
-                                    sub["user"]
-                                ),
-                                telegram_client.loop
-                            )
-                            future.result()
-                else:
-                    self.logger.error("Telegram client loop not ready.")
-            else:
-                self.logger.error("Telegram client is not initialized.")
-        except Exception as e:
-            self.logger.error(f"Error sending message: {e}")
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+            future.result()
 
     def run(self):
         loop = asyncio.new_event_loop()
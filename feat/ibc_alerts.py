@@ -0,0 +1,82 @@
+import logging
+import time
+
+from utils.store import load_json, save_json
+
+class AlertStateStore:
+    """
+    IBC alert candidates and client alert state, indexed by (source, dest, channel, port)
+    and snapshotted to a local file so restarts resume the confirmation/repeat timers
+    """
+    def __init__(self, path="ibc_alert_state.json", snapshot_seconds=60):
+        self.path = path
+        self.snapshot_seconds = snapshot_seconds
+        self.candidates: dict = {} # channel key -> {alert key: candidate}
+        self.clients: dict = {} # client key -> {"state", "last_sent"}
+        self.dirty = False
+        self.last_snapshot = 0
+        self.logger = logging.getLogger("IBC")
+        self.load()
+
+    @staticmethod
+    def channel_key(alert_key):
+        return alert_key[1:5]
+
+    def load(self):
+        data = load_json(self.path, {})
+        for key, candidate in data.get("candidates", []):
+            key = tuple(key)
+            self.candidates.setdefault(self.channel_key(key), {})[key] = candidate
+        for key, entry in data.get("clients", []):
+            self.clients[tuple(key)] = entry
+
+    def get_candidate(self, key):
+        return self.candidates.get(self.channel_key(key), {}).get(key)
+
+    def set_candidate(self, key, candidate):
+        self.candidates.setdefault(self.channel_key(key), {})[key] = candidate
+        self.dirty = True
+
+    def pop_candidate(self, key):
+        channel_candidates = self.candidates.get(self.channel_key(key))
+        if channel_candidates and channel_candidates.pop(key, None) is not None:
+            self.dirty = True
+
+    def clear_inactive(self, channel_key, active_keys):
+        channel_candidates = self.candidates.get(channel_key)
+        if not channel_candidates:
+            return
+        for key in [key for key in channel_candidates if key not in active_keys]:
+            channel_candidates.pop(key)
+            self.dirty = True
+        if not channel_candidates:
+            self.candidates.pop(channel_key)
+
+    def get_client(self, key):
+        return self.clients.get(key)
+
+    def set_client(self, key, entry):
+        self.clients[key] = entry
+        self.dirty = True
+
+    def pop_client(self, key):
+        if self.clients.pop(key, None) is not None:
+            self.dirty = True
+
+    def snapshot(self, force=False):
+        now = time.time()
+        if not self.dirty or (not force and now - self.last_snapshot < self.snapshot_seconds):
+            return
+        try:
+            save_json(self.path, {
+                "candidates": [
+                    [list(key), candidate]
+                    for channel_candidates in self.candidates.values()
+                    for key, candidate in channel_candidates.items()
+                ],
+                "clients": [[list(key), entry] for key, entry in self.clients.items()]
+            })
+            self.dirty = False
+            self.last_snapshot = now
+        except OSError as e:
+            self.logger.error(f"Error saving {self.path}: {e}")
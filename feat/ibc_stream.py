@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+
+from utils.websocket import WebsocketClient
+
+NEW_BLOCK_HEADER = "tm.event='NewBlockHeader'"
+PACKET_EVENTS = ("send_packet", "recv_packet", "acknowledge_packet", "timeout_packet")
+
+class PacketTracker:
+    """
+    In-memory index of the in-flight packets sent by a chain, keyed by (channel, sequence)
+    """
+    def __init__(self, chain):
+        self.chain = chain
+        self.packets = {}
+        self.lock = threading.Lock()
+
+    def sent(self, channel, sequence, height):
+        with self.lock:
+            self.packets.setdefault((str(channel), int(sequence)), {"height": height, "received": None})
+
+    def received(self, channel, sequence, height):
+        with self.lock:
+            packet = self.packets.get((str(channel), int(sequence)))
+            if packet is not None:
+                packet["received"] = height
+
+    def settled(self, channel, sequence):
+        with self.lock:
+            self.packets.pop((str(channel), int(sequence)), None)
+
+    def send_height(self, channel, sequence):
+        with self.lock:
+            packet = self.packets.get((str(channel), int(sequence)))
+            return packet["height"] if packet else None
+
+    def reconcile(self, channel, sequences):
+        """
+        Drop packets of a channel whose commitments are gone (missed acknowledge/timeout events)
+        """
+        with self.lock:
+            for key in [key for key in self.packets if key[0] == str(channel) and key[1] not in sequences]:
+                self.packets.pop(key, None)
+
+
+class IBCStream:
+    """
+    Tracks in-flight IBC packets from send_packet/recv_packet/acknowledge_packet/timeout_packet events
+    """
+    def __init__(self, heads):
+        self.heads = heads
+        self.trackers: dict = {}
+        self.counterparties: dict = {} # (chain, channel) -> counterparty chain
+        self.logger = logging.getLogger("IBCStream")
+        self.logger.setLevel(logging.INFO)
+
+    def tracker(self, chain) -> PacketTracker:
+        return self.trackers.get(chain)
+
+    def watch(self, ibc):
+        for src, dst in (("1", "2"), ("2", "1")):
+            self.counterparties[(ibc[f"chain-{src}"], ibc[f"channel-{src}"])] = ibc[f"chain-{dst}"]
+            chain = ibc[f"chain-{src}"]
+            if chain not in self.trackers and ibc.get(f"rpc-{src}"):
+                self.trackers[chain] = PacketTracker(chain)
+                self._subscribe(chain, ibc[f"rpc-{src}"])
+
+    def _subscribe(self, chain, rpcs):
+        queries = [NEW_BLOCK_HEADER] + [
+            f"tm.event='Tx' AND {event}.packet_sequence EXISTS"
+            for event in PACKET_EVENTS
+        ]
+        events_queue = queue.Queue()
+        ws_client = WebsocketClient(
+            [rpc.replace("http", "ws") + "/websocket" for rpc in rpcs],
+            [
+                {
+                    "jsonrpc": "2.0",
+                    "method": "subscribe",
+                    "id": 0,
+                    "params": {"query": query}
+                }
+                for query in queries
+            ],
+            routes={query: events_queue for query in queries}
+        )
+        ws_thread = threading.Thread(target=ws_client.connect)
+        ws_thread.daemon = True
+        ws_thread.start()
+        consumer_thread = threading.Thread(target=self._consume, args=(chain, events_queue))
+        consumer_thread.daemon = True
+        consumer_thread.start()
+        self.logger.info(f"Streaming IBC packet events of {chain}.")
+
+    def _consume(self, chain, events_queue):
+        while True:
+            data = events_queue.get()
+            try:
+                self.handle(chain, data)
+            except Exception as e:
+                self.logger.error(f"Error handling {chain} event: {e}")
+
+    def handle(self, chain, data):
+        tracker = self.trackers[chain]
+        if data["result"]["query"] == NEW_BLOCK_HEADER:
+            self.heads.update(chain, int(data["result"]["data"]["value"]["header"]["height"]))
+            return
+
+        events = data["result"].get("events", {})
+        height = int(events.get("tx.height", [0])[0])
+        self.heads.update(chain, height)
+        for event in PACKET_EVENTS:
+            packets = zip(
+                events.get(f"{event}.packet_sequence", []),
+                events.get(f"{event}.packet_src_channel", []),
+                events.get(f"{event}.packet_dst_channel", [])
+            )
+            for sequence, src_channel, dst_channel in packets:
+                if event == "send_packet":
+                    # only monitored channels are reconciled against their commitments
+                    if (chain, src_channel) in self.counterparties:
+                        tracker.sent(src_channel, sequence, height)
+                elif event == "recv_packet":
+                    counterparty = self.trackers.get(self.counterparties.get((chain, dst_channel)))
+                    if counterparty is not None:
+                        counterparty.received(src_channel, sequence, height)
+                else:
+                    tracker.settled(src_channel, sequence)
@@ -1,16 +1,75 @@
 import time
 import utils.query as query
+from utils.outbox import dispatch
 import json
 import logging
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.delegates import DelegateKeyCache
+from utils.ratelimit import RateLimiter
+import utils.jsonrpc as jsonrpc
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
+
+STATE_LAST_EVENT_NONCE = "0x73b20547" # state_lastEventNonce()
+STATE_LAST_VALSET_NONCE = "0xb56561fe" # state_lastValsetNonce()
+
+TEMPLATES = {
+    "pending_valsets": AlertTemplate(
+        title="{moniker} hasn't signed in latest valset_confirms!",
+        fields=[
+            ("Last Height Checked", "{last_height}"),
+            ("Orchestrator Address", "{orchestrator}")
+        ],
+        color=0xffd100
+    ),
+    "pending_batches": AlertTemplate(
+        title="{moniker} hasn't signed in latest batch_confirms!",
+        fields=[
+            ("Orchestrator Address", "{orchestrator}"),
+            ("Pending Batches", lambda args, params: args.get("pending_batches")),
+            ("Last Height Checked", "{last_height}")
+        ],
+        color=0xffd100
+    ),
+    "nonce_mismatch": AlertTemplate(
+        title="{moniker}'s nonce is lagging behind!",
+        fields=[
+            ("Orchestrator Address", "{orchestrator}"),
+            ("Last Observed Nonce", "{last_observed_nonce}"),
+            ("Last Claimed Ethereum Event Nonce", "{last_claim_eth_event_nonce}"),
+            ("Last Height Checked", "{last_height}", False)
+        ],
+        color=0xffd100
+    ),
+    "ethereum_lag": AlertTemplate(
+        title="Injective is lagging behind the Peggy contract on Ethereum!",
+        fields=[
+            ("Ethereum Event Nonce", "{ethereum_event_nonce}"),
+            ("Last Observed Nonce", "{last_observed_nonce}"),
+            ("Ethereum Valset Nonce", "{ethereum_valset_nonce}"),
+            ("Latest Valset Nonce", "{latest_valset_nonce}"),
+            ("Ethereum Block", "{ethereum_block}", False)
+        ],
+        color=0xff941a
+    )
+}
 
 class Peggo:
-    def __init__(self, app, params, apis):
+    def __init__(self, app, params, apis, history=None, jsonrpcs=None):
         self.operators: dict = {}
         self.app: dict = app
         self.apis: str = apis
+        self.jsonrpcs: list = jsonrpcs or []
         self.params: dict = params
-        self.nonce_progress: dict = {}
+        self.templates = Templates(TEMPLATES, params)
+        self.peggy_contract: str = params.get("peggy_contract") or None
+        self.ethereum_alert_at = None
+        self.valset_lag_since = None # {"nonce": Ethereum valset nonce, "at": first seen behind}
+        self.history = history
+        self.nonce_progress: dict = history.rebuild() if history is not None else {}
+        self.limiter = RateLimiter(params.get("requests_per_second", 10))
+        self.delegate_keys = DelegateKeyCache(apis, params.get("delegate_keys_ttl", 86400), self.limiter)
         self.logger = logging.getLogger("Peggo")
         self.logger.setLevel(logging.INFO)
     
@@ -26,22 +85,108 @@ class Peggo:
             self.logger.error(f"Error fetching block height: {e}")
             return -1
 
-    def get_module_state(self) -> tuple[int, list]:
+    def get_module_state(self) -> tuple[int, set, set, int]:
         """
-        Fetching Last Observed Peggo Nonce
+        Fetching Last Observed Peggo Nonce, the orchestrators found in valset/batch confirms
+        and the latest valset nonce
         """
         try:
             data = query.query(self.apis, path=f"/peggy/v1/module_state")
             lon = int(data['state']['last_observed_nonce'])
-            valset_confirms = data["state"]["valset_confirms"]
-            batch_confirms = data["state"]["batch_confirms"]
-            return lon, valset_confirms, batch_confirms
+            valset_confirms = {confirm["orchestrator"] for confirm in data["state"]["valset_confirms"]}
+            batch_confirms = {confirm["orchestrator"] for confirm in data["state"]["batch_confirms"]}
+            valset_nonces = [int(valset["nonce"]) for valset in data["state"].get("valsets", [])]
+            latest_valset_nonce = max(valset_nonces) if valset_nonces else None
+            return lon, valset_confirms, batch_confirms, latest_valset_nonce
         except Exception as e:
             self.logger.error(f"Error fetching last observed nonce: {e}")
             return None
+
+    def get_snapshot(self) -> dict:
+        """
+        Fetching the chain-global Peggo state once per polling cycle
+        """
+        module_state = self.get_module_state()
+        if module_state is None:
+            return None
+        last_observed_nonce, valset_confirms, batch_confirms, latest_valset_nonce = module_state
+        return {
+            "last_height": self.get_height(),
+            "last_observed_nonce": last_observed_nonce,
+            "latest_valset_nonce": latest_valset_nonce,
+            "valset_confirms": valset_confirms,
+            "batch_confirms": batch_confirms
+        }
+
+    def get_ethereum_state(self) -> dict:
+        """
+        Fetching the Peggy contract nonces on Ethereum in a single JSON-RPC batch
+        """
+        try:
+            if self.peggy_contract is None:
+                data = query.query(self.apis, path="/peggy/v1/params")
+                self.peggy_contract = data["params"]["bridge_ethereum_address"]
+            block_number, event_nonce, valset_nonce = jsonrpc.batch(self.jsonrpcs, [
+                ("eth_blockNumber", []),
+                jsonrpc.eth_call(self.peggy_contract, STATE_LAST_EVENT_NONCE),
+                jsonrpc.eth_call(self.peggy_contract, STATE_LAST_VALSET_NONCE)
+            ])
+            return {
+                "block_number": jsonrpc.to_int(block_number),
+                "event_nonce": jsonrpc.to_int(event_nonce),
+                "valset_nonce": jsonrpc.to_int(valset_nonce)
+            }
+        except Exception as e:
+            self.logger.error(f"Error fetching Peggy contract state: {e}")
+            return None
+
+    def check_ethereum(self, snapshot: dict, ethereum_state: dict):
+        """
+        Compares the Ethereum-side Peggy nonces against what Injective has observed
+        """
+        now = time.time()
+        event_lag = (
+            ethereum_state["event_nonce"] - snapshot["last_observed_nonce"]
+            if ethereum_state["event_nonce"] is not None else 0
+        )
+        valset_lag = (
+            snapshot["latest_valset_nonce"] - ethereum_state["valset_nonce"]
+            if snapshot.get("latest_valset_nonce") is not None and ethereum_state["valset_nonce"] is not None else 0
+        )
+        if event_lag < self.params["threshold"] and not self.valset_stale(valset_lag, ethereum_state["valset_nonce"], now):
+            self.ethereum_alert_at = None
+            return
+        if self.ethereum_alert_at is not None and now - self.ethereum_alert_at < self.nonce_alert_repeat_seconds():
+            return
+        self.ethereum_alert_at = now
+        self.notify({
+            "type": "ethereum_lag",
+            "args": {
+                "validator": None,
+                "ethereum_event_nonce": f"{ethereum_state['event_nonce']:,}" if ethereum_state["event_nonce"] is not None else "N/A",
+                "last_observed_nonce": f"{snapshot['last_observed_nonce']:,}",
+                "ethereum_valset_nonce": f"{ethereum_state['valset_nonce']:,}" if ethereum_state["valset_nonce"] is not None else "N/A",
+                "latest_valset_nonce": f"{snapshot['latest_valset_nonce']:,}" if snapshot.get("latest_valset_nonce") is not None else "N/A",
+                "ethereum_block": f"{ethereum_state['block_number']:,}" if ethereum_state["block_number"] is not None else "N/A"
+            },
+            "auto_delete": None
+        })
         
+    def valset_stale(self, valset_lag, ethereum_valset_nonce, now) -> bool:
+        """
+        Peggo relays valsets to Ethereum lazily, so Ethereum being behind the latest valset
+        only counts once its valset nonce hasn't moved for `valset_grace_seconds`
+        """
+        if valset_lag <= 0:
+            self.valset_lag_since = None
+            return False
+        if self.valset_lag_since is None or self.valset_lag_since["nonce"] != ethereum_valset_nonce:
+            self.valset_lag_since = {"nonce": ethereum_valset_nonce, "at": now}
+        return now - self.valset_lag_since["at"] >= self.params.get("valset_grace_seconds", 86400)
+
     def get_lce(self, orchestrator) -> int:
         try:
+            self.limiter.acquire()
             data = query.query(self.apis, path=f"/peggy/v1/oracle/event/{orchestrator}")
             lce = int(data['last_claim_event']['ethereum_event_nonce'])
             return lce
@@ -49,6 +194,29 @@ class Peggo:
             self.logger.error(f"Error fetching last claim event: {e}")
             return None
 
+    def fetch_operator(self, validator) -> dict:
+        """
+        Fetching the per-operator Peggo data: delegate keys (cached) and last claim event nonce
+        """
+        valoper_address = validator['operator_address']
+        try:
+            operator = dict(self.delegate_keys.get(valoper_address))
+        except Exception as e:
+            self.logger.error(f"Error fetching delegate keys of {validator['moniker']}: {e}")
+            return None
+        operator["valoper_address"] = valoper_address
+        operator["moniker"] = validator['moniker']
+        operator["last_claim_eth_event_nonce"] = self.get_lce(operator["orchestrator_address"])
+        return operator
+
+    def fetch_operators(self, validators) -> list:
+        """
+        Fetching every operator concurrently, bounded by `concurrency` and `requests_per_second`
+        """
+        with ThreadPoolExecutor(max_workers=self.params.get("concurrency", 8)) as executor:
+            operators = executor.map(self.fetch_operator, validators)
+        return [operator for operator in operators if operator is not None]
+
     def nonce_progress_grace_seconds(self) -> int:
         if "nonce_progress_grace_seconds" in self.params:
             return self.params["nonce_progress_grace_seconds"]
@@ -79,41 +247,29 @@ class Peggo:
             progress_state["last_claim"] = current_claim
         self.nonce_progress[operator["valoper_address"]] = progress_state
 
-        if len(operator["valset_confirms"]) != 0:
-            check = False
-            for op in operator["valset_confirms"]:
-                if op["orchestrator"] == operator["orchestrator_address"]:
-                    check = True
-                    break
-            if not check:
-                self.notify({
-                    "type": "pending_valsets",
-                    "args": {
-                        "validator": operator["valoper_address"],
-                        "orchestrator": operator["orchestrator_address"],
-                        "moniker": operator["moniker"],
-                        "last_height": f"{operator['last_height']:,}"
-                    },
-                    "auto_delete": None
-                })
+        if operator["valset_confirms"] and operator["orchestrator_address"] not in operator["valset_confirms"]:
+            self.notify({
+                "type": "pending_valsets",
+                "args": {
+                    "validator": operator["valoper_address"],
+                    "orchestrator": operator["orchestrator_address"],
+                    "moniker": operator["moniker"],
+                    "last_height": f"{operator['last_height']:,}"
+                },
+                "auto_delete": None
+            })
 
-        if len(operator["batch_confirms"]) != 0:
-            check = False
-            for op in operator["batch_confirms"]:
-                if op["orchestrator"] == operator["orchestrator_address"]:
-                    check = True
-                    break
-            if not check:
-                self.notify({
-                    "type": "pending_valsets",
-                    "args": {
-                        "validator": operator["valoper_address"],
-                        "orchestrator": operator["orchestrator_address"],
-                        "moniker": operator["moniker"],
-                        "last_height": f"{operator['last_height']:,}"
-                    },
-                    "auto_delete": None
-                })
+        if operator["batch_confirms"] and operator["orchestrator_address"] not in operator["batch_confirms"]:
+            self.notify({
+                "type": "pending_batches",
+                "args": {
+                    "validator": operator["valoper_address"],
+                    "orchestrator": operator["orchestrator_address"],
+                    "moniker": operator["moniker"],
+                    "last_height": f"{operator['last_height']:,}"
+                },
+                "auto_delete": None
+            })
 
         lag = current_observed - current_claim
         has_recent_progress = (now - progress_state["last_progress_at"]) <= progress_grace if progress_grace > 0 else False
@@ -143,187 +299,89 @@ class Peggo:
             "auto_delete": None
             })
 
+    def record(self, operator: dict):
+        if self.history is None:
+            return
+        progress_state = self.nonce_progress[operator["valoper_address"]]
+        self.history.record(
+            operator["valoper_address"],
+            operator["last_observed_nonce"],
+            operator["last_claim_eth_event_nonce"],
+            time.time(),
+            progress_state["last_alert_at"]
+        )
+
     def notify(self, message):
-        # Discord client
-        try:
-            if self.app["discord"] is not None:
-                discord_client = self.app["discord"]
-                if discord_client.loop:
-                    subscriptions = discord_client.subscriptions
-                    msg = None
-                    user = ""
-                    for sub in subscriptions:
-                        if sub["validator"] == message['args']['validator']:
-                            user += f" <@{sub['user']}>"
-                            
-                    if message['type'] == "pending_valsets":
-                        msg = discord_client.compose_embed(
-                            title = f"**{message['args']['moniker']} hasn't signed in latest valset_confirms!**",
-                            fields = [
-                                {
-                                    "name": "Last Height Checked",
-                                    "value": message['args']['last_height'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Orchestrator Address",
-                                    "value": message['args']['orchestrator'],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color = 0xffd100
-                        )
-                    elif message['type'] == "pending_batches":
-                        msg = discord_client.compose_embed(
-                            title = f"**Pending batches found!**",
-                            fields = [
-                                {
-                                    "name": "Orchestrator Address",
-                                    "value": message['args']['orchestrator'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Pending Batches",
-                                    "value": message['args']['pending_batches'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Last Height Checked",
-                                    "value": message['args']['last_height'],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color = 0xffd100
-                        )
-                    elif message['type'] == "nonce_mismatch":
-                        msg = discord_client.compose_embed(
-                            title = f"**{message['args']['moniker']}'s nonce is lagging behind!**",
-                            fields = [
-                                {
-                                    "name": "Orchestrator Address",
-                                    "value": message['args']['orchestrator'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Last Observed Nonce",
-                                    "value": message['args']['last_observed_nonce'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Last Claimed Ethereum Event Nonce",
-                                    "value": message['args']['last_claim_eth_event_nonce'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Last Height Checked",
-                                    "value": message['args']['last_height'],
-                                    "inline": False
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color = 0xffd100
-                        )
-                    if discord_client.mode == "chain":
-                        future = asyncio.run_coroutine_threadsafe(
-                            discord_client.reply(
-                                discord_client.channels["peggo"]["id"],
-                                msg,
-                                user,
-                                auto_delete=message['auto_delete']
-                            ),
-                            discord_client.loop
-                        )
-                        # Optionally, wait for the coroutine to finish and handle exceptions
-                        future.result()
-                    elif discord_client.mode == "single":
-                        for sub in subscriptions:
-                            if sub["validator"] == message["args"]["validator"]:
-                                future = asyncio.run_coroutine_threadsafe(
-                                    discord_client.reply(
-                                        discord_client.channels["peggo"]["id"],
-                                        msg,
-                                        auto_delete=message['auto_delete']
-                                    ),
-                                    discord_client.loop
-                                )
-                                # Optionally, wait for the coroutine to finish and handle exceptions
-                                future.result()
-                else:
-                    self.logger.error("Discord client loop not ready.")
-            else:
-                self.logger.error("Discord client is not initialized.")
+        dispatch(self.app, self, message)
+
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        subscriptions = discord_client.subscriptions
+        user = ""
+        for sub in subscriptions.for_validator(message['args']['validator']):
+            user += f" <@{sub['user']}>"
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
 
-            # Slack client
-            if self.app["slack"] is not None:
-                slack_client = self.app["slack"]
-                subscriptions = slack_client.subscriptions
-                user = ""
-                msg = None
-                for sub in subscriptions:
-                    if sub.get("validator") == message['args']['validator']:
-                        user += f" <@{sub['user']}>"
-                
-                # for sub in subscriptions:
-                #     if sub["validator"] == message["args"]["validator"]:
-                if message['type'] == "pending_valsets":
-                    msg = f"{user} *{message['args']['moniker']} has pending valsets!*\n" \
-                        f"Pending Valsets: `{message['args']['pending_valsets']}`\n" \
-                        f"Last Height Checked: `{message['args']['last_height']}`"
-                elif message['type'] == "pending_batches":
-                    msg = f"{user} *{message['args']['moniker']} has pending batches!*\n" \
-                        f"Pending Batches: `{message['args']['pending_batches']}`\n" \
-                        f"Last Height Checked: `{message['args']['last_height']}`"
-                elif message['type'] == "nonce_mismatch":
-                    msg = f"{user} *{message['args']['moniker']}'s nonce is lagging behind!*\n" \
-                        f"Last Observed Nonce: `{message['args']['last_observed_nonce']}`\n" \
-                        f"Last Claimed Ethereum Event Nonce: `{message['args']['last_claim_eth_event_nonce']}`\n" \
-                        f"Last Height Checked: `{message['args']['last_height']}`"
-                    
-                slack_client.reply(
+        # chain-wide alerts (no validator) go to the channel in either mode
+        if discord_client.mode == "chain" or message['args']['validator'] is None:
+            future = asyncio.run_coroutine_threadsafe(
+                discord_client.alert(
+                    discord_client.channels["peggo"]["id"],
+                    msg,
+                    user,
+                    auto_delete=message['auto_delete']
+                ),
+                discord_client.loop
+            )
+            # Optionally, wait for the coroutine to finish and handle exceptions
+            future.result()
+        elif discord_client.mode == "single":
+            for sub in subscriptions.for_validator(message['args']['validator']):
+                future = asyncio.run_coroutine_threadsafe(
+                    discord_client.alert(
+                        discord_client.channels["peggo"]["id"],
                         msg,
-                        slack_client.channels["peggo"]["webhook_url"],
+                        auto_delete=message['auto_delete']
+                    ),
+                    discord_client.loop
                 )
-            else:
-                self.logger.error("Slack client is not initialized.")
+                # Optionally, wait for the coroutine to finish and handle exceptions
+                future.result()
 
-            # Telegram client
-            if self.app["telegram"] is not None:
-                telegram_client = self.app["telegram"]
-                if telegram_client.loop:
-                    subscriptions = telegram_client.subscriptions
-                    msg = None
-                    for sub in subscriptions:
-                        if "validator" in sub and sub["validator"] == message["args"]["validator"]:
-                            if message['type'] == "pending_valsets":
-                                msg = f"*{message['args']['moniker']} has pending valsets!*\n" \
-                                    f"Pending Valsets: `{message['args']['pending_valsets']}`\n" \
-                                    f"Last Height Checked: `{message['args']['last_height']}`"
-                            elif message['type'] == "pending_batches":
-                                msg = f"*{message['args']['moniker']} has pending batches!*\n" \
-                                    f"Pending Batches: `{message['args']['pending_batches']}`\n" \
-                                    f"Last Height Checked: `{message['args']['last_height']}`"
-                            elif message['type'] == "nonce_mismatch":
-                                msg = f"*{message['args']['moniker']}'s nonce is lagging behind!*\n" \
-                                    f"Last Observed Nonce: `{message['args']['last_observed_nonce']}`\n" \
-                                    f"Last Claimed Ethereum Event Nonce: `{message['args']['last_claim_eth_event_nonce']}`\n" \
-                                    f"Last Height Checked: `{message['args']['last_height']}`"
-                            
-                            future = asyncio.run_coroutine_threadsafe(
-                                telegram_client.reply(
-                                    msg,
-                                    sub["user"],
-                                ),
-                                telegram_client.loop
-                            )
-                            future.result()
-                else:
-                    self.logger.error("Telegram client loop not ready.")
-            else:
-                self.logger.error("Telegram client is not initialized.")
-        except Exception as e:
-            self.logger.error(f"Error sending message: {e}")
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        subscriptions = slack_client.subscriptions
+        user = ""
+        for sub in subscriptions.for_validator(message['args']['validator']):
+            user += f"<@{sub['user']}> "
+
+        slack_client.reply(
+                user + self.templates.render(message, "text"),
+                slack_client.channels["peggo"]["webhook_url"],
+                priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        msg = self.templates.render(message, "text")
+        if message['args']['validator'] is None:
+            subs = telegram_client.subscriptions.for_topic("peggo")
+        else:
+            subs = telegram_client.subscriptions.for_validator(message['args']['validator'])
+        for sub in subs:
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
+                    msg,
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+            future.result()
 
     async def start_peggo_polling(self):
         while True:           
@@ -332,22 +390,28 @@ class Peggo:
             with open('validators.json', 'r') as file:
                 validators = json.load(file)
             
-            for validator in validators:
-                self.logger.debug(f"Checking {validator['moniker']} ...")
-                valoper_address = validator['operator_address']
+            snapshot = self.get_snapshot()
+            if snapshot is None:
+                self.logger.error("Skipping Peggo cycle, module state unavailable.")
+                time.sleep(self.params["interval"] - 30)
+                continue
+
+            if self.jsonrpcs:
+                ethereum_state = self.get_ethereum_state()
+                if ethereum_state is not None:
+                    self.check_ethereum(snapshot, ethereum_state)
+
+            for operator in self.fetch_operators(validators):
+                operator.update(snapshot)
+                self.operators[operator["valoper_address"]] = operator
                 try:
-                    address = query.query(self.apis, path=f"/peggy/v1/query_delegate_keys_by_validator?validator_address={valoper_address}")
-                    self.operators[valoper_address] = address
-                    self.operators[valoper_address]["valoper_address"] = valoper_address
-                    self.operators[valoper_address]["moniker"] = validator['moniker']
-                    self.operators[valoper_address]["last_height"] = self.get_height()
-                    self.operators[valoper_address]["last_observed_nonce"], self.operators[valoper_address]["valset_confirms"], self.operators[valoper_address]["batch_confirms"]= self.get_module_state()
-                    self.operators[valoper_address]["last_claim_eth_event_nonce"] = self.get_lce(address["orchestrator_address"])
-                    self.check(self.operators[valoper_address])
-                    time.sleep(5) # Sleep for 5 seconds to prevent rate limiting
+                    self.check(operator)
+                    self.record(operator)
                 except Exception as e:
-                    self.logger.error(f"Error fetching operator status: {e}")
+                    self.logger.error(f"Error checking operator {operator['moniker']}: {e}")
 
+            if self.history is not None:
+                self.history.prune()
             self.operators = {}
             self.logger.info("Finished")
             time.sleep(self.params["interval"] - 30)
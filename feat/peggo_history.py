@@ -0,0 +1,90 @@
+import logging
+import sqlite3
+import threading
+import time
+
+class PeggoHistory:
+    """
+    Append-only time series of operator nonces, kept in a local SQLite file so the Peggo
+    nonce progress survives restarts and lag trends can be queried without the chain
+    """
+    def __init__(self, path="peggo_history.db", retention_seconds=604800):
+        self.retention_seconds = retention_seconds
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Peggo")
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS nonce_history (
+                    operator TEXT NOT NULL,
+                    observed_nonce INTEGER NOT NULL,
+                    claim_nonce INTEGER NOT NULL,
+                    ts REAL NOT NULL,
+                    last_alert_at REAL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS nonce_history_operator_ts ON nonce_history (operator, ts)")
+
+    def record(self, operator, observed_nonce, claim_nonce, ts, last_alert_at=None):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO nonce_history (operator, observed_nonce, claim_nonce, ts, last_alert_at) VALUES (?, ?, ?, ?, ?)",
+                (operator, observed_nonce, claim_nonce, ts, last_alert_at)
+            )
+
+    def prune(self, now=None):
+        cutoff = (now or time.time()) - self.retention_seconds
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM nonce_history WHERE ts < ?", (cutoff,))
+
+    def rebuild(self) -> dict:
+        """
+        Replays the history into the `Peggo.nonce_progress` state of every operator
+        """
+        progress = {}
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT operator, claim_nonce, ts, last_alert_at FROM nonce_history ORDER BY operator, ts"
+            ).fetchall()
+        for operator, claim_nonce, ts, last_alert_at in rows:
+            state = progress.get(operator)
+            if state is None:
+                progress[operator] = {
+                    "last_claim": claim_nonce,
+                    "last_progress_at": ts,
+                    "regressed": False,
+                    "last_alert_at": last_alert_at,
+                }
+                continue
+            if claim_nonce > state["last_claim"]:
+                state["last_progress_at"] = ts
+                state["regressed"] = False
+            elif claim_nonce < state["last_claim"]:
+                state["regressed"] = True
+            state["last_claim"] = claim_nonce
+            state["last_alert_at"] = last_alert_at
+        self.logger.info(f"Restored nonce progress of {len(progress)} operators.")
+        return progress
+
+    def claim_throughput(self, operator, window_seconds=3600, now=None) -> int:
+        """
+        Number of Ethereum events claimed by an operator over the last `window_seconds`
+        """
+        since = (now or time.time()) - window_seconds
+        with self.lock:
+            first, last = self.db.execute(
+                "SELECT MIN(claim_nonce), MAX(claim_nonce) FROM nonce_history WHERE operator = ? AND ts >= ?",
+                (operator, since)
+            ).fetchone()
+        return last - first if first is not None else 0
+
+    def lag_trend(self, operator, window_seconds=3600, now=None) -> list:
+        """
+        (timestamp, observed - claimed nonce) samples of an operator over the last `window_seconds`
+        """
+        since = (now or time.time()) - window_seconds
+        with self.lock:
+            return self.db.execute(
+                "SELECT ts, observed_nonce - claim_nonce FROM nonce_history WHERE operator = ? AND ts >= ? ORDER BY ts",
+                (operator, since)
+            ).fetchall()
@@ -1,128 +1,260 @@
 import asyncio
+import queue
+import time
+from datetime import datetime, timezone
 import utils.query as query
+from utils.outbox import dispatch
 import logging
+from urllib.parse import quote
+from utils.pubkey import valoper_to_account
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
+
+ACTIVE_PROPOSALS = "/cosmos/gov/v1/proposals?proposal_status=PROPOSAL_STATUS_VOTING_PERIOD"
+
+TEMPLATES = {
+    "new_proposal": AlertTemplate(
+        title="New Proposal {proposal_id}",
+        description="{summary}",
+        fields=[
+            ("Type", "{type}")
+        ],
+        color=0x75ffd1
+    ),
+    "vote_reminder": AlertTemplate(
+        title="Vote on Proposal {proposal_id}!",
+        description="{title}",
+        fields=[
+            ("Validator", "{validator}", False),
+            ("Ends In", "{time_left}"),
+            ("Voting End Time", "{voting_end_time} UTC")
+        ],
+        color=0xffd100
+    )
+}
+
+def parse_time(timestamp) -> float:
+    """
+    Converts an RFC 3339 timestamp with nanoseconds (e.g. 2024-12-20T12:00:00.123456789Z) to epoch seconds
+    """
+    return datetime.fromisoformat(timestamp[:19] + "+00:00").timestamp()
 
 class Proposal:
     def __init__(self, app, tx_queue, params, api, chain):
         self.app = app
         self.api = api
         self.params = params
+        self.templates = Templates(TEMPLATES, params)
         self.tx_queue = tx_queue    
         self.chain = chain
+        self.poll_interval: int = params.get("poll_interval", 300)
+        self.vote_reminder_seconds: int = params.get("vote_reminder_seconds", 86400)
+        self.page_limit: int = params.get("page_limit", 200)
+        self.active: dict = {} # proposal id -> {"title", "voting_end_time", "tally", "reminded"}
+        self.accounts: dict = {} # valoper -> account address
+        self.next_poll_at = 0
 
         self.logger = logging.getLogger("Gov")
         self.logger.setLevel(logging.INFO)
 
     def queryProposal(self, id):
         try:
-            proposal = query.query(self.apis, path=f"/cosmos/gov/v1/proposals/{id}")
+            proposal = query.query(self.api, path=f"/cosmos/gov/v1/proposals/{id}")
             return proposal
         except Exception as e:
             self.logger.error(f"Error querying proposal: {e}")
             return None
+
+    def query_pages(self, path, key) -> list:
+        """
+        Fetching every page of a paginated REST list
+        """
+        items = []
+        next_key = None
+        separator = "&" if "?" in path else "?"
+        while True:
+            page = f"{path}{separator}pagination.limit={self.page_limit}"
+            if next_key:
+                page += f"&pagination.key={quote(next_key, safe='')}"
+            data = query.query(self.api, path=page)
+            items += data.get(key, [])
+            next_key = data.get("pagination", {}).get("next_key")
+            if not next_key:
+                return items
+
+    def track(self, proposal):
+        """
+        Adds a proposal in voting period to the active cache
+        """
+        proposal_id = str(proposal["id"])
+        if proposal_id not in self.active:
+            self.active[proposal_id] = {
+                "title": proposal.get("title", ""),
+                "voting_end_time": parse_time(proposal["voting_end_time"]),
+                "tally": None,
+                "reminded": set()
+            }
+
+    def refresh_active(self, now):
+        """
+        Syncs the active cache with the proposals in voting period
+        """
+        proposals = self.query_pages(ACTIVE_PROPOSALS, "proposals")
+        for proposal in proposals:
+            self.track(proposal)
+        active_ids = {str(proposal["id"]) for proposal in proposals}
+        for proposal_id in [id for id, entry in self.active.items() if id not in active_ids or entry["voting_end_time"] <= now]:
+            self.active.pop(proposal_id)
+
+    def get_voters(self, proposal_id) -> set:
+        return {vote["voter"] for vote in self.query_pages(f"/cosmos/gov/v1/proposals/{proposal_id}/votes", "votes")}
+
+    def get_account(self, valoper):
+        if valoper not in self.accounts:
+            self.accounts[valoper] = valoper_to_account(valoper)
+        return self.accounts[valoper]
+
+    def subscribed_validators(self) -> set:
+        validators = set()
+        for platform in ["discord", "slack", "telegram"]:
+            if self.app[platform] is not None:
+                validators.update(self.app[platform].subscriptions.validators())
+        return validators
+
+    def check_votes(self, now=None):
+        """
+        Polls the tally of every active proposal and, once a proposal enters the reminder window,
+        its votes in bulk to remind subscribed validators that have not voted yet
+        """
+        now = now or time.time()
+        self.refresh_active(now)
+        validators = None
+        for proposal_id, entry in self.active.items():
+            try:
+                entry["tally"] = query.query(self.api, path=f"/cosmos/gov/v1/proposals/{proposal_id}/tally").get("tally")
+                if entry["voting_end_time"] - now > self.vote_reminder_seconds:
+                    continue
+                if validators is None:
+                    validators = self.subscribed_validators()
+                pending = validators - entry["reminded"]
+                if not pending:
+                    continue
+                voters = self.get_voters(proposal_id)
+                for validator in pending:
+                    if self.get_account(validator) in voters:
+                        continue
+                    entry["reminded"].add(validator)
+                    self.notify({
+                        "type": "vote_reminder",
+                        "args": {
+                            "proposal_id": proposal_id,
+                            "title": entry["title"],
+                            "validator": validator,
+                            "voting_end_time": datetime.fromtimestamp(entry["voting_end_time"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                            "time_left": f"{(entry['voting_end_time'] - now) / 3600:,.1f}h"
+                        }
+                    })
+            except Exception as e:
+                self.logger.error(f"Error checking votes of proposal {proposal_id}: {e}")
         
     def notify(self, message):
-        try:
-            # Discord client
-            if self.app["discord"] is not None:
-                discord_client = self.app["discord"]
-                if discord_client.loop:
-                    msg = discord_client.compose_embed(
-                        title = f"**New Proposal {message['args']['proposal_id']}**",
-                        description = message['args']['summary'],
-                        fields = [
-                            {
-                                "name": "Type",
-                                "value": message['args']['type'],
-                                "inline": True
-                            }
-                            
-                        ],
-                        color = 0x75ffd1
-                    )
-                    future = asyncio.run_coroutine_threadsafe(
-                        discord_client.reply(
-                            discord_client.channels["gov"]["id"],
-                            msg,
-                            auto_delete = None
-                        ),
-                        discord_client.loop
-                    )
-                    # Optionally, wait for the coroutine to finish and handle exceptions
-                    future.result()
-                else:
-                    self.logger.error("Discord client loop not ready.")
-            else:
-                self.logger.error("Discord client is not initialized.")
-
-            # Slack client
-            if self.app["slack"] is not None:
-                slack_client = self.app["slack"]
-                msg = f"New Proposal {message['args']['proposal_id']}\n" \
-                    f"Description: `{message['args']['summary']}`"
-                slack_client.reply(
-                        msg,
-                        slack_client.channels["gov"]["webhook_url"],
-                )
-            else:
-                self.logger.error("Slack client is not initialized.")
-
-            # Telegram client
-            if self.app["telegram"] is not None and len(self.app["telegram"].subscriptions):
-                telegram_client = self.app["telegram"]
-                if telegram_client.loop:
-                    subscriptions = telegram_client.subscriptions
-                    for sub in subscriptions:
-                        if "sub" in sub and sub["sub"] == "gov":
-                            msg = f"New Proposal {message['args']['proposal_id']}\n" \
-                                f"Description: `{message['args']['summary']}`"
-                            future = asyncio.run_coroutine_threadsafe(
-                                telegram_client.reply(
-                                    msg,
-                                    sub["user"]
-                                ),
-                                telegram_client.loop
-                            )
-                            future.result()
-                else:
-                    self.logger.error("Telegram client loop not ready.")
-            else:
-                self.logger.error("Telegram client is not initialized.")
-        except Exception as e:
-            self.logger.error(f"Error sending message: {e}")
-    
+        dispatch(self.app, self, message)
+
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        user = ""
+        if message['type'] == "vote_reminder":
+            for sub in discord_client.subscriptions.for_validator(message['args']['validator']):
+                user += f" <@{sub['user']}>"
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
+        future = asyncio.run_coroutine_threadsafe(
+            discord_client.alert(
+                discord_client.channels["gov"]["id"],
+                msg,
+                user,
+                auto_delete = None
+            ),
+            discord_client.loop
+        )
+        # Optionally, wait for the coroutine to finish and handle exceptions
+        future.result()
+
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        user = ""
+        if message['type'] == "vote_reminder":
+            for sub in slack_client.subscriptions.for_validator(message['args']['validator']):
+                user += f"<@{sub['user']}> "
+        slack_client.reply(
+                user + self.templates.render(message, "text"),
+                slack_client.channels["gov"]["webhook_url"],
+                priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        if message['type'] == "vote_reminder":
+            subscriptions = telegram_client.subscriptions.for_validator(message['args']['validator'])
+        else:
+            subscriptions = telegram_client.subscriptions.for_topic("gov")
+        msg = self.templates.render(message, "text")
+        for sub in subscriptions:
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
+                    msg,
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+            future.result()
+
     async def start_gov_polling(self):
         while True:
-            if not self.tx_queue.empty():
-                tx = self.tx_queue.get()
-                if tx and "result" in tx:
-                    msg_type = tx["result"]["query"]
-                    if msg_type == "tm.event='Tx' AND message.action CONTAINS 'MsgSubmitProposal'":
-                        events = tx["result"]["events"]
-                        print(events)
-                        proposal_id = events["submit_proposal.proposal_id"][0]
-                        deposit = events["proposal_deposit.amount"][0][:-5]
-                        if int(deposit) >= int(self.params["min_deposit"]):
-                            proposal = self.queryProposal(proposal_id)
-                            title = proposal["proposal"]["title"]
-                            type = events["submit_proposal.proposal_messages"][0]
-                            summary = proposal["proposal"]["summary"]
-                            voting_end_time = proposal["proposal"]["voting_end_time"]
-                            messages = proposal["proposal"]["messages"]
-                            proposer = events["submit_proposal.proposal_proposer"][0]
-                            self.notify({
-                                "type": "new_proposal",
-                                "args": {
-                                    "proposal_id": proposal_id,
-                                    "title": title,
-                                    "messages": messages,
-                                    "proposer": proposer,
-                                    "type": type,
-                                    "status": "Voting Period",
-                                    "summary": summary,
-                                    "voting_end_time": voting_end_time,
-                                }
-                            })
+            if time.time() >= self.next_poll_at:
+                self.next_poll_at = time.time() + self.poll_interval
+                try:
+                    self.check_votes()
+                except Exception as e:
+                    self.logger.error(f"Error polling active proposals: {e}")
+            try:
+                tx = self.tx_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if tx and "result" in tx:
+                msg_type = tx["result"]["query"]
+                if msg_type == "tm.event='Tx' AND message.action CONTAINS 'MsgSubmitProposal'":
+                    events = tx["result"]["events"]
+                    print(events)
+                    proposal_id = events["submit_proposal.proposal_id"][0]
+                    deposit = events["proposal_deposit.amount"][0][:-5]
+                    if int(deposit) >= int(self.params["min_deposit"]):
+                        proposal = self.queryProposal(proposal_id)
+                        title = proposal["proposal"]["title"]
+                        type = events["submit_proposal.proposal_messages"][0]
+                        summary = proposal["proposal"]["summary"]
+                        voting_end_time = proposal["proposal"]["voting_end_time"]
+                        messages = proposal["proposal"]["messages"]
+                        proposer = events["submit_proposal.proposal_proposer"][0]
+                        if proposal["proposal"]["status"] == "PROPOSAL_STATUS_VOTING_PERIOD":
+                            self.track(proposal["proposal"])
+                        self.notify({
+                            "type": "new_proposal",
+                            "args": {
+                                "proposal_id": proposal_id,
+                                "title": title,
+                                "messages": messages,
+                                "proposer": proposer,
+                                "type": type,
+                                "status": "Voting Period",
+                                "summary": summary,
+                                "voting_end_time": voting_end_time,
+                            }
+                        })
 
     def run(self):
         loop = asyncio.new_event_loop()
@@ -4,8 +4,55 @@ import logging
 import time
 import threading
 import utils.query as query
+from utils.outbox import dispatch
+from utils.templates import AlertTemplate, Templates
+from utils.priority import priority
 import utils.pubkey as pubkey
 
+def severity_color(args, params):
+    if args['missed_percentage'] <= params["threshold"][2]["value"]: # WARNING
+        return 0xfff942
+    elif args['missed_percentage'] <= params["threshold"][3]["value"]: # CRITICAL
+        return 0xff941a
+    return 0xff4d4d
+
+def signed_in_window(args, params):
+    window = params["signed_blocks_window"]
+    signed = window - args['window_missed']
+    return f"{signed} / {window} ({signed / window * 100:.2f}%)"
+
+TEMPLATES = {
+    "miss_block": AlertTemplate(
+        title=lambda args, params: f"[{args['warning_level']}] {args['moniker']} has missed more than {args['missed_percentage'] * 100:.2f}% of the allowed missed blocks!",
+        description=lambda args, params: f"Last Signed Block: `{args['last_height']}`" if "last_height" in args else "",
+        fields=[
+            ("Blocks to JAILED", lambda args, params: int(params["signed_blocks_window"] * (1 - params["min_signed_per_window"]) - args['window_missed'])),
+            ("Window Signing Percentage", signed_in_window),
+            ("Signing window", lambda args, params: params["signed_blocks_window"]),
+            ("Min signed per window", lambda args, params: f"{params['min_signed_per_window'] * 100}%")
+        ],
+        color=severity_color
+    ),
+    "recovering": AlertTemplate(
+        title="[RECOVERING] {moniker} is recovering!",
+        fields=[
+            ("Window Signing Percentage", lambda args, params: f"{(1 - args['missed_percentage']) * 100}%")
+        ],
+        color=severity_color
+    ),
+    "active": AlertTemplate(title="{moniker} is active again!", color=0x75ffd1),
+    "inactive": AlertTemplate(title="{moniker} is inactive!", color=0x545454),
+    "jailed": AlertTemplate(
+        title="{moniker} is JAILED!",
+        fields=[
+            ("Last Signed Block", "{last_height}"),
+            ("Jailed Until", "{jailed_until}"),
+            ("Jailed Duration", "{jailed_duration}")
+        ],
+        color=0xde1212
+    )
+}
+
 # Chain mode
 class Validators:
     def __init__(self, app, block_queue, params, chain, apis, mode):
@@ -23,6 +70,7 @@ class Validators:
         self.chain = chain
         self.params = self.getSlashingParams()
         self.params.update(params)
+        self.templates = Templates(TEMPLATES, self.params)
         self.ignored_validators = self.getIgnoredValidators()
         self.validators = self.getValidators(params["prefix"] + "valcons")
 
@@ -246,225 +294,70 @@ class Validators:
                 json.dump(self.validators, f, indent=4)
 
     def notify(self, message):
-        try:
-            # Discord client, single + chain mode
-            if self.app["discord"] is not None:
-                discord_client = self.app["discord"]
-                if discord_client.loop:
-                    subscriptions = discord_client.subscriptions
-                    msg = None
-                    user = ""
-                    for sub in subscriptions:
-                        if sub.get("validator") == message['args']['validator']:
-                            user += f" <@{sub['user']}>"
-
-                    if message['type'] == "miss_block":
-                        if message['args']['missed_percentage'] <= self.params["threshold"][2]["value"]: # WARNING
-                            color = 0xfff942
-                        elif message['args']['missed_percentage'] <= self.params["threshold"][3]["value"]: # CRITICAL
-                            color = 0xff941a
-                        else:
-                            color = 0xff4d4d
-                        msg = discord_client.compose_embed(
-                            title=f"**[{message['args']['warning_level']}] {message['args']['moniker']} has missed more than {message['args']['missed_percentage'] * 100:.2f}% of the allowed missed blocks!**",
-                            description=f"Last Signed Block: `{message['args']['last_height']}`" if "last_height" in message['args'] else "",
-                            fields=[
-                                {
-                                    "name": "Blocks to JAILED",
-                                    "value": int(self.params["signed_blocks_window"] * (1 - self.params["min_signed_per_window"]) - message['args']['window_missed']),
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Window Signing Percentage",
-                                    "value": f"{(self.params["signed_blocks_window"] - message['args']['window_missed'])} / {self.params["signed_blocks_window"]} ({((self.params["signed_blocks_window"] - message['args']['window_missed']) / self.params["signed_blocks_window"] * 100):.2f}%)",
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Signing window",
-                                    "value": self.params["signed_blocks_window"],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=color
-                        )
-                    elif message['type'] == "recovering":
-                        if message['args']['missed_percentage'] <= self.params["threshold"][2]["value"]: # WARNING
-                            color = 0xfff942
-                        elif message['args']['missed_percentage'] <= self.params["threshold"][3]["value"]: # CRITICAL
-                            color = 0xff941a
-                        else:
-                            color = 0xff4d4d
-                        msg = discord_client.compose_embed(
-                            title=f"**[RECOVERING] {message['args']['moniker']} is recovering!**",
-                            description="",
-                            fields=[
-                                {
-                                    "name": "Window Signing Percentage",
-                                    "value": f"{(1 - message['args']['missed_percentage']) * 100}%",
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=color
-                        )
-                    elif message['type'] == "active":
-                        msg = discord_client.compose_embed(
-                            title=f"**{message['args']['moniker']} is active again!**",
-                            description="",
-                            fields=[],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0x75ffd1,
-                        )
-                    elif message['type'] == "inactive":
-                        msg = discord_client.compose_embed(
-                            title=f"**{message['args']['moniker']} is inactive!**",
-                            description="",
-                            fields=[],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0x545454
-                        )
-                    elif message['type'] == "jailed":
-                        msg = discord_client.compose_embed(
-                            title=f"**{message['args']['moniker']} is JAILED!**",
-                            description="",
-                            fields=[
-                                {
-                                    "name": "Last Signed Block",
-                                    "value": message['args']['last_height'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Jailed Until",
-                                    "value": message['args']['jailed_until'],
-                                    "inline": True
-                                },
-                                {
-                                    "name": "Jailed Duration",
-                                    "value": message['args']['jailed_duration'],
-                                    "inline": True
-                                }
-                            ],
-                            footer=f"This message will be automatically deleted in {message['auto_delete']}s" if message['auto_delete'] != None else "",
-                            color=0xde1212
-                        )
+        dispatch(self.app, self, message)
 
-                    if discord_client.mode == "chain" and self.mode == "chain":
-                        future = asyncio.run_coroutine_threadsafe(
-                            discord_client.reply(
-                                discord_client.channels["validators"]["id"],
-                                msg,
-                                user,
-                                message['auto_delete']
-                            ),
-                            discord_client.loop
-                        )
-                        future.result()
-                    elif discord_client.mode == "single":
-                        for sub in subscriptions:
-                            if sub["validator"] == message['args']['validator']:
-                                future = asyncio.run_coroutine_threadsafe(
-                                    discord_client.reply(
-                                        discord_client.channels["validators"]["id"],
-                                        msg,
-                                        auto_delete=message['auto_delete']
-                                    ),
-                                    discord_client.loop
-                                )
-                                future.result()
-                else:
-                    self.logger.error("Discord client loop not ready.")
-            else:
-                self.logger.error("Discord client is not initialized.")
+    def notify_discord(self, message):
+        discord_client = self.app["discord"]
+        if not discord_client.loop:
+            raise RuntimeError("Discord client loop not ready.")
+        subscriptions = discord_client.subscriptions
+        user = ""
+        for sub in subscriptions.for_validator(message['args']['validator']):
+            user += f" <@{sub['user']}>"
+        msg = discord_client.compose_embed(**self.templates.render(message, "discord"))
 
-            # Slack client, single + chain mode
-            if self.app["slack"] is not None:
-                slack_client = self.app["slack"]
-                subscriptions = slack_client.subscriptions
-                user = ""
-                msg = None
-                for sub in subscriptions:
-                    if sub.get("validator") == message['args']['validator']:
-                        user += f" <@{sub['user']}>"
-
-                if message['type'] == "miss_block":
-                    msg = f"""
-{user} *[{message['args']['warning_level']}] {message['args']['moniker']} has missed more than {message['args']['missed_percentage'] * 100:.2f}% of the allowed missed blocks!*\n
-Blocks to JAILED: `{int(self.params["signed_blocks_window"] * (1 - self.params["min_signed_per_window"]) - message['args']['window_missed'])}`\n
-Window Signing Percentage: `{(self.params['signed_blocks_window'] - message['args']['window_missed'])} / {self.params['signed_blocks_window']} ({((self.params['signed_blocks_window'] - message['args']['window_missed']) / self.params['signed_blocks_window'] * 100):.2f}%)`\n
-Signing window: `{self.params['signed_blocks_window']}`\n
-Min signed per window: `{self.params['min_signed_per_window'] * 100}%`
-                    """
-                elif message['type'] == "recovering":
-                    msg = f"""
-{user} *[RECOVERING] {message['args']['moniker']} is recovering!*\n
-Window Signing Percentage: `{(1 - message['args']['missed_percentage']) * 100}%`
-                    """
-                elif message['type'] == "active":
-                    msg = f"{user} *{message['args']['moniker']} is active again!*"
-                elif message['type'] == "inactive":
-                    msg = f"{user} *{message['args']['moniker']} is inactive!**"
-                elif message['type'] == "jailed":
-                    msg = f"{user} *{message['args']['moniker']} is JAILED!*\n" \
-                        f"Last Signed Block: `{message['args']['last_height']}`\n" \
-                        f"Jailed Until: `{message['args']['jailed_until']}`\n" \
-                        f"Jailed Duration: `{message['args']['jailed_duration']}`"
-                    
-                slack_client.reply(
+        if discord_client.mode == "chain" and self.mode == "chain":
+            future = asyncio.run_coroutine_threadsafe(
+                discord_client.alert(
+                    discord_client.channels["validators"]["id"],
                     msg,
-                    slack_client.channels["validator"]["webhook_url"],
+                    user,
+                    message['auto_delete']
+                ),
+                discord_client.loop
+            )
+            future.result()
+        elif discord_client.mode == "single":
+            for sub in subscriptions.for_validator(message['args']['validator']):
+                future = asyncio.run_coroutine_threadsafe(
+                    discord_client.alert(
+                        discord_client.channels["validators"]["id"],
+                        msg,
+                        auto_delete=message['auto_delete']
+                    ),
+                    discord_client.loop
                 )
-            else:
-                self.logger.error("Slack client is not initialized.")
+                future.result()
 
-            # Telegram client, single mode only
-            if self.app["telegram"] is not None and len(self.app["telegram"].subscriptions):
-                telegram_client = self.app["telegram"]
-                if telegram_client.loop:
-                    subscriptions = telegram_client.subscriptions
-                    msg = None
-                    for sub in subscriptions:
-                        if "validator" in sub and sub["validator"] == message['args']['validator']:
-                            if message['type'] == "miss_block":
-                                msg = f"""
-*[{message['args']['warning_level']}] {message['args']['moniker']} has missed more than {message['args']['missed_percentage'] * 100:.2f}% of the allowed missed blocks!*
-Blocks to JAILED: `{int(self.params["signed_blocks_window"] * (1 - self.params["min_signed_per_window"]) - message['args']['window_missed'])}`
-Window Signing Percentage: `{(self.params['signed_blocks_window'] - message['args']['window_missed'])} / {self.params['signed_blocks_window']} ({((self.params['signed_blocks_window'] - message['args']['window_missed']) / self.params['signed_blocks_window'] * 100):.2f}%)`
-Signing window: `{self.params['signed_blocks_window']}`
-Min signed per window: `{self.params['min_signed_per_window'] * 100}%`
-                                """
-                            elif message['type'] == "recovering":
-                                msg = f"""
-*[RECOVERING] {message['args']['moniker']} is recovering!*
-Window Signing Percentage: `{(1 - message['args']['missed_percentage']) * 100}%`
-                                """
-                            elif message['type'] == "active":
-                                msg = f"*{message['args']['moniker']} is active again!*"
-                            elif message['type'] == "inactive":
-                                msg = f"*{message['args']['moniker']} is inactive!**"
-                            elif message['type'] == "jailed":
-                                msg = f"""
-*{message['args']['moniker']} is JAILED!*
-Last Signed Block: `{message['args']['last_height']}`
-Jailed Until: `{message['args']['jailed_until']}`
-Jailed Duration: `{message['args']['jailed_duration']}`
-                                """
-                                
-                            future = asyncio.run_coroutine_threadsafe(
-                                telegram_client.reply(
-                                    msg,
-                                    sub["user"]
-                                ),
-                                telegram_client.loop
-                            )
+    def notify_slack(self, message):
+        slack_client = self.app["slack"]
+        subscriptions = slack_client.subscriptions
+        user = ""
+        for sub in subscriptions.for_validator(message['args']['validator']):
+            user += f"<@{sub['user']}> "
 
-                            future.result()
-                else:
-                    self.logger.error("Telegram client loop not ready.")
-            else:
-                self.logger.error("Telegram client is not initialized.")
-        except Exception as e:
-            self.logger.error(f"Error sending message: {e}")
+        slack_client.reply(
+            user + self.templates.render(message, "text"),
+            slack_client.channels["validator"]["webhook_url"],
+            priority(message)
+        )
+
+    def notify_telegram(self, message):
+        telegram_client = self.app["telegram"]
+        if not telegram_client.loop:
+            raise RuntimeError("Telegram client loop not ready.")
+        msg = self.templates.render(message, "text")
+        for sub in telegram_client.subscriptions.for_validator(message['args']['validator']):
+            future = asyncio.run_coroutine_threadsafe(
+                telegram_client.reply(
+                    msg,
+                    sub["user"],
+                    priority(message)
+                ),
+                telegram_client.loop
+            )
+
+            future.result()
 
     def run(self):
         loop = asyncio.new_event_loop()
@@ -12,8 +12,14 @@ from utils.websocket import WebsocketClient
 from feat.validator import Validators
 from feat.proposal import Proposal
 from feat.peggo import Peggo
+from feat.peggo_history import PeggoHistory
 from feat.balances import Balances
+from feat.balance_history import BalanceHistory
 from feat.ibc import IBC
+from feat.consensus import ConsensusWatcher
+from utils.outbox import Outbox
+from utils.suppression import SuppressionCache
+from utils.deadletter import DeadLetterQueue
 
 block_queue = queue.Queue()
 tx_queue = queue.Queue()
@@ -68,6 +74,24 @@ if __name__ == "__main__":
             telegram_thread.start()
             print("Telegram client started")
 
+    # repeats of an open condition are dropped before they reach the outbox
+    app["suppression"] = SuppressionCache(config["app"].get("suppression", {}))
+
+    # alerts are delivered by per-platform workers, so detectors never wait on a chat API
+    app["outbox"] = Outbox(app, config["app"].get("outbox", {}))
+    app["outbox"].start()
+    print("Outbox started")
+
+    # deliveries the clients gave up on are kept on disk and replayed with backoff
+    app["deadletter"] = DeadLetterQueue(config["app"].get("deadletter", {}))
+    for platform in ("discord", "slack", "telegram"):
+        if app[platform] is not None:
+            app[platform].dead_letters = app["deadletter"]
+            app["deadletter"].register(platform, app[platform].replay)
+    app["outbox"].dead_letters = app["deadletter"]
+    app["deadletter"].register("outbox", app["outbox"].replay)
+    app["deadletter"].start()
+
     if config["features"]["validators"]["enable"]:
         if config["app"]["discord"]["enable"] and config["app"]["discord"]["mode"] == "chain":
             mode = "chain"
@@ -91,7 +115,12 @@ if __name__ == "__main__":
         peggo = Peggo(
             app,
             config["features"]["peggo"]["params"],
-            config["apis"]
+            config["apis"],
+            PeggoHistory(
+                config["features"]["peggo"]["params"].get("history_db", "peggo_history.db"),
+                config["features"]["peggo"]["params"].get("history_retention_seconds", 604800)
+            ),
+            config["jsonrpcs"]
         )
         peggo_thread = threading.Thread(target=peggo.run)
         peggo_thread.daemon = True
@@ -116,7 +145,12 @@ if __name__ == "__main__":
             app,
             config["apis"],
             config["jsonrpcs"],
-            config["features"]["wallet"]["params"]
+            config["features"]["wallet"]["params"],
+            BalanceHistory(
+                config["features"]["wallet"]["params"].get("history_file", "balance_history.json"),
+                config["features"]["wallet"]["params"].get("history_size", 48),
+                config["features"]["wallet"]["params"].get("burn_rate_alpha", 0.3)
+            )
         )
         wallet_thread = threading.Thread(target=wallet.run)
         wallet_thread.daemon = True
@@ -133,6 +167,19 @@ if __name__ == "__main__":
         ibc_thread.start()
         print("IBC client started")
 
+    if config["features"]["consensus"]["enable"]:
+        consensus = ConsensusWatcher(
+            app,
+            config["rpcs"],
+            config["features"]["consensus"].get("params", {})
+        )
+        if app["discord"] is not None:
+            app["discord"].consensus = consensus
+        consensus_thread = threading.Thread(target=consensus.run)
+        consensus_thread.daemon = True
+        consensus_thread.start()
+        print("Consensus watcher started")
+
     if config["features"]["validators"]["enable"] or config["features"]["gov"]["enable"]:
         topics = [
             # {
@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import patch
+
+
+try:
+    import requests  # noqa: F401
+except ModuleNotFoundError:
+    import sys
+    import types
+
+    requests = types.ModuleType("requests")
+    requests.request = None
+    requests_exceptions = types.ModuleType("requests.exceptions")
+    requests_exceptions.RequestException = Exception
+    sys.modules["requests"] = requests
+    sys.modules["requests.exceptions"] = requests_exceptions
+
+from feat.balances import Balances
+from feat.balance_history import BalanceHistory
+from utils.subscriptions import SubscriptionIndex
+
+
+class RecordingBalances(Balances):
+    def __init__(self, params, jsonrpcs=None):
+        super().__init__(
+            app={"discord": None, "slack": None, "telegram": None},
+            apis=[],
+            jsonrpcs=jsonrpcs or [],
+            params=params,
+        )
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+class BulkBalanceTest(unittest.TestCase):
+    def test_eth_balances_are_fetched_in_one_batch(self):
+        balances = RecordingBalances({"threshold": {"eth": 0.005, "inj": 0.1}}, jsonrpcs=["http://localhost:8545"])
+        response = [
+            {"jsonrpc": "2.0", "id": 1, "result": hex(10**15)},
+            {"jsonrpc": "2.0", "id": 0, "result": hex(2 * 10**18)},
+        ]
+
+        with patch("feat.balances.jsonrpc.query.query", return_value=response) as mocked:
+            result = balances.get_eth_balances(["0xaaa", "0xbbb"])
+
+        self.assertEqual(1, mocked.call_count)
+        self.assertEqual(2, len(mocked.call_args.kwargs["body"]))
+        self.assertEqual({"0xaaa": 2.0, "0xbbb": 0.001}, result)
+
+    def test_low_eth_balance_alerts(self):
+        balances = RecordingBalances({"threshold": {"eth": 0.005, "inj": 0.1}})
+
+        balances.check("injvaloper1example", "Example", "0xbbb", 0.001)
+        balances.check("injvaloper1example", "Example", "0xaaa", 2.0)
+        balances.check("injvaloper1example", "Example", "inj1orchestrator", 0.05)
+
+        self.assertEqual(["0.0010 ETH", "0.05 INJ"], [message["args"]["balance"] for message in balances.messages])
+
+
+class BalanceForecastTest(unittest.TestCase):
+    params = {
+        "threshold": {"eth": 0.005, "inj": 0.1},
+        "runway_alert_seconds": 86400,
+        "alert_repeat_seconds": 86400,
+        "max_backoff_seconds": 21600,
+    }
+
+    def test_burn_rate_ignores_top_ups(self):
+        history = BalanceHistory(alpha=0.5)
+        history.add("inj1orchestrator", 0, 10.0)
+        history.add("inj1orchestrator", 100, 9.0)
+        history.add("inj1orchestrator", 200, 20.0)
+        history.add("inj1orchestrator", 300, 19.8)
+
+        self.assertAlmostEqual(0.006, history.burn_rate("inj1orchestrator"))
+        self.assertAlmostEqual(19.8 / 0.006, history.time_to_empty("inj1orchestrator"))
+
+    def test_projected_runway_alerts_once(self):
+        balances = RecordingBalances(self.params)
+
+        with patch("feat.balances.time.time") as clock:
+            for now, balance in ((0, 1.0), (3600, 0.8), (7200, 0.6)):
+                clock.return_value = now
+                balances.check("injvaloper1example", "Example", "inj1orchestrator", balance)
+
+        self.assertEqual(["low_runway"], [message["type"] for message in balances.messages])
+        self.assertEqual("0.2 days", balances.messages[0]["args"]["runway"])
+        self.assertEqual("4.80 INJ/day", balances.messages[0]["args"]["burn_rate"])
+
+    def test_long_runway_backs_off_polling(self):
+        balances = RecordingBalances(self.params)
+
+        with patch("feat.balances.time.time") as clock:
+            for now, balance in ((0, 100.0), (3600, 99.99)):
+                clock.return_value = now
+                balances.check("injvaloper1example", "Example", "inj1orchestrator", balance)
+
+        self.assertEqual([], balances.messages)
+        self.assertFalse(balances.history.is_due("inj1orchestrator", now=3600 + 21599))
+        self.assertTrue(balances.history.is_due("inj1orchestrator", now=3600 + 21600))
+
+    def test_no_burn_rate_keeps_the_normal_interval(self):
+        balances = RecordingBalances(self.params)
+
+        with patch("feat.balances.time.time", return_value=0):
+            balances.check("injvaloper1example", "Example", "inj1orchestrator", 0.2)
+
+        self.assertTrue(balances.history.is_due("inj1orchestrator", now=1200))
+        with patch("feat.balances.time.time", return_value=1200):
+            balances.check("injvaloper1example", "Example", "inj1orchestrator", 0.2)
+
+        self.assertTrue(balances.history.is_due("inj1orchestrator", now=2400))
+
+
+class WatchListTest(unittest.TestCase):
+    params = {
+        "threshold": {"eth": 0.005, "inj": 0.1},
+        "watch": [
+            {
+                "name": "Relayer",
+                "apis": ["https://osmosis.example"],
+                "prefix": "osmo",
+                "denom": "ibc/27394FB092D2ECCD56123C74F36E4C1F926001CEADA9CA97EA622B25F41E5EB2",
+                "decimals": 6,
+                "threshold": 5,
+                "batch_size": 2,
+                "addresses": ["osmo1aaa", {"address": "osmo1bbb", "label": "Hermes"}, "osmo1ccc", "inj1wrongchain"],
+            }
+        ],
+    }
+
+    def test_watch_list_is_checked_in_batches(self):
+        balances = RecordingBalances(self.params)
+        amounts = {"osmo1aaa": 10**6, "osmo1bbb": 10**7, "osmo1ccc": 4 * 10**6}
+
+        def fake_query(apis, path):
+            self.assertEqual(["https://osmosis.example"], apis)
+            self.assertIn("denom=ibc%2F27394FB0", path)
+            address = path.split("/")[5]
+            return {"balance": {"amount": str(amounts.get(address, 0))}}
+
+        from concurrent.futures import ThreadPoolExecutor
+        with patch("feat.balances.query.query", side_effect=fake_query), ThreadPoolExecutor(max_workers=2) as executor:
+            balances.check_watchlists(executor)
+
+        self.assertEqual(
+            [("low_balance", "osmo1aaa", "1.00 Relayer"),
+             ("low_balance", "osmo1ccc", "4.00 Relayer"),
+             ("invalid_address", "inj1wrongchain", None)],
+            [(m["type"], m["args"]["address"], m["args"].get("balance")) for m in balances.messages],
+        )
+        self.assertTrue(all(m["args"]["wallet"] == "Relayer" for m in balances.messages))
+
+    def test_address_subscriptions_match_watched_wallets(self):
+        subscriptions = SubscriptionIndex([{"user": 1, "address": "osmo1aaa"}, {"user": 2, "validator": None}])
+
+        self.assertEqual([1], [sub["user"] for sub in subscriptions.matching(None, "osmo1aaa")])
+
+
+if __name__ == "__main__":
+    unittest.main()
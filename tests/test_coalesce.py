@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from utils.coalesce import EmbedCoalescer
+
+
+class Embed:
+    """
+    The parts of discord.Embed the coalescer reads
+    """
+    def __init__(self, title="", description="", fields=(), footer="", color=None):
+        self.title = title
+        self.description = description
+        self.fields = [SimpleNamespace(name=field["name"], value=str(field["value"])) for field in fields]
+        self.footer = SimpleNamespace(text=footer)
+        self.color = color
+
+    def __len__(self):
+        return len(self.title) + len(self.description) + len(self.footer.text) + \
+            sum(len(field.name) + len(field.value) for field in self.fields)
+
+
+def alert(i):
+    return Embed(
+        title=f"**Validator {i} is JAILED!**",
+        fields=[{"name": "Jailed until", "value": "2025-01-01"}],
+        footer="This message will be automatically deleted in 60s"
+    )
+
+
+class EmbedCoalescerTest(unittest.TestCase):
+    def run_coalescer(self, alerts, params):
+        sent = []
+
+        async def send(channel_id, mention, embeds, auto_delete):
+            sent.append((channel_id, mention, embeds, auto_delete))
+
+        async def main():
+            coalescer = EmbedCoalescer(send, Embed, params)
+            for channel_id, embed, mention in alerts:
+                coalescer.put(channel_id, embed, mention, 60)
+            await asyncio.sleep(params["window_seconds"] + 0.05)
+            return coalescer
+
+        return asyncio.run(main()), sent
+
+    def test_small_burst_is_one_message_of_the_original_embeds(self):
+        embeds = [alert(i) for i in range(3)]
+
+        coalescer, sent = self.run_coalescer(
+            [(1, embeds[0], " <@1>"), (1, embeds[1], " <@1> <@2>"), (2, embeds[2], "")],
+            {"window_seconds": 0.05}
+        )
+
+        self.assertEqual(2, len(sent))
+        self.assertEqual((1, " <@1> <@2>", embeds[:2], 60), sent[0])
+        self.assertEqual([embeds[2]], sent[1][2])
+        self.assertEqual(2, coalescer.stats()["messages"])
+
+    def test_storm_is_merged_into_digest_embeds(self):
+        coalescer, sent = self.run_coalescer(
+            [(1, alert(i), " <@1>") for i in range(300)],
+            {"window_seconds": 0.05}
+        )
+
+        # 300 alerts -> 12 embeds of 25 fields, each message within 10 embeds and 6000 characters
+        embeds = [embed for _, _, message, _ in sent for embed in message]
+        self.assertEqual(300, sum(len(embed.fields) for embed in embeds))
+        self.assertTrue(all(len(embed.fields) <= 25 for embed in embeds))
+        for _, _, message, _ in sent:
+            self.assertLessEqual(len(message), 10)
+            self.assertLessEqual(sum(len(embed) for embed in message), 6000)
+        self.assertEqual("Validator 0 is JAILED!", embeds[0].fields[0].name)
+        self.assertEqual("Jailed until: 2025-01-01", embeds[0].fields[0].value)
+        # subscribers are mentioned once per burst
+        self.assertEqual([" <@1>"], [mention for _, mention, _, _ in sent if mention])
+        self.assertEqual(len(sent), coalescer.stats()["messages"])
+        self.assertLess(len(sent), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import patch
+
+
+try:
+    import requests  # noqa: F401
+except ModuleNotFoundError:
+    import sys
+    import types
+
+    requests = types.ModuleType("requests")
+    requests.request = None
+    requests_exceptions = types.ModuleType("requests.exceptions")
+    requests_exceptions.RequestException = Exception
+    sys.modules["requests"] = requests
+    sys.modules["requests.exceptions"] = requests_exceptions
+
+from feat.consensus import ConsensusWatcher
+
+
+class RecordingWatcher(ConsensusWatcher):
+    def __init__(self, params=None):
+        super().__init__(
+            app={"discord": None, "slack": None, "telegram": None},
+            rpcs=[],
+            params=params or {"stall_seconds": 60, "alert_repeat_seconds": 600, "validators_per_page": 2},
+        )
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+def round_state(height, prevotes, precommits):
+    return {
+        "result": {
+            "round_state": {
+                "height/round/step": f"{height}/0/6",
+                "proposer": {"index": 1},
+                "height_vote_set": [
+                    {
+                        "prevotes_bit_array": f"BA{{3:{prevotes}}} 0/0 = 0.00",
+                        "precommits_bit_array": f"BA{{3:{precommits}}} 0/0 = 0.00",
+                    }
+                ],
+            }
+        }
+    }
+
+
+VALIDATORS = [
+    {"address": "AAA", "voting_power": "60"},
+    {"address": "BBB", "voting_power": "30"},
+    {"address": "CCC", "voting_power": "10"},
+]
+
+
+def fake_rpc(responses):
+    def query(rpcs, path):
+        if path.startswith("/validators"):
+            page = int(path.split("page=")[1].split("&")[0])
+            return {"result": {"validators": VALIDATORS[(page - 1) * 2:page * 2], "total": "3"}}
+        if path.startswith("/commit"):
+            height = int(path.split("=")[1])
+            return {"result": {"signed_header": {"header": {"next_validators_hash": responses["hashes"][height]}}}}
+        return responses[path]
+    return query
+
+
+class ConsensusWatcherTest(unittest.TestCase):
+    def test_tallies_are_weighted_by_voting_power(self):
+        watcher = RecordingWatcher()
+        responses = {"/consensus_state": round_state(100, "x_x", "x__"), "hashes": {99: "HASH"}}
+
+        with patch("feat.consensus.query.query", side_effect=fake_rpc(responses)) as mocked, \
+                patch("feat.consensus.load_monikers", return_value={"AAA": "Alpha"}):
+            watcher.poll()
+            watcher.poll()
+
+        snapshot = watcher.get_snapshot()
+        self.assertEqual(70, snapshot["prevotes_percent"])
+        self.assertEqual(60, snapshot["precommits_percent"])
+        self.assertEqual(["Alpha", "BBB", "CCC"], [val["moniker"] for val in snapshot["validator"]])
+        # one commit lookup and two validator pages, then the same height is served from memory
+        self.assertEqual(5, mocked.call_count)
+
+    def test_validator_set_is_refetched_only_when_its_hash_changes(self):
+        watcher = RecordingWatcher()
+        responses = {"hashes": {99: "HASH", 100: "HASH", 101: "OTHER"}}
+        paths = []
+
+        def recording_query(rpcs, path):
+            paths.append(path)
+            return fake_rpc(responses)(rpcs, path)
+
+        with patch("feat.consensus.query.query", side_effect=recording_query), \
+                patch("feat.consensus.load_monikers", return_value={}):
+            for height in (100, 101, 102):
+                responses["/consensus_state"] = round_state(height, "xxx", "xxx")
+                watcher.poll()
+
+        self.assertEqual(
+            ["/commit?height=99", "/validators?height=100&page=1&per_page=2"],
+            [path for path in paths if path != "/consensus_state"][:2],
+        )
+        self.assertEqual(2, sum(path.startswith("/validators?height=102") for path in paths))
+        self.assertEqual(0, sum(path.startswith("/validators?height=101") for path in paths))
+
+    def test_stalled_height_alerts_once_per_repeat(self):
+        watcher = RecordingWatcher()
+
+        watcher.check_stall(100, now=1000)
+        watcher.check_stall(100, now=1059)
+        watcher.check_stall(100, now=1060)
+        watcher.check_stall(100, now=1300)
+        watcher.check_stall(101, now=1301)
+        watcher.check_stall(101, now=1362)
+
+        self.assertEqual([(100, "60s"), (101, "61s")], [(m["args"]["height"], m["args"]["stalled_for"]) for m in watcher.messages])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from utils.deadletter import DeadLetterQueue
+
+
+class FlakyPlatform:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def replay(self, target, payload):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Slack webhook returned 503")
+        self.sent.append((target, payload))
+
+
+class DeadLetterQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "deadletter.jsonl")
+        self.dead_letters = DeadLetterQueue({"path": self.path, "backoff_seconds": 10, "max_backoff_seconds": 100})
+
+    def test_replays_with_backoff_until_delivered(self):
+        slack = FlakyPlatform(failures=1)
+        self.dead_letters.register("slack", slack.replay)
+        self.dead_letters.add("slack", "https://hooks.example/a", {"text": "*JAILED*"}, "timeout", now=1000)
+
+        self.assertEqual(0, self.dead_letters.replay(now=1005)["failed"]) # not due yet
+        self.assertEqual(1, self.dead_letters.replay(now=1010)["failed"])
+        entry = self.dead_letters.list()[0]
+        self.assertEqual((1, 1030), (entry["attempts"], entry["next_attempt_at"]))
+        self.assertEqual("Slack webhook returned 503", entry["error"])
+        self.assertEqual(0, self.dead_letters.replay(now=1020)["delivered"])
+        self.assertEqual({"delivered": 1, "failed": 0, "remaining": 0}, self.dead_letters.replay(now=1030))
+        self.assertEqual([("https://hooks.example/a", {"text": "*JAILED*"})], slack.sent)
+
+    def test_flush_ignores_backoff_and_keeps_unregistered_platforms(self):
+        telegram = FlakyPlatform()
+        self.dead_letters.register("telegram", telegram.replay)
+        self.dead_letters.add("telegram", 42, {"text": "hi"}, "Bad Gateway", now=1000)
+        self.dead_letters.add("discord", 1234567, {"content": "", "embeds": [], "delete_after": None}, "Channel not found", now=1000)
+
+        result = self.dead_letters.flush()
+
+        self.assertEqual({"delivered": 1, "failed": 0, "remaining": 1}, result)
+        self.assertEqual(["discord"], [entry["platform"] for entry in self.dead_letters.list()])
+
+    def test_letters_added_while_replaying_are_kept(self):
+        def replay(target, payload):
+            self.dead_letters.add("slack", target, payload, "503 again")
+            raise RuntimeError("503")
+
+        self.dead_letters.register("slack", replay)
+        self.dead_letters.add("slack", "https://hooks.example/a", {"text": "a"}, "503", now=1000)
+
+        self.dead_letters.flush()
+
+        self.assertEqual(2, len(self.dead_letters.list()))
+
+
+if __name__ == "__main__":
+    unittest.main()
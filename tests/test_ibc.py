@@ -0,0 +1,253 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+try:
+    import requests  # noqa: F401
+except ModuleNotFoundError:
+    import sys
+    import types
+
+    requests = types.ModuleType("requests")
+    requests.request = None
+    requests.get = None
+    requests_exceptions = types.ModuleType("requests.exceptions")
+    requests_exceptions.RequestException = Exception
+    sys.modules["requests"] = requests
+    sys.modules["requests.exceptions"] = requests_exceptions
+
+try:
+    import websocket  # noqa: F401
+except ModuleNotFoundError:
+    import sys
+    import types
+
+    sys.modules["websocket"] = types.ModuleType("websocket")
+
+from feat.ibc import IBC
+from feat.ibc_stream import IBCStream, PacketTracker
+from utils.heads import HeadTracker
+
+
+def commitments(*sequences):
+    return [{"sequence": str(seq)} for seq in sequences]
+
+
+class RecordingIBC(IBC):
+    def __init__(self, params=None):
+        super().__init__(
+            app={"discord": None, "slack": None, "telegram": None},
+            params={
+                "client_update_threshold": 86400,
+                "stuck_packets_threshold": 2,
+                "alert_confirmation_seconds": 0,
+                "alert_state_file": "/nonexistent/ibc_alert_state.json",
+                "send_heights_file": "/nonexistent/ibc_send_heights.json",
+                **(params or {}),
+            },
+        )
+        self.messages = []
+        self.ibc_ignores = {}
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+class CommitmentDiffTest(unittest.TestCase):
+    def test_diff_tracks_added_and_cleared_sequences(self):
+        ibc = RecordingIBC()
+
+        with patch("feat.ibc.time.time", return_value=1000) as clock:
+            added, cleared, _ = ibc._diff_commitments("injective-1", "channel-1", "transfer", commitments(1, 2))
+            self.assertEqual({1, 2}, added)
+            self.assertEqual(set(), cleared)
+
+            clock.return_value = 1100
+            added, cleared, state = ibc._diff_commitments("injective-1", "channel-1", "transfer", commitments(2, 3))
+
+        self.assertEqual({3}, added)
+        self.assertEqual({1}, cleared)
+        self.assertEqual({2: 1000, 3: 1100}, state["first_seen"])
+
+    def test_pending_seconds_come_from_first_seen(self):
+        ibc = RecordingIBC()
+        channel = {
+            "chain-1": "injective", "id-1": "injective-1", "channel-1": "channel-1", "port-1": "transfer", "api-1": [],
+            "chain-2": "osmosis", "id-2": "osmosis-1", "channel-2": "channel-8", "port-2": "transfer", "api-2": [],
+        }
+
+        with patch("feat.ibc.query.query", return_value={"commitments": commitments(5, 6)}), \
+                patch.object(ibc, "_fetch_reference_packets", return_value=None), \
+                patch("feat.ibc.time.time", return_value=1000) as clock:
+            ibc.checkPackets(channel, "1", "2")
+            clock.return_value = 1600
+            ibc.checkPackets(channel, "1", "2")
+
+        self.assertEqual(2, len(ibc.messages))
+        self.assertEqual(600, ibc.messages[1]["args"]["pending_seconds"])
+        self.assertIn("Pending For: `0.2h`", ibc.templates.render(ibc.messages[1], "text"))
+        self.assertEqual(2, ibc.messages[1]["args"]["quantity"])
+
+    def test_send_height_is_fetched_once_and_evicted_when_cleared(self):
+        ibc = RecordingIBC({"stuck_packets_threshold": 1})
+        channel = {
+            "chain-1": "injective", "id-1": "injective-1", "channel-1": "channel-1", "port-1": "transfer", "api-1": [],
+            "chain-2": "osmosis", "id-2": "osmosis-1", "channel-2": "channel-8", "port-2": "transfer", "api-2": [],
+        }
+        responses = {
+            "/ibc/core/channel/v1/channels/channel-1/ports/transfer/packet_commitments": {"commitments": commitments(9)},
+            "/tx_search?query=%22send_packet.packet_sequence%3D9%20AND%20send_packet.packet_src_channel%3D%27channel-1%27"
+            "%20AND%20send_packet.packet_src_port%3D%27transfer%27%22": {"result": {"txs": [{"height": "1000"}]}},
+            "/cosmos/base/tendermint/v1beta1/blocks/latest": {"block": {"header": {"height": "1200"}}},
+        }
+
+        def fake_query(urls, path=""):
+            return responses[path]
+
+        with patch("feat.ibc.query.query", side_effect=fake_query) as mocked, \
+                patch.object(ibc, "_fetch_reference_packets", return_value=None):
+            ibc.checkPackets(channel, "1", "2")
+            ibc.heads.begin_sweep()
+            ibc.checkPackets(channel, "1", "2")
+            tx_searches = [call for call in mocked.call_args_list if "tx_search" in call.kwargs["path"]]
+
+            self.assertEqual(1, len(tx_searches))
+            self.assertEqual(200, ibc.messages[-1]["args"]["pending_blocks"])
+            self.assertEqual({"injective-1/channel-1/9": 1000}, ibc.send_heights)
+
+            responses["/ibc/core/channel/v1/channels/channel-1/ports/transfer/packet_commitments"] = {"commitments": []}
+            ibc.checkPackets(channel, "1", "2")
+
+        self.assertEqual({}, ibc.send_heights)
+
+    def test_first_sweep_prunes_send_heights_cleared_while_down(self):
+        ibc = RecordingIBC({"stuck_packets_threshold": 10})
+        ibc.send_heights = {"injective-1/channel-1/4": 900, "injective-1/channel-1/9": 1000, "injective-1/channel-10/4": 950}
+        channel = {
+            "chain-1": "injective", "id-1": "injective-1", "channel-1": "channel-1", "port-1": "transfer", "api-1": [],
+            "chain-2": "osmosis", "id-2": "osmosis-1", "channel-2": "channel-8", "port-2": "transfer", "api-2": [],
+        }
+
+        with patch("feat.ibc.query.query", return_value={"commitments": commitments(9)}), \
+                patch.object(ibc, "_fetch_reference_packets", return_value=None):
+            ibc.checkPackets(channel, "1", "2")
+
+        self.assertEqual({"injective-1/channel-1/9": 1000, "injective-1/channel-10/4": 950}, ibc.send_heights)
+
+    def test_latest_height_is_shared_within_a_sweep(self):
+        heads = HeadTracker()
+        latest = {"block": {"header": {"height": "500"}}}
+
+        with patch("utils.heads.query.query", return_value=latest) as mocked:
+            heads.begin_sweep()
+            self.assertEqual(500, heads.height("osmosis", []))
+            self.assertEqual(500, heads.height("osmosis", []))
+            self.assertEqual(1, mocked.call_count)
+
+            heads.sweep_started_at += 1
+            heads.height("osmosis", [])
+            self.assertEqual(2, mocked.call_count)
+
+    def test_reference_comparison_ignores_order(self):
+        ibc = RecordingIBC()
+
+        with self.assertNoLogs("IBC", level="WARNING"):
+            ibc._validate_packets(commitments(3, 1, 2), commitments(1, 2, 3), "injective", "channel-1", "transfer")
+        with self.assertLogs("IBC", level="WARNING"):
+            ibc._validate_packets(commitments(1, 2), commitments(2, 4), "injective", "channel-1", "transfer")
+
+
+class AlertStatePersistenceTest(unittest.TestCase):
+    def test_restart_resumes_confirmation_and_repeat_timers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            params = {
+                "alert_confirmation_seconds": 180,
+                "alert_state_file": os.path.join(tmp, "ibc_alert_state.json"),
+            }
+            key = ("packets", "injective-1", "osmosis-1", "channel-8", "transfer")
+            client_key = ("07-tendermint-1", "injective", "osmosis")
+
+            ibc = RecordingIBC(params)
+            with patch("feat.ibc.time.time", return_value=1000):
+                self.assertIsNone(ibc._track_alert_candidate(key, {"type": "packets"}))
+                self.assertTrue(ibc._should_send_client_alert(client_key, "expiring", 3600))
+            ibc.alert_state.snapshot(force=True)
+
+            restarted = RecordingIBC(params)
+            with patch("feat.ibc.time.time", return_value=1200):
+                self.assertFalse(restarted._should_send_client_alert(client_key, "expiring", 3600))
+                self.assertEqual({"type": "packets"}, restarted._track_alert_candidate(key, {"type": "packets"}))
+
+    def test_clear_inactive_only_touches_its_channel(self):
+        ibc = RecordingIBC({"alert_confirmation_seconds": 180})
+        kept = ("packets", "injective-1", "osmosis-1", "channel-8", "transfer")
+        stale = ("packet", "injective-1", "osmosis-1", "channel-8", "transfer", "4")
+        other = ("packets", "injective-1", "axelar-dojo-1", "channel-84", "transfer")
+        for key in (kept, stale, other):
+            ibc._track_alert_candidate(key, {})
+
+        ibc._clear_inactive_alerts("injective-1", "osmosis-1", "channel-8", "transfer", {kept})
+
+        self.assertIsNotNone(ibc.alert_state.get_candidate(kept))
+        self.assertIsNone(ibc.alert_state.get_candidate(stale))
+        self.assertIsNotNone(ibc.alert_state.get_candidate(other))
+
+
+def packet_event(event, height, sequence, src_channel, dst_channel):
+    return {
+        "result": {
+            "query": f"tm.event='Tx' AND {event}.packet_sequence EXISTS",
+            "events": {
+                "tx.height": [str(height)],
+                f"{event}.packet_sequence": [str(sequence)],
+                f"{event}.packet_src_channel": [src_channel],
+                f"{event}.packet_dst_channel": [dst_channel],
+            },
+        }
+    }
+
+
+class PacketStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = IBCStream(HeadTracker())
+        self.stream.trackers = {"injective": PacketTracker("injective"), "osmosis": PacketTracker("osmosis")}
+        self.stream.counterparties = {("injective", "channel-8"): "osmosis", ("osmosis", "channel-122"): "injective"}
+
+    def test_send_and_acknowledge_packet(self):
+        self.stream.handle("injective", packet_event("send_packet", 100, 7, "channel-8", "channel-122"))
+        self.stream.handle("injective", {
+            "result": {
+                "query": "tm.event='NewBlockHeader'",
+                "data": {"value": {"header": {"height": "130"}}},
+            }
+        })
+        self.stream.handle("osmosis", packet_event("recv_packet", 900, 7, "channel-8", "channel-122"))
+
+        tracker = self.stream.tracker("injective")
+        self.assertEqual(100, tracker.send_height("channel-8", "7"))
+        self.assertEqual(130, self.stream.heads.height("injective", []))
+        self.assertEqual(900, tracker.packets[("channel-8", 7)]["received"])
+
+        self.stream.handle("injective", packet_event("acknowledge_packet", 140, 7, "channel-8", "channel-122"))
+        self.assertIsNone(tracker.send_height("channel-8", 7))
+
+    def test_unmonitored_channels_are_not_tracked(self):
+        self.stream.handle("injective", packet_event("send_packet", 100, 7, "channel-99", "channel-1"))
+
+        self.assertEqual({}, self.stream.tracker("injective").packets)
+
+    def test_reconcile_drops_settled_commitments(self):
+        tracker = self.stream.tracker("injective")
+        tracker.sent("channel-8", 1, 100)
+        tracker.sent("channel-8", 2, 101)
+        tracker.sent("channel-9", 1, 102)
+
+        tracker.reconcile("channel-8", {2})
+
+        self.assertEqual({("channel-8", 2), ("channel-9", 1)}, set(tracker.packets))
+
+
+if __name__ == "__main__":
+    unittest.main()
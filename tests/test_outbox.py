@@ -0,0 +1,96 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from utils.deadletter import DeadLetterQueue
+from utils.outbox import Outbox, dispatch
+
+
+class FlakySource:
+    logger = logging.getLogger("FlakySource")
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.delivered = []
+        self.done = threading.Event()
+
+    def notify_discord(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Discord client loop not ready.")
+        self.delivered.append(("discord", message["type"]))
+        self.done.set()
+
+    def notify_slack(self, message):
+        time.sleep(0.05)
+        self.delivered.append(("slack", message["type"]))
+
+    def notify_telegram(self, message):
+        self.delivered.append(("telegram", message["type"]))
+
+
+class OutboxTest(unittest.TestCase):
+    def test_publish_returns_before_delivery_and_retries_failures(self):
+        app = {"discord": object(), "slack": object(), "telegram": None}
+        outbox = Outbox(app, {"retries": 2, "backoff_seconds": 0})
+        source = FlakySource(failures=1)
+        app["outbox"] = outbox
+
+        started = time.time()
+        dispatch(app, source, {"type": "jailed", "args": {}})
+        self.assertLess(time.time() - started, 0.05)
+
+        outbox.start()
+        self.assertTrue(source.done.wait(2))
+        stats = outbox.stats()
+        self.assertEqual(1, stats["discord"]["retried"])
+        self.assertEqual(1, stats["discord"]["delivered"])
+        self.assertEqual(0, stats["telegram"]["enqueued"])
+
+    def test_gives_up_after_retries(self):
+        app = {"discord": object(), "slack": None, "telegram": None}
+        outbox = Outbox(app, {"retries": 1, "backoff_seconds": 0})
+        event = {"source": FlakySource(failures=5), "message": {"type": "jailed"}, "enqueued_at": time.time(), "attempt": 1}
+
+        outbox.deliver("discord", event)
+
+        self.assertEqual(1, outbox.stats()["discord"]["failed"])
+
+    def test_gives_up_into_the_dead_letters_and_replays_through_the_source(self):
+        app = {"discord": object(), "slack": None, "telegram": None}
+        outbox = Outbox(app, {"retries": 0})
+        outbox.dead_letters = DeadLetterQueue({"path": os.path.join(tempfile.mkdtemp(), "deadletter.jsonl")})
+        outbox.dead_letters.register("outbox", outbox.replay)
+        source = FlakySource(failures=1)
+        outbox.publish(source, {"type": "jailed"})
+
+        outbox.deliver("discord", outbox.queues["discord"].get())
+
+        entry = outbox.dead_letters.list()[0]
+        self.assertEqual(("outbox", "discord"), (entry["platform"], entry["target"]))
+        self.assertEqual({"source": "FlakySource", "message": {"type": "jailed"}}, entry["payload"])
+        self.assertEqual(1, outbox.dead_letters.flush()["delivered"])
+        self.assertEqual([("discord", "jailed")], source.delivered)
+
+    def test_full_queue_drops_alerts(self):
+        app = {"discord": object(), "slack": None, "telegram": None}
+        outbox = Outbox(app, {"queue_size": 1})
+
+        outbox.publish(FlakySource(), {"type": "jailed"})
+        outbox.publish(FlakySource(), {"type": "jailed"})
+
+        self.assertEqual(1, outbox.stats()["discord"]["dropped"])
+
+    def test_dispatch_delivers_inline_without_outbox(self):
+        source = FlakySource(failures=1)
+
+        dispatch({"discord": object(), "slack": None, "telegram": object()}, source, {"type": "jailed"})
+
+        self.assertEqual([("telegram", "jailed")], source.delivered)
+
+
+if __name__ == "__main__":
+    unittest.main()
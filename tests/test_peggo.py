@@ -16,14 +16,17 @@ except ModuleNotFoundError:
     sys.modules["requests.exceptions"] = requests_exceptions
 
 from feat.peggo import Peggo
+from feat.peggo_history import PeggoHistory
 
 
 class RecordingPeggo(Peggo):
-    def __init__(self, params):
+    def __init__(self, params, history=None, jsonrpcs=None):
         super().__init__(
             app={"discord": None, "slack": None, "telegram": None},
             params=params,
             apis=[],
+            history=history,
+            jsonrpcs=jsonrpcs,
         )
         self.messages = []
 
@@ -39,8 +42,8 @@ def operator(last_observed_nonce, last_claim_eth_event_nonce):
         "last_observed_nonce": last_observed_nonce,
         "last_claim_eth_event_nonce": last_claim_eth_event_nonce,
         "last_height": 169410376,
-        "valset_confirms": [],
-        "batch_confirms": [],
+        "valset_confirms": set(),
+        "batch_confirms": set(),
     }
 
 
@@ -124,5 +127,173 @@ class PeggoNonceAlertTest(unittest.TestCase):
         self.assertEqual("nonce_mismatch", peggo.messages[0]["type"])
 
 
+class PeggoSnapshotTest(unittest.TestCase):
+    def test_snapshot_builds_confirming_orchestrator_sets(self):
+        peggo = RecordingPeggo({"threshold": 10, "interval": 1200})
+        module_state = {
+            "state": {
+                "last_observed_nonce": "94215",
+                "valset_confirms": [{"orchestrator": "inj1orchestrator"}, {"orchestrator": "inj1other"}],
+                "batch_confirms": [{"orchestrator": "inj1other"}],
+            }
+        }
+        latest = {"block": {"header": {"height": "169410376"}}}
+
+        with patch("feat.peggo.query.query", side_effect=[module_state, latest]) as mocked:
+            snapshot = peggo.get_snapshot()
+
+        self.assertEqual(2, mocked.call_count)
+        self.assertEqual({"inj1orchestrator", "inj1other"}, snapshot["valset_confirms"])
+        self.assertEqual({"inj1other"}, snapshot["batch_confirms"])
+        self.assertEqual(94215, snapshot["last_observed_nonce"])
+
+    def test_missing_confirm_alerts_once_per_confirm_set(self):
+        peggo = RecordingPeggo({"threshold": 10, "interval": 1200})
+        checked = operator(94215, 94215)
+        checked["valset_confirms"] = {"inj1orchestrator", "inj1other"}
+        checked["batch_confirms"] = {"inj1other"}
+
+        with patch("feat.peggo.time.time", return_value=1000):
+            peggo.check(checked)
+
+        self.assertEqual(["pending_batches"], [message["type"] for message in peggo.messages])
+
+
+class PeggoOperatorFetchTest(unittest.TestCase):
+    def test_delegate_keys_are_cached_between_cycles(self):
+        peggo = RecordingPeggo({"threshold": 10, "interval": 1200, "requests_per_second": 0})
+        validators = [
+            {"operator_address": f"injvaloper{i}", "moniker": f"validator-{i}"}
+            for i in range(3)
+        ]
+
+        def fake_query(apis, path=""):
+            if "query_delegate_keys_by_validator" in path:
+                valoper = path.split("=")[-1]
+                return {"orchestrator_address": valoper.replace("valoper", ""), "eth_address": "0x0"}
+            return {"last_claim_event": {"ethereum_event_nonce": "94215"}}
+
+        with patch("utils.delegates.query.query", side_effect=fake_query) as mocked:
+            first = peggo.fetch_operators(validators)
+            second = peggo.fetch_operators(validators)
+
+        delegate_calls = [call for call in mocked.call_args_list if "delegate_keys" in call.kwargs["path"]]
+        self.assertEqual(3, len(delegate_calls))
+        self.assertEqual(9, mocked.call_count)
+        self.assertEqual(["inj0", "inj1", "inj2"], [operator["orchestrator_address"] for operator in second])
+        self.assertEqual(94215, first[0]["last_claim_eth_event_nonce"])
+
+
+class PeggoHistoryTest(unittest.TestCase):
+    def test_restart_resumes_progress_and_alert_suppression(self):
+        params = {"threshold": 10, "interval": 1200, "nonce_progress_grace_seconds": 1200}
+        history = PeggoHistory(":memory:")
+        peggo = RecordingPeggo(params, history)
+
+        with patch("feat.peggo.time.time", side_effect=[1000, 1000, 2300, 2300]):
+            for checked in (operator(94215, 94171), operator(94216, 94171)):
+                peggo.check(checked)
+                peggo.record(checked)
+        self.assertEqual(1, len(peggo.messages))
+
+        restarted = RecordingPeggo(params, history)
+        self.assertEqual(1000, restarted.nonce_progress["injvaloper1example"]["last_progress_at"])
+        with patch("feat.peggo.time.time", return_value=2400):
+            restarted.check(operator(94217, 94171))
+
+        self.assertEqual([], restarted.messages)
+
+    def test_claim_throughput_over_window(self):
+        history = PeggoHistory(":memory:")
+        for ts, claim in ((0, 100), (1800, 130), (3600, 160), (5400, 175)):
+            history.record("injvaloper1example", 180, claim, ts)
+
+        self.assertEqual(45, history.claim_throughput("injvaloper1example", 3600, now=5400))
+        self.assertEqual([(3600, 20), (5400, 5)], history.lag_trend("injvaloper1example", 1800, now=5400))
+
+
+class JsonRpcStub:
+    """
+    Local stand-in for an Ethereum JSON-RPC endpoint answering batch requests
+    """
+    def __init__(self, contract, event_nonce, valset_nonce, block_number):
+        self.contract = contract
+        self.storage = {"0x73b20547": event_nonce, "0xb56561fe": valset_nonce}
+        self.block_number = block_number
+        self.requests = []
+
+    def __call__(self, method, url, headers=None, json=None, timeout=None):
+        self.requests.append(json)
+        responses = []
+        for call in json:
+            if call["method"] == "eth_blockNumber":
+                responses.append({"jsonrpc": "2.0", "id": call["id"], "result": hex(self.block_number)})
+            elif call["method"] == "eth_call" and call["params"][0]["to"] == self.contract:
+                value = self.storage[call["params"][0]["data"]]
+                responses.append({"jsonrpc": "2.0", "id": call["id"], "result": "0x" + f"{value:064x}"})
+            else:
+                responses.append({"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32601, "message": "not found"}})
+        return StubResponse(responses)
+
+
+class StubResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class PeggoEthereumTest(unittest.TestCase):
+    contract = "0xF955C57f9EA9Dc8781965FEaE0b6A2acE2BAD6f3"
+
+    def test_ethereum_nonces_are_fetched_in_one_batch(self):
+        stub = JsonRpcStub(self.contract, event_nonce=94230, valset_nonce=1200, block_number=21000000)
+        peggo = RecordingPeggo(
+            {"threshold": 10, "interval": 1200, "peggy_contract": self.contract},
+            jsonrpcs=["http://localhost:8545"],
+        )
+
+        with patch("utils.query.requests.request", new=stub):
+            state = peggo.get_ethereum_state()
+
+        self.assertEqual(1, len(stub.requests))
+        self.assertEqual({"block_number": 21000000, "event_nonce": 94230, "valset_nonce": 1200}, state)
+
+    def test_ethereum_lag_alerts_once_until_repeat_interval(self):
+        peggo = RecordingPeggo({"threshold": 10, "interval": 1200, "nonce_alert_repeat_seconds": 60})
+        snapshot = {"last_observed_nonce": 94215, "latest_valset_nonce": 1200}
+        ethereum_state = {"block_number": 21000000, "event_nonce": 94230, "valset_nonce": 1200}
+
+        with patch("feat.peggo.time.time", side_effect=[1000, 1030, 1060]):
+            for _ in range(3):
+                peggo.check_ethereum(snapshot, ethereum_state)
+
+        self.assertEqual(2, len(peggo.messages))
+        self.assertEqual("ethereum_lag", peggo.messages[0]["type"])
+        self.assertEqual("94,230", peggo.messages[0]["args"]["ethereum_event_nonce"])
+
+    def test_stale_valset_on_ethereum_alerts_after_the_grace_period(self):
+        peggo = RecordingPeggo({"threshold": 10, "interval": 1200, "valset_grace_seconds": 3600})
+        snapshot = {"last_observed_nonce": 94215, "latest_valset_nonce": 1201}
+        ethereum_state = {"block_number": 21000000, "event_nonce": 94215, "valset_nonce": 1200}
+
+        with patch("feat.peggo.time.time", return_value=1000) as clock:
+            peggo.check_ethereum(snapshot, ethereum_state)
+            self.assertEqual([], peggo.messages)
+            # relayed one valset, still behind the newest: the grace period restarts
+            clock.return_value = 4000
+            peggo.check_ethereum({**snapshot, "latest_valset_nonce": 1202}, {**ethereum_state, "valset_nonce": 1201})
+            clock.return_value = 7000
+            peggo.check_ethereum({**snapshot, "latest_valset_nonce": 1202}, {**ethereum_state, "valset_nonce": 1201})
+            self.assertEqual([], peggo.messages)
+            clock.return_value = 7600
+            peggo.check_ethereum({**snapshot, "latest_valset_nonce": 1202}, {**ethereum_state, "valset_nonce": 1201})
+
+        self.assertEqual(1, len(peggo.messages))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,59 @@
+import logging
+import queue
+import unittest
+
+from utils.outbox import Outbox
+from utils.priority import LaneQueue, lane, priority
+
+
+class RecordingSource:
+    logger = logging.getLogger("RecordingSource")
+
+    def __init__(self):
+        self.delivered = []
+
+    def notify_discord(self, message):
+        self.delivered.append(message["type"])
+
+
+class PriorityTest(unittest.TestCase):
+    def test_alert_classes(self):
+        self.assertEqual("jailed", lane({"type": "jailed", "args": {}}))
+        self.assertEqual("critical", lane({"type": "miss_block", "args": {"warning_level": "CRITICAL"}}))
+        self.assertEqual("warning", lane({"type": "miss_block", "args": {"warning_level": "WARNING"}}))
+        self.assertEqual("expiring", lane({"type": "client", "args": {"time_left": 0}}))
+        self.assertEqual(3, priority({"type": "low_balance", "args": {}}))
+
+    def test_most_urgent_lane_is_served_first_and_bounded_separately(self):
+        lanes = LaneQueue(maxsize=2)
+        lanes.put_nowait("recovering-1")
+        lanes.put_nowait("recovering-2")
+        lanes.put_nowait("client", "expiring")
+        lanes.put_nowait("jailed", "jailed")
+
+        with self.assertRaises(queue.Full):
+            lanes.put_nowait("low_balance")
+        self.assertEqual(["jailed", "client", "recovering-1", "recovering-2"], [lanes.get() for _ in range(4)])
+        with self.assertRaises(queue.Empty):
+            lanes.get(timeout=0.01)
+
+    def test_outbox_delivers_jailed_ahead_of_backlog(self):
+        app = {"discord": object(), "slack": None, "telegram": None}
+        outbox = Outbox(app, {"slo_seconds": {"warning": 0}})
+        source = RecordingSource()
+        for _ in range(3):
+            outbox.publish(source, {"type": "recovering", "args": {}})
+        outbox.publish(source, {"type": "jailed", "args": {}})
+
+        for _ in range(4):
+            outbox.deliver("discord", outbox.queues["discord"].get())
+
+        self.assertEqual(["jailed", "recovering", "recovering", "recovering"], source.delivered)
+        lanes = outbox.stats()["discord"]["lanes"]
+        self.assertEqual(1, lanes["jailed"]["delivered"])
+        self.assertEqual(0, lanes["jailed"]["slo_missed"])
+        self.assertEqual(3, lanes["warning"]["slo_missed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
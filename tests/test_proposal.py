@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+
+
+import sys
+import types
+
+try:
+    import requests  # noqa: F401
+except ModuleNotFoundError:
+    requests = types.ModuleType("requests")
+    requests.request = None
+    requests_exceptions = types.ModuleType("requests.exceptions")
+    requests_exceptions.RequestException = Exception
+    sys.modules["requests"] = requests
+    sys.modules["requests.exceptions"] = requests_exceptions
+
+try:
+    import bech32  # noqa: F401
+except ModuleNotFoundError:
+    bech32 = types.ModuleType("bech32")
+    bech32.bech32_decode = bech32.bech32_encode = bech32.convertbits = None
+    sys.modules["bech32"] = bech32
+
+from feat.proposal import Proposal, parse_time
+from utils.subscriptions import SubscriptionIndex
+
+
+class Subscriptions:
+    def __init__(self, subscriptions):
+        self.subscriptions = SubscriptionIndex(subscriptions)
+
+
+class RecordingProposal(Proposal):
+    def __init__(self, subscriptions):
+        super().__init__(
+            app={"discord": Subscriptions(subscriptions), "slack": None, "telegram": None},
+            tx_queue=None,
+            params={"min_deposit": 10, "vote_reminder_seconds": 86400},
+            api=["https://lcd.example"],
+            chain="Injective",
+        )
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+def proposal(id, voting_end_time):
+    return {"id": str(id), "title": f"Proposal {id}", "voting_end_time": voting_end_time}
+
+
+class VoteReminderTest(unittest.TestCase):
+    def setUp(self):
+        self.now = parse_time("2025-01-10T00:00:00Z")
+        self.paths = []
+        self.responses = {
+            "/cosmos/gov/v1/proposals?proposal_status=PROPOSAL_STATUS_VOTING_PERIOD&pagination.limit=200": {
+                "proposals": [
+                    proposal(1, "2025-01-10T12:00:00.123456789Z"),
+                    proposal(2, "2025-01-15T00:00:00Z"),
+                ],
+                "pagination": {"next_key": None},
+            },
+            "/cosmos/gov/v1/proposals/1/votes?pagination.limit=200": {
+                "votes": [{"voter": "inj1voted"}],
+                "pagination": {"next_key": "a/b"},
+            },
+            "/cosmos/gov/v1/proposals/1/votes?pagination.limit=200&pagination.key=a%2Fb": {
+                "votes": [{"voter": "inj1late"}],
+                "pagination": {"next_key": None},
+            },
+        }
+
+    def fake_query(self, apis, path):
+        self.paths.append(path)
+        if path.endswith("/tally"):
+            return {"tally": {"yes_count": "1"}}
+        return self.responses[path]
+
+    def test_only_missing_voters_are_reminded_once(self):
+        gov = RecordingProposal([
+            {"user": 1, "validator": "injvaloper1voted"},
+            {"user": 2, "validator": "injvaloper1late"},
+            {"user": 3, "validator": "injvaloper1idle"},
+            {"user": 4, "address": "inj1wallet"},
+        ])
+
+        with patch("feat.proposal.query.query", side_effect=self.fake_query), \
+                patch("feat.proposal.valoper_to_account", side_effect=lambda valoper: valoper.replace("valoper", "")):
+            gov.check_votes(now=self.now)
+            gov.check_votes(now=self.now + 60)
+
+        self.assertEqual([("1", "injvaloper1idle", "12.0h", "2025-01-10 12:00:00")], [
+            (m["args"]["proposal_id"], m["args"]["validator"], m["args"]["time_left"], m["args"]["voting_end_time"]) for m in gov.messages
+        ])
+        self.assertEqual({"yes_count": "1"}, gov.active["2"]["tally"])
+        # votes are only fetched for the proposal inside the reminder window
+        self.assertFalse(any(path.startswith("/cosmos/gov/v1/proposals/2/votes") for path in self.paths))
+
+    def test_finished_proposals_leave_the_cache(self):
+        gov = RecordingProposal([])
+
+        with patch("feat.proposal.query.query", side_effect=self.fake_query):
+            gov.check_votes(now=self.now)
+            gov.check_votes(now=parse_time("2025-01-11T00:00:00Z"))
+
+        self.assertEqual(["2"], list(gov.active))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import time
+import unittest
+
+from utils.ratelimit import TokenBucket
+from utils.sendqueue import SendQueue
+
+
+class RateLimited(Exception):
+    error_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("Too Many Requests")
+        self.result_json = {"parameters": {"retry_after": retry_after}}
+
+
+class SendQueueTest(unittest.TestCase):
+    def run_queue(self, messages, params, fail=None):
+        sent = []
+
+        async def send(chat, text):
+            if fail and fail(chat, text):
+                raise RateLimited(0.05)
+            sent.append((chat, text, time.monotonic()))
+
+        async def main():
+            send_queue = SendQueue(send, params)
+            send_queue.start(asyncio.get_running_loop())
+            for chat, text, *rank in messages:
+                send_queue.put(chat, text, *rank)
+            while send_queue.pending:
+                await asyncio.sleep(0.01)
+            return send_queue
+
+        return asyncio.run(main()), sent
+
+    def test_per_chat_limit_does_not_block_other_chats(self):
+        send_queue, sent = self.run_queue(
+            [("a", 1), ("a", 2), ("a", 3), ("b", 1)],
+            {"global_per_second": 1000, "per_chat_per_second": 10, "workers": 2},
+        )
+
+        a_times = [ts for chat, _, ts in sent if chat == "a"]
+        self.assertEqual([1, 2, 3], [text for chat, text, _ in sent if chat == "a"])
+        self.assertGreaterEqual(a_times[2] - a_times[0], 0.18)
+        # b is served while a waits for its bucket
+        self.assertLess(sent[[chat for chat, _, _ in sent].index("b")][2] - a_times[0], 0.05)
+        self.assertEqual(4, send_queue.stats()["last_drain_messages"])
+        self.assertEqual(0, send_queue.stats()["queued"])
+
+    def test_urgent_messages_overtake_a_rate_limited_backlog(self):
+        _, sent = self.run_queue(
+            [("a", 1), ("a", 2), ("a", 3), ("a", "jailed", 0)],
+            {"global_per_second": 1000, "per_chat_per_second": 20, "workers": 1},
+        )
+
+        self.assertEqual(["jailed", 1, 2, 3], [text for _, text, _ in sent])
+
+    def test_urgent_messages_go_ahead_of_a_parked_chat(self):
+        sent = []
+
+        async def send(chat, text):
+            sent.append(text)
+
+        async def main():
+            send_queue = SendQueue(send, {"global_per_second": 1000, "per_chat_per_second": 20, "workers": 1})
+            send_queue.start(asyncio.get_running_loop())
+            for text in (1, 2, 3):
+                send_queue.put("a", text)
+            await asyncio.sleep(0.01)
+            send_queue.put("a", "jailed", 0)
+            while send_queue.pending:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(main())
+
+        self.assertEqual([1, "jailed", 2, 3], sent)
+
+    def test_retry_after_is_honoured(self):
+        attempts = []
+
+        def fail(chat, text):
+            attempts.append(time.monotonic())
+            return len(attempts) == 1
+
+        send_queue, sent = self.run_queue([("a", 1)], {"global_per_second": 1000, "per_chat_per_second": 1000}, fail)
+
+        self.assertEqual(1, len(sent))
+        self.assertEqual(1, send_queue.metrics["rate_limited"])
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+
+    def test_send_once_waits_for_the_chat_bucket_and_raises(self):
+        sent = []
+
+        async def send(chat, text):
+            if text == "fail":
+                raise RateLimited(5)
+            sent.append(time.monotonic())
+
+        async def main():
+            send_queue = SendQueue(send, {"global_per_second": 1000, "per_chat_per_second": 10})
+            for _ in range(3):
+                await send_queue.send_once("a", "hi")
+            with self.assertRaises(RateLimited):
+                await send_queue.send_once("a", "fail")
+            return send_queue
+
+        send_queue = asyncio.run(main())
+
+        self.assertGreaterEqual(sent[2] - sent[0], 0.18)
+        self.assertGreaterEqual(send_queue.chat_bucket("a").delay(), 4)
+
+    def test_token_bucket_delay(self):
+        bucket = TokenBucket(2, capacity=1)
+
+        bucket.take(now=bucket.updated)
+
+        self.assertAlmostEqual(0.5, bucket.delay(now=bucket.updated))
+        self.assertEqual(0, bucket.delay(now=bucket.updated + 0.5))
+        bucket.block(3, now=bucket.updated)
+        self.assertAlmostEqual(3, bucket.delay(now=bucket.updated))
+
+
+if __name__ == "__main__":
+    unittest.main()
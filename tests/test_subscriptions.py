@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from utils.subscriptions import SubscriptionIndex, SubscriptionStore
+
+
+class SubscriptionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.subscriptions = SubscriptionIndex([
+            {"user": 1, "validator": "injvaloper1a"},
+            {"user": 2, "validator": "injvaloper1a"},
+            {"user": 2, "address": "inj1wallet"},
+            {"user": 3, "sub": "ibc"},
+        ])
+
+    def test_lookups_only_return_matching_subscribers(self):
+        self.assertEqual([1, 2], [sub["user"] for sub in self.subscriptions.for_validator("injvaloper1a")])
+        self.assertEqual([3], [sub["user"] for sub in self.subscriptions.for_topic("ibc")])
+        self.assertEqual([], self.subscriptions.for_validator(None))
+        self.assertEqual(3, len(self.subscriptions.matching("injvaloper1a", "inj1wallet")))
+
+    def test_sub_and_unsub_update_the_index(self):
+        self.assertFalse(self.subscriptions.add({"user": 1, "validator": "injvaloper1a"}))
+        self.assertTrue(self.subscriptions.add({"user": 1, "sub": "gov"}))
+
+        self.assertEqual(1, self.subscriptions.remove(2, "injvaloper1a"))
+        self.assertEqual(0, self.subscriptions.remove(2, "injvaloper1a"))
+
+        self.assertEqual([1], [sub["user"] for sub in self.subscriptions.for_validator("injvaloper1a")])
+        self.assertEqual([{"address": "inj1wallet", "user": 2}], self.subscriptions.for_user(2))
+        self.assertEqual(["injvaloper1a"], self.subscriptions.validators())
+        self.assertEqual(4, len(self.subscriptions))
+        self.assertEqual(self.subscriptions.to_list(), list(self.subscriptions))
+
+
+class SubscriptionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "subscriptions.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_config_subscriptions_are_migrated_once(self):
+        legacy = [{"user": 123, "validator": "injvaloper1a"}, {"user": 123, "validator": "injvaloper1a"}]
+
+        first = SubscriptionIndex.from_store(SubscriptionStore(self.path), "discord", legacy)
+        self.assertEqual([{"user": 123, "validator": "injvaloper1a"}], first.to_list())
+        first.remove(123, "injvaloper1a")
+
+        # the unsubscribed entry must not come back from config.json on restart
+        second = SubscriptionIndex.from_store(SubscriptionStore(self.path), "discord", legacy)
+        self.assertEqual([], second.to_list())
+
+    def test_sub_and_unsub_are_persisted_per_platform(self):
+        store = SubscriptionStore(self.path)
+        telegram = SubscriptionIndex.from_store(store, "telegram")
+        telegram.add({"user": 42, "sub": "ibc"})
+        telegram.add({"user": 42, "validator": "injvaloper1a"})
+        telegram.remove(42, "ibc")
+        SubscriptionIndex.from_store(store, "slack").add({"user": "U1", "validator": "injvaloper1a"})
+
+        reopened = SubscriptionStore(self.path)
+        self.assertEqual([{"user": 42, "validator": "injvaloper1a"}], reopened.load("telegram"))
+        self.assertEqual([{"user": "U1", "validator": "injvaloper1a"}], reopened.load("slack"))
+        self.assertEqual("wal", reopened.db.execute("PRAGMA journal_mode").fetchone()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from utils.outbox import dispatch
+from utils.suppression import SuppressionCache
+
+
+def miss_block(level, validator="injvaloper1a"):
+    return {"type": "miss_block", "args": {"validator": validator, "moniker": "a", "warning_level": level}}
+
+
+class SuppressionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "suppression.json")
+        self.params = {"path": self.path, "ttl_seconds": {"miss_block": 600, "low_balance": 600}, "save_interval_seconds": 0}
+
+    def test_repeats_are_suppressed_until_the_ttl_expires(self):
+        cache = SuppressionCache(self.params)
+
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1000))
+        self.assertFalse(cache.allow(miss_block("WARNING"), now=1300))
+        self.assertTrue(cache.allow(miss_block("WARNING", "injvaloper1b"), now=1300))
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1601))
+        self.assertEqual(1, cache.stats()["suppressed"])
+
+    def test_escalation_bypasses_and_resolution_clears(self):
+        cache = SuppressionCache(self.params)
+
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1000))
+        self.assertTrue(cache.allow(miss_block("CRITICAL"), now=1010))
+        self.assertFalse(cache.allow(miss_block("WARNING"), now=1020))
+        self.assertTrue(cache.allow({"type": "recovering", "args": {"validator": "injvaloper1a"}}, now=1030))
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1040))
+
+    def test_flapping_validator_gets_every_transition(self):
+        cache = SuppressionCache({**self.params, "ttl_seconds": {"miss_block": 600, "recovering": 3600}})
+        recovering = {"type": "recovering", "args": {"validator": "injvaloper1a"}}
+
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1000))
+        self.assertTrue(cache.allow(recovering, now=1100))
+        self.assertTrue(cache.allow(miss_block("WARNING"), now=1200))
+        self.assertTrue(cache.allow(recovering, now=1300))
+        self.assertFalse(cache.allow(recovering, now=1400))
+
+    def test_types_without_ttl_are_not_suppressed(self):
+        cache = SuppressionCache(self.params)
+
+        self.assertTrue(cache.allow({"type": "consensus_stall", "args": {"height": 1}}, now=1000))
+        self.assertTrue(cache.allow({"type": "consensus_stall", "args": {"height": 1}}, now=1001))
+
+    def test_memory_is_bounded(self):
+        cache = SuppressionCache({**self.params, "max_entries": 2})
+
+        for validator in ("a", "b", "c"):
+            cache.allow(miss_block("WARNING", validator), now=1000)
+
+        self.assertEqual(2, cache.stats()["entries"])
+        self.assertTrue(cache.allow(miss_block("WARNING", "a"), now=1001))
+
+    def test_survives_a_restart(self):
+        SuppressionCache(self.params).allow({"type": "low_balance", "args": {"validator": None, "address": "inj1x"}})
+
+        self.assertFalse(SuppressionCache(self.params).allow({"type": "low_balance", "args": {"validator": None, "address": "inj1x"}}))
+
+    def test_dispatch_drops_suppressed_alerts(self):
+        delivered = []
+
+        class Source:
+            logger = logging.getLogger("Source")
+
+            def notify_discord(self, message):
+                delivered.append(message["type"])
+
+        app = {"discord": object(), "suppression": SuppressionCache({**self.params, "path": None})}
+        for _ in range(3):
+            dispatch(app, Source(), miss_block("WARNING"))
+
+        self.assertEqual(["miss_block"], delivered)
+
+
+if __name__ == "__main__":
+    unittest.main()
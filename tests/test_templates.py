@@ -0,0 +1,56 @@
+import unittest
+
+from utils.templates import AlertTemplate, Templates
+
+
+TEMPLATES = {
+    "packet": AlertTemplate(
+        title="Pending packet `{sequence}` from {chain-1}",
+        description="{url}",
+        fields=[
+            ("Sequence", "{sequence}"),
+            ("Pending Blocks", lambda args, params: args.get("pending_blocks")),
+            ("Threshold", lambda args, params: params["threshold"], False)
+        ],
+        color=lambda args, params: 0xff0000 if args.get("pending_blocks") else 0xfff942
+    )
+}
+
+
+def message(**args):
+    return {"type": "packet", "args": {"sequence": "7", "chain-1": "injective", "url": "https://example", **args}, "auto_delete": 60}
+
+
+class TemplatesTest(unittest.TestCase):
+    def test_renders_each_format(self):
+        templates = Templates(TEMPLATES, {"threshold": 5})
+
+        self.assertEqual({
+            "title": "**Pending packet `7` from injective**",
+            "description": "https://example",
+            "fields": [
+                {"name": "Sequence", "value": "7", "inline": True},
+                {"name": "Threshold", "value": 5, "inline": False}
+            ],
+            "footer": "This message will be automatically deleted in 60s",
+            "color": 0xfff942
+        }, templates.render(message(), "discord"))
+        self.assertEqual(
+            "*Pending packet `7` from injective*\nhttps://example\nSequence: `7`\nPending Blocks: `12`\nThreshold: `5`",
+            templates.render(message(pending_blocks=12), "text")
+        )
+
+    def test_renders_once_per_alert(self):
+        calls = []
+        templates = Templates({"packet": AlertTemplate(title=lambda args, params: calls.append(1) or "title")})
+        alert = message()
+
+        for _ in range(100):
+            templates.render(alert, "text")
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual("*title*", alert["rendered"]["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import sys
+import types
+import unittest
+
+try:
+    import requests  # noqa: F401
+except ModuleNotFoundError:
+    requests = types.ModuleType("requests")
+    requests.request = None
+    requests_exceptions = types.ModuleType("requests.exceptions")
+    requests_exceptions.RequestException = Exception
+    sys.modules["requests"] = requests
+    sys.modules["requests.exceptions"] = requests_exceptions
+
+from utils.webhook import WebhookSender
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+
+
+class Session:
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, url, headers, data, timeout):
+        self.posts.append((url, json.loads(data), timeout))
+        return self.responses.pop(0) if self.responses else Response(200)
+
+
+class WebhookSenderTest(unittest.TestCase):
+    def test_messages_are_batched_per_webhook(self):
+        session = Session()
+        sender = WebhookSender({"window_seconds": 0.05, "timeout_seconds": 5}, session)
+        for i in range(30):
+            sender.put("https://hooks.example/a", f"*Validator {i} is JAILED!*")
+        sender.put("https://hooks.example/b", "*Client 07-tendermint-0 is about to expire!*")
+
+        for webhook_url, messages in sender.collect().items():
+            for payload, size in sender.payloads(messages):
+                sender.post(webhook_url, payload, size)
+
+        # 30 alerts -> 25 + 5 per Block Kit message (50 blocks), the lone alert as plain text
+        a = [payload for url, payload, _ in session.posts if url.endswith("/a")]
+        self.assertEqual([49, 9], [len(payload["blocks"]) for payload in a])
+        self.assertEqual("*Validator 0 is JAILED!*", a[0]["blocks"][0]["text"]["text"])
+        self.assertEqual(
+            [{"text": "*Client 07-tendermint-0 is about to expire!*"}],
+            [payload for url, payload, _ in session.posts if url.endswith("/b")]
+        )
+        self.assertTrue(all(timeout == 5 for _, _, timeout in session.posts))
+        self.assertEqual(31, sender.stats()["delivered"])
+
+    def test_urgent_alerts_are_sent_ahead_of_queued_warnings(self):
+        session = Session()
+        sender = WebhookSender({"window_seconds": 0}, session)
+        for i in range(3):
+            sender.put("https://hooks.example/a", f"*Validator {i} is missing blocks!*")
+        sender.put("https://hooks.example/b", "*Validator 9 is JAILED!*", 0)
+
+        self.assertEqual({"https://hooks.example/b": ["*Validator 9 is JAILED!*"]}, sender.collect())
+        self.assertEqual(3, sender.stats()["queued"])
+
+    def test_rate_limit_is_retried_after_retry_after(self):
+        session = Session([Response(429, {"Retry-After": "0"}), Response(200)])
+        sender = WebhookSender({"backoff_seconds": 0}, session)
+
+        self.assertTrue(sender.post("https://hooks.example/a", {"text": "hi"}))
+
+        self.assertEqual(2, len(session.posts))
+        self.assertEqual(1, sender.stats()["rate_limited"])
+
+    def test_client_errors_are_not_retried(self):
+        session = Session([Response(400), Response(200)])
+        dead_letters = []
+        sender = WebhookSender({"backoff_seconds": 0}, session, on_error=lambda *letter: dead_letters.append(letter))
+
+        self.assertFalse(sender.post("https://hooks.example/a", {"text": "hi"}))
+
+        self.assertEqual(1, len(session.posts))
+        self.assertEqual(1, sender.stats()["failed"])
+        self.assertEqual([("https://hooks.example/a", {"text": "hi"}, "Slack webhook returned 400: ")], dead_letters)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+MAX_FIELDS = 25 # per embed
+MAX_EMBEDS = 10 # per message
+MAX_MESSAGE_CHARS = 6000 # all embeds of a message together
+MAX_CONTENT_CHARS = 2000
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+
+class EmbedCoalescer:
+    """
+    Buffers alert embeds per channel for `window_seconds` and sends each buffer as few Discord
+    messages as possible: up to 10 embeds as they are, larger bursts as digest embeds with one
+    field per alert. Runs on the Discord client's event loop; `send(channel_id, mention, embeds,
+    auto_delete)` posts one message and `compose(title, fields, footer, color)` builds an embed;
+    `on_error(channel_id, mention, embeds, auto_delete, error)` gets the messages that failed
+    """
+    def __init__(self, send, compose, params=None, on_error=None):
+        params = params or {}
+        self.send = send
+        self.compose = compose
+        self.on_error = on_error
+        self.window: float = params.get("window_seconds", 2)
+        self.max_alerts: int = params.get("max_alerts", MAX_FIELDS * MAX_EMBEDS)
+        self.buffers: dict = {} # (channel_id, auto_delete) -> {"alerts": [embed], "mentions": [str], "timer": TimerHandle}
+        self.metrics = {
+            "alerts": 0,
+            "messages": 0,
+            "failed": 0
+        }
+        self.logger = logging.getLogger("EmbedCoalescer")
+        self.logger.setLevel(logging.INFO)
+
+    def put(self, channel_id, embed, mention="", auto_delete=None):
+        """
+        Buffers an alert; must be called from the event loop the client runs on
+        """
+        key = (channel_id, auto_delete)
+        self.metrics["alerts"] += 1
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            loop = asyncio.get_running_loop()
+            buffer = self.buffers[key] = {
+                "alerts": [],
+                "mentions": [],
+                "timer": loop.call_later(self.window, lambda: asyncio.ensure_future(self.flush(key)))
+            }
+        buffer["alerts"].append(embed)
+        for user in (mention or "").split():
+            if user not in buffer["mentions"]:
+                buffer["mentions"].append(user)
+        if len(buffer["alerts"]) >= self.max_alerts:
+            buffer["timer"].cancel()
+            asyncio.ensure_future(self.flush(key))
+
+    async def flush(self, key):
+        buffer = self.buffers.pop(key, None)
+        if buffer is None:
+            return
+        channel_id, auto_delete = key
+        messages = self.pack(buffer["alerts"])
+        mention = self.mention(buffer["mentions"])
+        for embeds in messages:
+            try:
+                await self.send(channel_id, mention, embeds, auto_delete)
+                self.metrics["messages"] += 1
+            except Exception as e:
+                self.metrics["failed"] += 1
+                self.logger.error(f"Error sending {len(embeds)} embeds to channel {channel_id}: {e}")
+                if self.on_error is not None:
+                    self.on_error(channel_id, mention, embeds, auto_delete, e)
+            # mention the subscribers once per burst
+            mention = ""
+        if len(buffer["alerts"]) > 1:
+            self.logger.info(f"Coalesced {len(buffer['alerts'])} alerts into {len(messages)} messages for channel {channel_id}.")
+
+    @staticmethod
+    def mention(users) -> str:
+        content = ""
+        for user in users:
+            if len(content) + len(user) + 1 > MAX_CONTENT_CHARS:
+                break
+            content += f" {user}"
+        return content
+
+    def pack(self, alerts) -> list:
+        """
+        Lists of embeds, one per message
+        """
+        if len(alerts) <= MAX_EMBEDS and sum(len(embed) for embed in alerts) <= MAX_MESSAGE_CHARS:
+            return [alerts]
+        footer = alerts[0].footer.text or ""
+        title = f"**{len(alerts)} alerts**"
+        overhead = len(title) + len(footer)
+        pages = [] # lists of fields, one per digest embed
+        messages = [] # lists of pages
+        fields, size = [], 0
+        for embed in alerts:
+            field = self.summarize(embed)
+            cost = len(field["name"]) + len(field["value"])
+            if fields and (len(fields) == MAX_FIELDS or size + overhead + cost > MAX_MESSAGE_CHARS):
+                pages.append(fields)
+                fields = []
+                if len(pages) == MAX_EMBEDS or size + overhead + cost > MAX_MESSAGE_CHARS:
+                    messages.append(pages)
+                    pages, size = [], 0
+            if not fields:
+                size += overhead
+            fields.append(field)
+            size += cost
+        pages.append(fields)
+        messages.append(pages)
+        color = alerts[0].color
+        return [
+            [self.compose(title=title, fields=page, footer=footer, color=color) for page in message]
+            for message in messages
+        ]
+
+    @staticmethod
+    def summarize(embed) -> dict:
+        """
+        One digest field for an alert embed: its title as the name, description and fields as the value
+        """
+        lines = [embed.description] if embed.description else []
+        lines += [f"{field.name}: {field.value}" for field in embed.fields]
+        value = "\n".join(lines) or "-"
+        return {
+            "name": (embed.title or "Alert").replace("**", "")[:MAX_FIELD_NAME],
+            "value": value[:MAX_FIELD_VALUE],
+            "inline": False
+        }
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "buffered": sum(len(buffer["alerts"]) for buffer in self.buffers.values())
+        }
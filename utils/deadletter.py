@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+class DeadLetterQueue:
+    """
+    Alerts a platform client gave up delivering, kept in a local JSONL file with the rendered
+    payload and the error. A replay thread retries them with exponential backoff through the
+    `replay(target, payload)` callable each platform registers, which raises on failure
+    """
+    def __init__(self, params=None):
+        params = params or {}
+        self.path: str = params.get("path", "deadletter.jsonl")
+        self.interval: float = params.get("replay_interval_seconds", 60)
+        self.backoff: float = params.get("backoff_seconds", 60)
+        self.max_backoff: float = params.get("max_backoff_seconds", 3600)
+        self.max_attempts: int = params.get("max_attempts", 10)
+        self.replayers: dict = {}
+        self.lock = threading.Lock() # guards the file
+        self.replaying = threading.Lock() # one replay at a time, so a letter is never sent twice
+        self.logger = logging.getLogger("DeadLetter")
+        self.logger.setLevel(logging.INFO)
+
+    def register(self, platform, replay):
+        self.replayers[platform] = replay
+
+    def start(self):
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+
+    def work(self):
+        while True:
+            time.sleep(self.interval)
+            self.replay()
+
+    def load(self) -> list:
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                self.logger.error(f"Skipping corrupted dead letter in {self.path}: {e}")
+        return entries
+
+    def save(self, entries):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def add(self, platform, target, payload, error, now=None):
+        """
+        Appends a failed delivery; `payload` must be JSON serializable
+        """
+        now = now or time.time()
+        entry = {
+            "id": uuid.uuid4().hex[:8],
+            "platform": platform,
+            "target": target,
+            "payload": payload,
+            "error": str(error),
+            "failed_at": now,
+            "attempts": 0,
+            "next_attempt_at": now + self.backoff
+        }
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        self.logger.warning(f"Dead-lettered {platform} delivery to {target}: {error}")
+
+    def list(self) -> list:
+        with self.lock:
+            return self.load()
+
+    def replay(self, force=False, now=None) -> dict:
+        """
+        Retries the due dead letters, or all of them with `force`; delivered ones are removed.
+        Sends without the file lock held, so a failure while replaying can dead-letter again
+        """
+        with self.replaying:
+            return self.replay_entries(force, now)
+
+    def replay_entries(self, force, now):
+        now = now or time.time()
+        result = {"delivered": 0, "failed": 0, "remaining": 0}
+        with self.lock:
+            entries = self.load()
+        remaining = []
+        for entry in entries:
+            replay = self.replayers.get(entry["platform"])
+            due = force or (entry["attempts"] < self.max_attempts and entry["next_attempt_at"] <= now)
+            if replay is None or not due:
+                remaining.append(entry)
+                continue
+            try:
+                replay(entry["target"], entry["payload"])
+                result["delivered"] += 1
+            except Exception as e:
+                entry["attempts"] += 1
+                entry["error"] = str(e)
+                entry["next_attempt_at"] = now + min(self.backoff * 2 ** entry["attempts"], self.max_backoff)
+                remaining.append(entry)
+                result["failed"] += 1
+        with self.lock:
+            if result["delivered"] or result["failed"]:
+                replayed = {entry["id"] for entry in entries}
+                # keep what was dead-lettered while replaying
+                remaining += [entry for entry in self.load() if entry["id"] not in replayed]
+                self.save(remaining)
+                result["remaining"] = len(remaining)
+            else:
+                result["remaining"] = len(self.load())
+        if result["delivered"] or result["failed"]:
+            self.logger.info(f"Replayed dead letters: {result['delivered']} delivered, {result['failed']} failed, {result['remaining']} remaining.")
+        return result
+
+    def flush(self) -> dict:
+        """
+        Retries every dead letter now, regardless of backoff and attempts
+        """
+        return self.replay(force=True)
@@ -0,0 +1,30 @@
+import threading
+import time
+
+import utils.query as query
+
+class DelegateKeyCache:
+    """
+    Peggy delegate keys (orchestrator/ethereum addresses) per validator, cached for `ttl` seconds
+    since operators rarely rotate them
+    """
+    def __init__(self, apis, ttl=86400, limiter=None):
+        self.apis = apis
+        self.ttl = ttl
+        self.limiter = limiter
+        self.keys: dict = {} # valoper -> (delegate keys, fetched_at)
+        self.lock = threading.Lock()
+
+    def get(self, valoper_address) -> dict:
+        now = time.time()
+        with self.lock:
+            cached = self.keys.get(valoper_address)
+        if cached is not None and now - cached[1] < self.ttl:
+            return cached[0]
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+        keys = query.query(self.apis, path=f"/peggy/v1/query_delegate_keys_by_validator?validator_address={valoper_address}")
+        with self.lock:
+            self.keys[valoper_address] = (keys, now)
+        return keys
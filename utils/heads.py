@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import utils.query as query
+
+class HeadTracker:
+    """
+    Latest block height per chain, shared by every check of a sweep. Heights are
+    fetched at most once per sweep, or pushed by a websocket NewBlock subscription.
+    """
+    def __init__(self, stream_max_age=60, block_time_cache_size=1024):
+        self.heads: dict = {} # chain -> {"height", "updated_at", "streamed"}
+        self.sweep_started_at = 0
+        self.stream_max_age = stream_max_age
+        self.block_times = OrderedDict() # (chain, height) -> header time
+        self.block_time_cache_size = block_time_cache_size
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Heads")
+
+    def begin_sweep(self):
+        self.sweep_started_at = time.time()
+
+    def update(self, chain, height):
+        with self.lock:
+            head = self.heads.get(chain)
+            if head is None or height >= head["height"]:
+                self.heads[chain] = {"height": height, "updated_at": time.time(), "streamed": True}
+
+    def _is_fresh(self, head):
+        if head["streamed"] and time.time() - head["updated_at"] <= self.stream_max_age:
+            return True
+        return head["updated_at"] >= self.sweep_started_at
+
+    def height(self, chain, apis) -> int:
+        with self.lock:
+            head = self.heads.get(chain)
+            if head is not None and self._is_fresh(head):
+                return head["height"]
+        data = query.query(apis, path="/cosmos/base/tendermint/v1beta1/blocks/latest")
+        height = int(data["block"]["header"]["height"])
+        with self.lock:
+            self.heads[chain] = {"height": height, "updated_at": time.time(), "streamed": False}
+        return height
+
+    def block_time(self, chain, apis, height) -> str:
+        """
+        Header time of a past block, cached since it never changes
+        """
+        key = (chain, int(height))
+        with self.lock:
+            if key in self.block_times:
+                self.block_times.move_to_end(key)
+                return self.block_times[key]
+        data = query.query(apis, path=f"/cosmos/base/tendermint/v1beta1/blocks/{height}")
+        block_time = data["block"]["header"]["time"]
+        with self.lock:
+            self.block_times[key] = block_time
+            if len(self.block_times) > self.block_time_cache_size:
+                self.block_times.popitem(last=False)
+        return block_time
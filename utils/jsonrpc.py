@@ -0,0 +1,32 @@
+import logging
+
+import utils.query as query
+
+def batch(urls, calls: list) -> list:
+    """
+    Sends JSON-RPC calls as a single batch request, returning results in call order
+    (None for calls answered with an error)
+    """
+    if not calls:
+        return []
+    body = [
+        {"jsonrpc": "2.0", "id": idx, "method": method, "params": params}
+        for idx, (method, params) in enumerate(calls)
+    ]
+    data = query.query(urls, method="POST", header={"Content-Type": "application/json"}, body=body)
+    if isinstance(data, dict):
+        raise Exception(f"Batch request rejected: {data.get('error', data)}")
+
+    results = [None] * len(calls)
+    for item in data:
+        if "error" in item:
+            logging.error(f"JSON-RPC {calls[item['id']][0]} failed: {item['error']}")
+            continue
+        results[item["id"]] = item.get("result")
+    return results
+
+def eth_call(to, data, block="latest") -> tuple:
+    return ("eth_call", [{"to": to, "data": data}, block])
+
+def to_int(value):
+    return int(value, 16) if value not in (None, "0x") else None
@@ -0,0 +1,198 @@
+import logging
+import queue
+import threading
+import time
+from utils.priority import LANES, SLO_SECONDS, LaneQueue, lane
+from utils.templates import Templates
+
+PLATFORMS = ("discord", "slack", "telegram")
+
+class Outbox:
+    """
+    Per-platform alert queues drained by worker threads, so detectors return as soon as an
+    alert is enqueued and a slow chat API only delays its own platform. Each platform queue
+    has a lane per delivery class (utils.priority), the most urgent served first, and
+    latency is tracked against each class's SLO. Alerts it gives up on are dead-lettered
+    with their rendered text and replayed through the feature that raised them
+    """
+    def __init__(self, app, params=None):
+        self.app: dict = app
+        self.params: dict = params or {}
+        self.dead_letters = None # DeadLetterQueue, set by main
+        self.sources: dict = {} # feature class name -> feature, for replaying dead letters
+        self.queues: dict = {}
+        self.metrics: dict = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Outbox")
+        self.logger.setLevel(logging.INFO)
+        for platform in PLATFORMS:
+            self.queues[platform] = LaneQueue(maxsize=self.setting(platform, "queue_size", 10000))
+            self.metrics[platform] = {
+                "enqueued": 0,
+                "delivered": 0,
+                "retried": 0,
+                "failed": 0,
+                "dropped": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+                "lanes": {
+                    name: {"delivered": 0, "latency_total": 0.0, "latency_max": 0.0, "slo_missed": 0}
+                    for name in LANES
+                }
+            }
+        self.slo_seconds: dict = {**SLO_SECONDS, **self.params.get("slo_seconds", {})}
+
+    def setting(self, platform, key, default):
+        return self.params.get(platform, {}).get(key, self.params.get(key, default))
+
+    def platforms(self) -> list:
+        return [platform for platform in PLATFORMS if self.app.get(platform) is not None]
+
+    def start(self):
+        for platform in self.platforms():
+            for _ in range(self.setting(platform, "concurrency", 1)):
+                worker = threading.Thread(target=self.work, args=(platform,))
+                worker.daemon = True
+                worker.start()
+            self.logger.info(f"Started {self.setting(platform, 'concurrency', 1)} {platform} workers.")
+        if self.params.get("stats_interval"):
+            reporter = threading.Thread(target=self.report)
+            reporter.daemon = True
+            reporter.start()
+
+    def report(self):
+        while True:
+            time.sleep(self.params["stats_interval"])
+            for platform, stats in self.stats().items():
+                if platform in self.platforms():
+                    self.logger.info(
+                        f"{platform}: {stats['queued']} queued, {stats['delivered']} delivered, {stats['retried']} retried, "
+                        f"{stats['failed']} failed, {stats['dropped']} dropped, latency avg {stats['latency_avg']:.2f}s max {stats['latency_max']:.2f}s"
+                    )
+                    for name, lane_stats in stats["lanes"].items():
+                        if lane_stats["slo_missed"]:
+                            self.logger.warning(
+                                f"{platform} {name}: {lane_stats['slo_missed']}/{lane_stats['delivered']} alerts over the "
+                                f"{self.slo_seconds[name]}s SLO, latency max {lane_stats['latency_max']:.2f}s"
+                            )
+
+    def count(self, platform, metric, value=1):
+        with self.lock:
+            self.metrics[platform][metric] += value
+
+    def publish(self, source, message):
+        """
+        Enqueues an alert for every enabled platform; `source` is the feature that renders it
+        """
+        self.sources[type(source).__name__] = source
+        for platform in self.platforms():
+            self.put(platform, {"source": source, "message": message, "enqueued_at": time.time(), "attempt": 0})
+
+    def put(self, platform, event):
+        try:
+            self.queues[platform].put_nowait(event, lane(event["message"]))
+            self.count(platform, "enqueued")
+        except queue.Full:
+            self.count(platform, "dropped")
+            self.logger.error(f"{platform} outbox is full, dropping {event['message']['type']} alert.")
+
+    def work(self, platform):
+        while True:
+            event = self.queues[platform].get()
+            self.deliver(platform, event)
+
+    def deliver(self, platform, event):
+        try:
+            getattr(event["source"], f"notify_{platform}")(event["message"])
+        except Exception as e:
+            if event["attempt"] < self.setting(platform, "retries", 3):
+                delay = self.setting(platform, "backoff_seconds", 2) * 2 ** event["attempt"]
+                event["attempt"] += 1
+                self.count(platform, "retried")
+                self.logger.warning(f"Error sending {event['message']['type']} to {platform}, retrying in {delay}s: {e}")
+                retry = threading.Timer(delay, self.put, args=(platform, event))
+                retry.daemon = True
+                retry.start()
+            else:
+                self.count(platform, "failed")
+                self.logger.error(f"Giving up sending {event['message']['type']} to {platform}: {e}")
+                self.dead_letter(platform, event, e)
+            return
+        latency = time.time() - event["enqueued_at"]
+        name = lane(event["message"])
+        with self.lock:
+            lane_metrics = self.metrics[platform]["lanes"][name]
+            for metrics in (self.metrics[platform], lane_metrics):
+                metrics["delivered"] += 1
+                metrics["latency_total"] += latency
+                metrics["latency_max"] = max(metrics["latency_max"], latency)
+            if latency > self.slo_seconds[name]:
+                lane_metrics["slo_missed"] += 1
+
+    def dead_letter(self, platform, event, error):
+        """
+        Keeps an alert the workers gave up on, rendered, so the replay doesn't lose it to
+        the suppression cache that already recorded it as sent
+        """
+        if self.dead_letters is None:
+            return
+        source, message = event["source"], event["message"]
+        try:
+            templates = getattr(source, "templates", None)
+            if templates is not None:
+                for format in Templates.FORMATS:
+                    templates.render(message, format)
+            self.dead_letters.add("outbox", platform, {"source": type(source).__name__, "message": message}, error)
+        except Exception as e:
+            self.logger.error(f"Error dead-lettering {message['type']} alert for {platform}: {e}")
+
+    def replay(self, platform, payload):
+        """
+        Delivers a dead-lettered alert again through its feature; called from the replay thread.
+        Features register on their first alert, so after a restart a letter waits for that
+        """
+        source = self.sources.get(payload["source"])
+        if source is None:
+            raise RuntimeError(f"{payload['source']} has not raised an alert since the restart.")
+        getattr(source, f"notify_{platform}")(payload["message"])
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                platform: {
+                    **metrics,
+                    "queued": self.queues[platform].qsize(),
+                    "latency_avg": metrics["latency_total"] / metrics["delivered"] if metrics["delivered"] else 0.0,
+                    "lanes": {
+                        name: {
+                            **lane_metrics,
+                            "queued": self.queues[platform].qsize(name),
+                            "latency_avg": lane_metrics["latency_total"] / lane_metrics["delivered"] if lane_metrics["delivered"] else 0.0
+                        }
+                        for name, lane_metrics in metrics["lanes"].items()
+                    }
+                }
+                for platform, metrics in self.metrics.items()
+            }
+
+
+def dispatch(app, source, message):
+    """
+    Hands an alert to the outbox, or delivers it inline when no outbox is running.
+    Repeats held back by the suppression cache stop here, before rendering or any I/O
+    """
+    suppression = app.get("suppression")
+    if suppression is not None and not suppression.allow(message):
+        return
+    outbox = app.get("outbox")
+    if outbox is not None:
+        outbox.publish(source, message)
+        return
+    for platform in PLATFORMS:
+        if app.get(platform) is None:
+            source.logger.error(f"{platform.capitalize()} client is not initialized.")
+            continue
+        try:
+            getattr(source, f"notify_{platform}")(message)
+        except Exception as e:
+            source.logger.error(f"Error sending message to {platform}: {e}")
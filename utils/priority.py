@@ -0,0 +1,60 @@
+import collections
+import queue
+import threading
+
+# delivery classes, most urgent first
+LANES = ("jailed", "critical", "expiring", "warning")
+# latency targets from enqueue to delivery, per class
+SLO_SECONDS = {"jailed": 10, "critical": 30, "expiring": 120, "warning": 600}
+
+def lane(message) -> str:
+    """
+    Delivery class of an alert, from the alert types the features send
+    """
+    alert_type = message.get("type")
+    args = message.get("args", {})
+    if alert_type == "jailed":
+        return "jailed"
+    if (alert_type == "miss_block" and args.get("warning_level") == "CRITICAL") or alert_type == "consensus_stall":
+        return "critical"
+    if alert_type == "client":
+        return "expiring"
+    return "warning"
+
+def priority(message) -> int:
+    """
+    Rank of an alert's class, 0 being the most urgent
+    """
+    return LANES.index(lane(message))
+
+
+class LaneQueue:
+    """
+    One FIFO per delivery class behind a single blocking `get`, which always serves the most
+    urgent non-empty class. `maxsize` bounds each class separately, so a flood of warnings
+    can't crowd out a jailed alert
+    """
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.lanes = {name: collections.deque() for name in LANES}
+        self.not_empty = threading.Condition()
+
+    def put_nowait(self, item, lane="warning"):
+        with self.not_empty:
+            if self.maxsize and len(self.lanes[lane]) >= self.maxsize:
+                raise queue.Full
+            self.lanes[lane].append(item)
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        with self.not_empty:
+            if not self.not_empty.wait_for(self.qsize, timeout):
+                raise queue.Empty
+            for name in LANES:
+                if self.lanes[name]:
+                    return self.lanes[name].popleft()
+
+    def qsize(self, lane=None) -> int:
+        if lane is not None:
+            return len(self.lanes[lane])
+        return sum(len(items) for items in self.lanes.values())
@@ -1,6 +1,6 @@
 import hashlib
 import base64
-from bech32 import bech32_encode, convertbits
+from bech32 import bech32_decode, bech32_encode, convertbits
 
 def convert(pubkey_base64, prefix):
     """
@@ -18,6 +18,15 @@ def convert(pubkey_base64, prefix):
 
     return  hex_address.upper(), bech32_address
 
+def valoper_to_account(valoper_address):
+    """
+    Re-encodes a validator operator address (e.g. injvaloper1...) as its account address (inj1...)
+    """
+    prefix, data = bech32_decode(valoper_address)
+    if prefix is None or not prefix.endswith("valoper"):
+        raise ValueError(f"Invalid validator operator address: {valoper_address}")
+    return bech32_encode(prefix[:-len("valoper")], data)
+
 # if __name__ == "__main__":
 #     prefix = "onomyvalcons"
 #     consensus_pubkey = { 
@@ -0,0 +1,59 @@
+import threading
+import time
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing calls evenly at `rate` calls per second (0 disables it)
+    """
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`, for use from a single
+    event loop; `block` empties it for a while, e.g. after a 429 with retry_after
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None) -> float:
+        """
+        Seconds until a token is available
+        """
+        now = now or time.monotonic()
+        self.refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now=None):
+        self.refill(now or time.monotonic())
+        self.tokens -= 1
+
+    def block(self, seconds, now=None):
+        self.blocked_until = max(self.blocked_until, (now or time.monotonic()) + seconds)
+
+    def idle(self, now=None) -> bool:
+        now = now or time.monotonic()
+        self.refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
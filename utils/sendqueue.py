@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+from utils.priority import LANES
+from utils.ratelimit import TokenBucket
+
+class SendQueue:
+    """
+    Rate-limited delivery queue for a chat API with a global and a per-chat message limit.
+    Messages are served by priority (utils.priority ranks, 0 first), in order within a rank.
+    Runs on the client's event loop; `send(chat, text)` is the client's coroutine
+    """
+    def __init__(self, send, params=None, name="SendQueue", on_error=None):
+        params = params or {}
+        self.send = send
+        self.on_error = on_error # called with (chat, text, error) once retries are exhausted
+        self.global_rate: float = params.get("global_per_second", 30)
+        self.chat_rate: float = params.get("per_chat_per_second", 1)
+        self.workers: int = params.get("workers", 4)
+        self.retries: int = params.get("retries", 3)
+        self.max_chat_buckets: int = params.get("max_chat_buckets", 10000)
+        self.global_bucket = TokenBucket(self.global_rate, params.get("global_burst", self.global_rate))
+        self.chat_buckets: dict = {}
+        self.parked: dict = {} # chat -> messages waiting for the chat's bucket, in order
+        self.queue: asyncio.PriorityQueue = None
+        self.sequence = itertools.count()
+        self.pending = 0 # queued + deferred messages
+        self.drain_started_at = None
+        self.metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "rate_limited": 0,
+            "retried": 0,
+            "failed": 0,
+            "last_drain_messages": 0,
+            "last_drain_seconds": 0.0
+        }
+        self.drained = 0
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+
+    def start(self, loop):
+        self.queue = asyncio.PriorityQueue()
+        for _ in range(self.workers):
+            loop.create_task(self.work())
+
+    def put(self, chat, text, priority=len(LANES) - 1):
+        """
+        Enqueues a message; must be called from the event loop the queue runs on
+        """
+        if self.pending == 0:
+            self.drain_started_at = time.monotonic()
+            self.drained = 0
+        self.pending += 1
+        self.metrics["enqueued"] += 1
+        self.queue.put_nowait((priority, next(self.sequence), {"chat": chat, "text": text, "priority": priority, "attempt": 0}))
+
+    def park(self, item, delay, front=False):
+        """
+        Holds a message back until its chat may send again, keeping the chat's order
+        """
+        chat = item["chat"]
+        backlog = self.parked.get(chat)
+        if backlog is None:
+            backlog = self.parked[chat] = deque()
+            asyncio.get_running_loop().call_later(delay, lambda: asyncio.ensure_future(self.drain_chat(chat)))
+        if front:
+            backlog.appendleft(item)
+            return
+        # ahead of the chat's less urgent messages, behind those of the same priority
+        position = next((i for i, parked in enumerate(backlog) if parked["priority"] > item["priority"]), len(backlog))
+        backlog.insert(position, item)
+
+    async def drain_chat(self, chat):
+        backlog = self.parked[chat]
+        bucket = self.chat_bucket(chat)
+        while backlog:
+            wait = bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            await self.send_now(backlog.popleft(), bucket)
+        self.parked.pop(chat)
+
+    def chat_bucket(self, chat) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.max_chat_buckets:
+                now = time.monotonic()
+                for idle_chat in [key for key, value in self.chat_buckets.items() if value.idle(now) and key not in self.parked]:
+                    self.chat_buckets.pop(idle_chat)
+            bucket = self.chat_buckets[chat] = TokenBucket(self.chat_rate)
+        return bucket
+
+    async def work(self):
+        while True:
+            _, _, item = await self.queue.get()
+            if item["chat"] in self.parked:
+                self.park(item, 0)
+                continue
+            chat_bucket = self.chat_bucket(item["chat"])
+            chat_wait = chat_bucket.delay()
+            if chat_wait > 0:
+                # park the message instead of holding a worker while other chats could be served
+                self.park(item, chat_wait)
+                continue
+            await self.send_now(item, chat_bucket)
+
+    async def send_now(self, item, chat_bucket):
+        await self.acquire(self.global_bucket)
+        self.global_bucket.take()
+        chat_bucket.take()
+        await self.deliver(item, chat_bucket)
+
+    @staticmethod
+    async def acquire(bucket):
+        wait = bucket.delay()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = bucket.delay()
+
+    async def send_once(self, chat, text):
+        """
+        A single attempt within the same limits, without retries, raising on failure;
+        for replaying dead letters, which have their own backoff
+        """
+        chat_bucket = self.chat_bucket(chat)
+        await self.acquire(chat_bucket)
+        await self.acquire(self.global_bucket)
+        self.global_bucket.take()
+        chat_bucket.take()
+        try:
+            await self.send(chat, text)
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                self.metrics["rate_limited"] += 1
+                chat_bucket.block(retry_after)
+            raise
+        self.metrics["sent"] += 1
+
+    async def deliver(self, item, chat_bucket):
+        try:
+            await self.send(item["chat"], item["text"])
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                self.metrics["rate_limited"] += 1
+                chat_bucket.block(retry_after)
+                self.logger.warning(f"Rate limited sending to {item['chat']}, retrying in {retry_after}s")
+                self.park(item, retry_after, front=True)
+                return
+            if item["attempt"] < self.retries:
+                item["attempt"] += 1
+                self.metrics["retried"] += 1
+                chat_bucket.block(2 ** item["attempt"])
+                self.park(item, 2 ** item["attempt"], front=True)
+                return
+            self.metrics["failed"] += 1
+            self.logger.error(f"Error sending message to {item['chat']}: {e}")
+            if self.on_error is not None:
+                self.on_error(item["chat"], item["text"], e)
+        else:
+            self.metrics["sent"] += 1
+        self.done()
+
+    def done(self):
+        self.pending -= 1
+        self.drained += 1
+        if self.pending == 0:
+            self.metrics["last_drain_messages"] = self.drained
+            self.metrics["last_drain_seconds"] = time.monotonic() - self.drain_started_at
+            if self.drained > 1:
+                self.logger.info(f"Drained {self.drained} messages in {self.metrics['last_drain_seconds']:.1f}s")
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "queued": self.pending,
+            "draining_for": time.monotonic() - self.drain_started_at if self.pending else 0.0,
+            "chats": len(self.chat_buckets)
+        }
+
+
+def get_retry_after(error):
+    """
+    retry_after of a Telegram 429 error (telebot's ApiTelegramException), None for other errors
+    """
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result = getattr(error, "result_json", None) or {}
+    return result.get("parameters", {}).get("retry_after", 1)
@@ -0,0 +1,25 @@
+import json
+import logging
+import os
+
+def load_json(path, default):
+    """
+    Loads a local state file, returning `default` if it is missing or corrupted
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON from {path}: {e}")
+        return default
+
+def save_json(path, data):
+    """
+    Atomically replaces a local state file, so a crash never leaves it half-written
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
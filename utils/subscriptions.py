@@ -0,0 +1,181 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+INDEXED_KEYS = ("validator", "address", "sub")
+
+class SubscriptionStore:
+    """
+    Subscriptions of every chat platform in a local SQLite file (WAL mode), one row per
+    subscription so /sub and /unsub are single-row transactions
+    """
+    def __init__(self, path="subscriptions.db"):
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Subscriptions")
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # `user` has no declared type so Discord/Telegram integer ids round-trip unchanged
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    platform TEXT NOT NULL,
+                    user NOT NULL,
+                    kind TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (platform, user, kind, target)
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS subscriptions_target ON subscriptions (platform, kind, target)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (platform, user)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS migrations (platform TEXT PRIMARY KEY, migrated_at REAL NOT NULL)")
+
+    @staticmethod
+    def kind(sub):
+        return next(key for key in INDEXED_KEYS if sub.get(key) is not None)
+
+    def add(self, platform, sub) -> bool:
+        kind = self.kind(sub)
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO subscriptions (platform, user, kind, target, created_at) VALUES (?, ?, ?, ?, ?)",
+                (platform, sub["user"], kind, sub[kind], time.time())
+            )
+            return cursor.rowcount > 0
+
+    def remove(self, platform, user, value) -> int:
+        with self.lock, self.db:
+            return self.db.execute(
+                "DELETE FROM subscriptions WHERE platform = ? AND user = ? AND target = ?",
+                (platform, user, value)
+            ).rowcount
+
+    def load(self, platform) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT user, kind, target FROM subscriptions WHERE platform = ? ORDER BY rowid",
+                (platform,)
+            ).fetchall()
+        return [{"user": user, kind: target} for user, kind, target in rows]
+
+    def migrate(self, platform, subscriptions):
+        """
+        One-time import of the `subscriptions` array a platform used to keep in config.json
+        """
+        with self.lock, self.db:
+            if self.db.execute("SELECT 1 FROM migrations WHERE platform = ?", (platform,)).fetchone():
+                return
+            now = time.time()
+            rows = [
+                (platform, sub["user"], self.kind(sub), sub[self.kind(sub)], now)
+                for sub in subscriptions
+                if any(sub.get(key) is not None for key in INDEXED_KEYS)
+            ]
+            self.db.executemany(
+                "INSERT OR IGNORE INTO subscriptions (platform, user, kind, target, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.db.execute("INSERT INTO migrations (platform, migrated_at) VALUES (?, ?)", (platform, now))
+        self.logger.info(f"Migrated {len(rows)} {platform} subscriptions from config.json.")
+
+
+class SubscriptionIndex:
+    """
+    Subscriptions of a chat platform indexed by validator, address and topic (`sub`), so an
+    alert only visits the subscribers it is for. Iterates like the original list
+    """
+    def __init__(self, subscriptions=(), store=None, platform=None):
+        self.store: SubscriptionStore = None
+        self.platform = platform
+        self.subscriptions: dict = {} # id -> subscription, in insertion order
+        self.index: dict = {key: {} for key in INDEXED_KEYS + ("user",)} # key -> value -> {id: subscription}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        for sub in subscriptions:
+            self.add(sub)
+        # set last so loading the stored rows does not write them back
+        self.store = store
+
+    @classmethod
+    def from_store(cls, store, platform, legacy=()):
+        store.migrate(platform, legacy)
+        return cls(store.load(platform), store, platform)
+
+    def add(self, sub) -> bool:
+        """
+        Adds a subscription unless the user already has the same one
+        """
+        with self.lock:
+            for existing in self.index["user"].get(sub.get("user"), {}).values():
+                if existing == sub:
+                    return False
+            if self.store is not None:
+                self.store.add(self.platform, sub)
+            sub_id = next(self.ids)
+            self.subscriptions[sub_id] = sub
+            for key in INDEXED_KEYS + ("user",):
+                if sub.get(key) is not None:
+                    self.index[key].setdefault(sub[key], {})[sub_id] = sub
+            return True
+
+    def remove(self, user, value) -> int:
+        """
+        Removes the subscriptions of `user` whose validator, address or topic is `value`
+        """
+        with self.lock:
+            removed = [
+                sub_id for sub_id, sub in self.index["user"].get(user, {}).items()
+                if any(sub.get(key) == value for key in INDEXED_KEYS)
+            ]
+            if removed and self.store is not None:
+                self.store.remove(self.platform, user, value)
+            for sub_id in removed:
+                sub = self.subscriptions.pop(sub_id)
+                for key in INDEXED_KEYS + ("user",):
+                    if sub.get(key) is not None:
+                        entries = self.index[key][sub[key]]
+                        entries.pop(sub_id)
+                        if not entries:
+                            self.index[key].pop(sub[key])
+            return len(removed)
+
+    def lookup(self, key, value) -> list:
+        if value is None:
+            return []
+        with self.lock:
+            return list(self.index[key].get(value, {}).values())
+
+    def for_validator(self, validator) -> list:
+        return self.lookup("validator", validator)
+
+    def for_address(self, address) -> list:
+        return self.lookup("address", address)
+
+    def for_topic(self, topic) -> list:
+        return self.lookup("sub", topic)
+
+    def for_user(self, user) -> list:
+        return self.lookup("user", user)
+
+    def matching(self, validator=None, address=None) -> list:
+        """
+        Subscribers of a validator or of an address, each subscription once
+        """
+        subs = {id(sub): sub for sub in self.for_validator(validator) + self.for_address(address)}
+        return list(subs.values())
+
+    def validators(self) -> list:
+        with self.lock:
+            return list(self.index["validator"])
+
+    def to_list(self) -> list:
+        with self.lock:
+            return list(self.subscriptions.values())
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __len__(self):
+        return len(self.subscriptions)
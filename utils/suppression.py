@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from utils.store import load_json, save_json
+
+SEVERITIES = ["ATTENTION", "WARNING", "CRITICAL"] # lowest to highest
+SUBJECT_KEYS = ("validator", "address", "orchestrator", "proposal_id", "client", "chain-1", "chain-2", "channel", "port", "sequence")
+# alert types that clear the repeats of the listed types for the same subject; symmetric,
+# so a validator flapping within the TTL still gets its latest state through
+RESOLVES = {
+    "recovering": ["miss_block"],
+    "miss_block": ["recovering"],
+    "active": ["inactive", "jailed"],
+    "inactive": ["active"],
+    "jailed": ["active"]
+}
+
+class SuppressionCache:
+    """
+    Holds back repeats of an alert, keyed by (type, subject, severity), for a per-type TTL.
+    A repeat at a higher severity than the one last sent is let through, entries are
+    evicted least recently used past `max_entries`, and the cache is saved to disk so a
+    restart doesn't re-send every open condition
+    """
+    def __init__(self, params=None):
+        params = params or {}
+        self.ttls: dict = params.get("ttl_seconds", {})
+        self.default_ttl: float = params.get("default_ttl_seconds", 0)
+        self.severities: list = params.get("severities", SEVERITIES)
+        self.resolves: dict = params.get("resolves", RESOLVES)
+        self.max_entries: int = params.get("max_entries", 10000)
+        self.path: str = params.get("path", "suppression.json")
+        self.save_interval: float = params.get("save_interval_seconds", 10)
+        self.entries: OrderedDict = OrderedDict() # "type|subject|severity" -> expires at (epoch seconds)
+        self.saved_at = 0
+        self.metrics = {"allowed": 0, "suppressed": 0, "evicted": 0}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Suppression")
+        self.logger.setLevel(logging.INFO)
+        if self.path:
+            now = time.time()
+            for key, expires_at in load_json(self.path, []):
+                if expires_at > now:
+                    self.entries[key] = expires_at
+
+    @staticmethod
+    def subject(args) -> str:
+        return "/".join(f"{args[key]}" for key in SUBJECT_KEYS if args.get(key) is not None)
+
+    @staticmethod
+    def severity(message) -> str:
+        return message.get("severity") or message.get("args", {}).get("warning_level") or ""
+
+    def key(self, alert_type, subject, severity) -> str:
+        return f"{alert_type}|{subject}|{severity}"
+
+    def allow(self, message, now=None) -> bool:
+        """
+        Whether an alert should be sent; records it when it is
+        """
+        now = now or time.time()
+        alert_type = message["type"]
+        subject = self.subject(message.get("args", {}))
+        severity = self.severity(message)
+        with self.lock:
+            for resolved in self.resolves.get(alert_type, []):
+                for level in [""] + self.severities:
+                    self.entries.pop(self.key(resolved, subject, level), None)
+            ttl = self.ttls.get(alert_type, self.default_ttl)
+            if not ttl:
+                return True
+            # the same severity or any higher one still live means this is a repeat
+            levels = [severity] + (self.severities[self.severities.index(severity) + 1:] if severity in self.severities else [])
+            for level in levels:
+                key = self.key(alert_type, subject, level)
+                if self.entries.get(key, 0) > now:
+                    self.entries.move_to_end(key)
+                    self.metrics["suppressed"] += 1
+                    self.logger.debug(f"Suppressed repeated {alert_type} alert for {subject}.")
+                    return False
+            key = self.key(alert_type, subject, severity)
+            self.entries[key] = now + ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.metrics["evicted"] += 1
+            self.metrics["allowed"] += 1
+            if now - self.saved_at >= self.save_interval:
+                self.save(now)
+        return True
+
+    def save(self, now=None):
+        if not self.path:
+            return
+        now = now or time.time()
+        try:
+            save_json(self.path, [[key, expires_at] for key, expires_at in self.entries.items() if expires_at > now])
+            self.saved_at = now
+        except OSError as e:
+            self.logger.error(f"Error saving suppression cache to {self.path}: {e}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**self.metrics, "entries": len(self.entries)}
@@ -0,0 +1,78 @@
+import threading
+
+DEFAULT_COLOR = 0x29fffb
+
+class AlertTemplate:
+    """
+    One alert type, declared once for every platform. `title`, `description`, field values
+    and `color` are either format strings over the alert's args or callables `(args, params)`;
+    a field whose value is None is left out
+    """
+    def __init__(self, title, description="", fields=(), color=DEFAULT_COLOR):
+        self.title = title
+        self.description = description
+        self.fields = [(field[0], field[1], field[2] if len(field) > 2 else True) for field in fields]
+        self.color = color
+
+    @staticmethod
+    def resolve(spec, args, params):
+        if callable(spec):
+            return spec(args, params)
+        if isinstance(spec, str):
+            return spec.format_map(args)
+        return spec
+
+    def values(self, args, params) -> list:
+        values = []
+        for name, spec, inline in self.fields:
+            value = self.resolve(spec, args, params)
+            if value is not None:
+                values.append((name, value, inline))
+        return values
+
+    def discord(self, message, params) -> dict:
+        """
+        Keyword arguments for DiscordClient.compose_embed
+        """
+        args = message["args"]
+        auto_delete = message.get("auto_delete")
+        return {
+            "title": f"**{self.resolve(self.title, args, params)}**",
+            "description": self.resolve(self.description, args, params),
+            "fields": [{"name": name, "value": value, "inline": inline} for name, value, inline in self.values(args, params)],
+            "footer": f"This message will be automatically deleted in {auto_delete}s" if auto_delete is not None else "",
+            "color": self.resolve(self.color, args, params)
+        }
+
+    def text(self, message, params) -> str:
+        """
+        Markdown shared by Slack (mrkdwn) and Telegram
+        """
+        args = message["args"]
+        lines = [f"*{self.resolve(self.title, args, params)}*"]
+        description = self.resolve(self.description, args, params)
+        if description:
+            lines.append(description)
+        lines += [f"{name}: `{value}`" for name, value, _ in self.values(args, params)]
+        return "\n".join(lines)
+
+
+class Templates:
+    """
+    A feature's alert templates. Renders each alert once per format and keeps the result on
+    the message, so every platform worker and every recipient reuses it
+    """
+    FORMATS = ("discord", "text")
+
+    def __init__(self, templates, params=None):
+        self.templates: dict = templates
+        self.params: dict = params if params is not None else {}
+        self.lock = threading.Lock()
+
+    def render(self, message, format):
+        with self.lock:
+            rendered = message.setdefault("rendered", {})
+            if format not in rendered:
+                template = self.templates[message["type"]]
+                rendered[format] = getattr(template, format)(message, self.params)
+            return rendered[format]
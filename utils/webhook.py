@@ -0,0 +1,165 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from utils.priority import LANES, LaneQueue
+
+MAX_BLOCKS = 50 # per Slack message
+MAX_SECTION_TEXT = 3000
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class WebhookSender:
+    """
+    Delivers Slack webhook messages from a worker thread over a pooled HTTP session.
+    Messages for the same webhook that arrive within `window_seconds` are sent as one
+    Block Kit message; 429s are retried after Retry-After, other failures with backoff.
+    The queue has a lane per delivery class (utils.priority), so once a rate limit lifts
+    the most urgent alerts go out first
+    """
+    def __init__(self, params=None, session=None, name="SlackWebhook", on_error=None):
+        params = params or {}
+        self.on_error = on_error # called with (webhook_url, payload, error) once retries are exhausted
+        self.window: float = params.get("window_seconds", 1)
+        self.timeout: float = params.get("timeout_seconds", 10)
+        self.retries: int = params.get("retries", 3)
+        self.backoff: float = params.get("backoff_seconds", 1)
+        self.session = session or make_session(params.get("pool_size", 4))
+        self.queue = LaneQueue(maxsize=params.get("queue_size", 10000))
+        self.metrics = {
+            "enqueued": 0,
+            "requests": 0,
+            "delivered": 0,
+            "rate_limited": 0,
+            "retried": 0,
+            "failed": 0,
+            "dropped": 0
+        }
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+
+    def start(self):
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+
+    def count(self, metric, value=1):
+        with self.lock:
+            self.metrics[metric] += value
+
+    def put(self, webhook_url, message, priority=len(LANES) - 1):
+        try:
+            self.queue.put_nowait((webhook_url, message), LANES[priority])
+            self.count("enqueued")
+        except queue.Full:
+            self.count("dropped")
+            self.logger.error("Slack webhook queue is full, dropping message.")
+
+    def collect(self) -> dict:
+        """
+        Waits for a message, then gathers whatever else arrives within the window, per webhook,
+        most urgent first
+        """
+        webhook_url, message = self.queue.get()
+        batches = {webhook_url: [message]}
+        deadline = time.monotonic() + self.window
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                webhook_url, message = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batches.setdefault(webhook_url, []).append(message)
+        return batches
+
+    def work(self):
+        while True:
+            for webhook_url, messages in self.collect().items():
+                for payload, size in self.payloads(messages):
+                    self.post(webhook_url, payload, size)
+
+    @staticmethod
+    def payloads(messages) -> list:
+        """
+        (payload, number of messages) pairs; texts are merged into Block Kit sections,
+        attachment lists are sent as they are
+        """
+        payloads = []
+        texts = [message for message in messages if isinstance(message, str)]
+        payloads += [({"attachments": message}, 1) for message in messages if isinstance(message, list)]
+        if len(texts) == 1:
+            payloads.append(({"text": texts[0]}, 1))
+            return payloads
+        # a section and a divider per message
+        per_payload = MAX_BLOCKS // 2
+        for start in range(0, len(texts), per_payload):
+            chunk = texts[start:start + per_payload]
+            blocks = []
+            for text in chunk:
+                if blocks:
+                    blocks.append({"type": "divider"})
+                blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": text.strip()[:MAX_SECTION_TEXT] or "-"}})
+            payloads.append(({"text": f"{len(chunk)} alerts", "blocks": blocks}, len(chunk)))
+        return payloads
+
+    def request(self, webhook_url, payload):
+        self.count("requests")
+        return self.session.post(
+            webhook_url,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(payload),
+            timeout=self.timeout
+        )
+
+    def send_once(self, webhook_url, payload):
+        """
+        A single attempt without retries, raising on failure
+        """
+        response = self.request(webhook_url, payload)
+        if response.status_code != 200:
+            raise Exception(f"Slack webhook returned {response.status_code}: {response.text}")
+
+    def post(self, webhook_url, payload, size=1):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.request(webhook_url, payload)
+            except Exception as e:
+                self.logger.error(f"Error sending message to webhook: {e}")
+                error = e
+                delay = self.backoff * 2 ** attempt
+            else:
+                if response.status_code == 200:
+                    self.count("delivered", size)
+                    return True
+                error = f"Slack webhook returned {response.status_code}: {response.text}"
+                if response.status_code == 429:
+                    self.count("rate_limited")
+                    delay = float(response.headers.get("Retry-After", self.backoff * 2 ** attempt))
+                    self.logger.warning(f"Slack rate limited the webhook, retrying in {delay}s")
+                elif response.status_code >= 500:
+                    self.logger.error(f"Slack webhook returned {response.status_code}: {response.text}")
+                    delay = self.backoff * 2 ** attempt
+                else:
+                    self.logger.error(f"Slack webhook rejected the message ({response.status_code}): {response.text}")
+                    break
+            if attempt < self.retries:
+                self.count("retried")
+                time.sleep(delay)
+        self.count("failed", size)
+        if self.on_error is not None:
+            self.on_error(webhook_url, payload, error)
+        return False
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**self.metrics, "queued": self.queue.qsize()}
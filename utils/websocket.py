@@ -5,12 +5,13 @@ import threading
 import logging
 
 class WebsocketClient():
-    def __init__(self, urls, topics, block_queue, tx_queue):
+    def __init__(self, urls, topics, block_queue=None, tx_queue=None, routes=None):
         self.urls = urls
         self.topics = topics
         self.ws = None
         self.block_queue = block_queue
         self.tx_queue = tx_queue
+        self.routes = routes or {} # query -> queue, for subscriptions other than blocks/proposals
         self.NewBlock = False
         
         self.logger = logging.getLogger("Websocket")
@@ -21,7 +22,9 @@ class WebsocketClient():
             data = json.loads(message)
             self.NewBlock = True
             if "result" in data and "query" in data["result"]:
-                if data["result"]["query"] == "tm.event='NewBlock'" or data["result"]["query"] == "tm.event='ValidatorSetUpdates'":
+                if data["result"]["query"] in self.routes:
+                    self.routes[data["result"]["query"]].put(data)
+                elif data["result"]["query"] == "tm.event='NewBlock'" or data["result"]["query"] == "tm.event='ValidatorSetUpdates'":
                     self.block_queue.put(data)
                 elif data["result"]["query"] == "tm.event='Tx' AND message.action CONTAINS 'MsgSubmitProposal'":
                     self.tx_queue.put(data)